@@ -0,0 +1,143 @@
+"""
+二进制抓包基准测试
+
+用协议文件和应答引擎生成与 bench_frame_path 相同的请求/响应帧, 分别:
+
+    capture   CaptureWriter.write 逐帧写入 (含轮转), 报告吞吐量和逐帧延迟
+    textlog   按 main.py 的日志格式把同样的帧写入文本日志 (十六进制 + 解码结果),
+              与无界面模式 --log-frames 的输出相同
+
+并与 115200 波特率总线上的最大帧速率 (每字节 11 位, 帧间 3.5 字符静默) 比较,
+最后读回抓包文件校验帧数和内容。
+
+用法:
+    python benchmarks/bench_capture.py [--frames 200000] [--max-bytes 4194304]
+"""
+import os
+import sys
+import time
+import shutil
+import logging
+import argparse
+import tempfile
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_DIR)
+
+from bench_frame_path import DEFAULT_PROTOCOL, build_frames, summarize
+from capture import CaptureWriter, read_capture
+from internal_variables import InternalVariables
+from modbus_parser import ModbusParser
+from modbus_responder import ModbusResponder
+from protocol_loader import read_jsonc
+from protocol_map import ProtocolMap
+from serial_reader import DIRECTION_RX, DIRECTION_TX
+
+BAUDRATE = 115200
+PORT = '/dev/ttyUSB0'
+
+
+def bus_frames_per_s(frames, baudrate=BAUDRATE):
+    """总线满载时的帧速率"""
+    char_time = 11.0 / baudrate
+    seconds = sum((len(frame) + 3.5) * char_time for frame in frames)
+    return len(frames) / seconds
+
+
+def directory_size(path):
+    return sum(os.path.getsize(os.path.join(path, name)) for name in os.listdir(path))
+
+
+def bench_capture(work_dir, items, max_bytes):
+    capture_dir = os.path.join(work_dir, 'capture')
+    writer = CaptureWriter(os.path.join(capture_dir, 'modbus.cap'), max_bytes, backup_count=1000)
+    writer.open()
+    write = writer.write
+    clock = time.perf_counter_ns
+    latencies = [0] * len(items)
+
+    started = time.perf_counter()
+    for i, (data, direction) in enumerate(items):
+        t0 = clock()
+        write(PORT, data, direction)
+        latencies[i] = clock() - t0
+    writer.close()
+    elapsed = time.perf_counter() - started
+
+    result = summarize(latencies, len(items) / elapsed)
+    result.update(bytes=directory_size(capture_dir), files=len(os.listdir(capture_dir)),
+                  rotations=writer.rotations)
+    return result, capture_dir
+
+
+def bench_textlog(work_dir, items, modbus_parser):
+    path = os.path.join(work_dir, 'modbus_simulator.log')
+    handler = logging.FileHandler(path, encoding='utf-8')
+    handler.setFormatter(logging.Formatter('%(asctime)s - %(levelname)s - %(message)s'))
+    text_logger = logging.getLogger('bench_capture.textlog')
+    text_logger.propagate = False
+    text_logger.setLevel(logging.INFO)
+    text_logger.addHandler(handler)
+
+    started = time.perf_counter()
+    for data, direction in items:
+        result = modbus_parser.parse_message(data, PORT)
+        text_logger.info(f"{PORT} {direction}: {data.hex(' ').upper()} | "
+                         f"{modbus_parser.format_parse_result(result)}")
+    elapsed = time.perf_counter() - started
+    text_logger.removeHandler(handler)
+    handler.close()
+    return {'frames_per_s': len(items) / elapsed, 'bytes': os.path.getsize(path)}
+
+
+def verify(capture_dir, items):
+    """按轮转顺序 (编号大的更早) 读回全部文件, 校验内容和顺序"""
+    names = sorted(os.listdir(capture_dir),
+                   key=lambda name: -int(name.rsplit('.', 1)[1]) if name[-1].isdigit() else 0)
+    records = [(data, direction) for name in names
+               for _, _, direction, data in read_capture(os.path.join(capture_dir, name))]
+    return records == items
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Binary capture writer benchmark")
+    parser.add_argument('--protocol', default=DEFAULT_PROTOCOL)
+    parser.add_argument('--frames', type=int, default=200000)
+    parser.add_argument('--max-bytes', type=int, default=4 * 1024 * 1024)
+    args = parser.parse_args()
+
+    protocol_map = ProtocolMap(read_jsonc(args.protocol))
+    internal_vars = InternalVariables.from_protocol(protocol_map)
+    responder = ModbusResponder(internal_vars, protocol_map)
+    modbus_parser = ModbusParser(internal_vars)
+    modbus_parser.set_protocol(protocol_map)
+
+    pairs = build_frames(protocol_map, responder)
+    bus = [item for (request, response) in pairs
+           for item in ((request, DIRECTION_RX), (response, DIRECTION_TX))]
+    items = [bus[i % len(bus)] for i in range(args.frames)]
+
+    work_dir = tempfile.mkdtemp()
+    try:
+        capture, capture_dir = bench_capture(work_dir, items, args.max_bytes)
+        textlog = bench_textlog(work_dir, items, modbus_parser)
+        verified = verify(capture_dir, items)
+    finally:
+        shutil.rmtree(work_dir)
+
+    bus_rate = bus_frames_per_s([data for data, _ in bus])
+    print(f"frames: {args.frames}, sizes {sorted({len(data) for data, _ in bus})} bytes")
+    print(f"bus at {BAUDRATE} baud: {bus_rate:.0f} frames/s")
+    print(f"capture: {capture['frames_per_s']:.0f} frames/s "
+          f"({capture['frames_per_s'] / bus_rate:.0f}x bus), p50 {capture['p50_us']:.2f} us, "
+          f"p99 {capture['p99_us']:.2f} us, max {capture['max_us']:.1f} us, "
+          f"{capture['files']} files, {capture['rotations']} rotations")
+    print(f"textlog: {textlog['frames_per_s']:.0f} frames/s")
+    print(f"size: capture {capture['bytes']} bytes, textlog {textlog['bytes']} bytes "
+          f"({capture['bytes'] / textlog['bytes'] * 100.0:.1f}%)")
+    print(f"read back: {'ok' if verified else 'MISMATCH'}")
+    return 0 if verified else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,242 @@
+"""
+帧处理路径基准测试
+
+不需要硬件, 用协议文件和应答引擎生成真实的请求/响应帧 (FC03 读取协议中
+第一段连续寄存器、FC06 写单个寄存器、FC16 写多个寄存器), 逐级测量:
+
+    crc       check_crc 校验整帧
+    framing   RTUFramer.feed 按 8 字节分片重组
+    parse     ModbusParser.parse_message (请求和响应交替, 与总线上一致)
+    format    ModbusParser.format_parse_result
+    respond   ModbusResponder.handle_frame
+    e2e       pty 回环: 主站写请求 -> PortWorker 读取、成帧、应答 -> 主站读完响应 (仅POSIX)
+
+每级报告吞吐量 (不计时的循环测得, 帧/秒) 和逐帧延迟的百分位 (微秒)。
+结果连同 Python 版本、平台和 git 提交写入 JSON 文件, 用 --compare 与之前
+的结果对比。
+
+用法:
+    python benchmarks/bench_frame_path.py [--iterations 20000] [--e2e-frames 2000]
+                                          [--output results.json] [--compare baseline.json]
+"""
+import os
+import sys
+import time
+import json
+import select
+import argparse
+import platform
+import subprocess
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_DIR)
+
+from crc16 import append_crc, check_crc
+from internal_variables import InternalVariables
+from modbus_parser import ModbusParser
+from modbus_responder import ModbusResponder
+from protocol_loader import read_jsonc
+from protocol_map import ProtocolMap
+from rtu_framer import RTUFramer
+
+DEFAULT_PROTOCOL = os.path.join(BASE_DIR, 'protocols', 'growatt_protocol.json')
+RESULTS_DIR = os.path.join(BASE_DIR, 'benchmarks', 'results')
+CHUNK_SIZE = 8
+WARMUP = 200
+
+
+def percentile(values, pct):
+    if not values:
+        return float('nan')
+    ordered = sorted(values)
+    index = min(int(round(pct / 100.0 * (len(ordered) - 1))), len(ordered) - 1)
+    return ordered[index]
+
+
+def summarize(latencies_ns, frames_per_s):
+    latencies_us = [ns / 1000.0 for ns in latencies_ns]
+    return {
+        'frames': len(latencies_us),
+        'frames_per_s': frames_per_s,
+        'p50_us': percentile(latencies_us, 50),
+        'p90_us': percentile(latencies_us, 90),
+        'p99_us': percentile(latencies_us, 99),
+        'max_us': max(latencies_us) if latencies_us else float('nan'),
+    }
+
+
+def measure(func, items, iterations):
+    """
+    对 items 循环调用 func
+    吞吐量由不逐帧计时的循环测得, 延迟百分位由逐帧计时的循环测得
+    """
+    count = len(items)
+    for i in range(WARMUP):
+        func(items[i % count])
+
+    started = time.perf_counter()
+    for i in range(iterations):
+        func(items[i % count])
+    frames_per_s = iterations / (time.perf_counter() - started)
+
+    clock = time.perf_counter_ns
+    latencies = [0] * iterations
+    for i in range(iterations):
+        t0 = clock()
+        func(items[i % count])
+        latencies[i] = clock() - t0
+    return summarize(latencies, frames_per_s)
+
+
+def build_frames(protocol_map, responder):
+    """生成请求帧和对应的响应帧"""
+    first = protocol_map.entries[0]
+    count = first.length
+    for entry in protocol_map.entries[1:]:
+        if entry.address != first.address + count:
+            break
+        count += entry.length
+
+    requests = [
+        append_crc(bytes([1, 0x03]) + first.address.to_bytes(2, 'big') + count.to_bytes(2, 'big')),
+        append_crc(bytes([1, 0x06]) + first.address.to_bytes(2, 'big') + first.length.to_bytes(2, 'big')),
+        append_crc(bytes([1, 0x10]) + first.address.to_bytes(2, 'big') + first.length.to_bytes(2, 'big')
+                   + bytes([first.length * 2]) + bytes(first.length * 2)),
+    ]
+    pairs = [(request, responder.handle_frame(request)) for request in requests]
+    return [(request, response) for request, response in pairs if response is not None]
+
+
+def bench_framing(frames, iterations):
+    framer = RTUFramer(115200)
+    chunked = [[frame[i:i + CHUNK_SIZE] for i in range(0, len(frame), CHUNK_SIZE)] for frame in frames]
+    now = [0.0]
+
+    def feed(chunks):
+        # 每帧之间留出足够的静默时间, 帧内分片间隔很短
+        now[0] += 1.0
+        for chunk in chunks:
+            framer.feed(chunk, now[0])
+        framer.poll(now[0] + 1.0)
+
+    return measure(feed, chunked, iterations)
+
+
+def bench_e2e(protocol_map, pairs, frames):
+    """pty 回环上的请求->响应往返时间"""
+    from port_manager import PortWorker, open_port
+
+    master, slave = os.openpty()
+    internal_vars = InternalVariables.from_protocol(protocol_map)
+    responder = ModbusResponder(internal_vars, protocol_map)
+    serial_port = open_port({"port": os.ttyname(slave), "baudrate": 115200})
+    worker = PortWorker("bench", serial_port, responder)
+    worker.start()
+
+    def roundtrip(pair):
+        request, response = pair
+        os.write(master, request)
+        received = 0
+        while received < len(response):
+            ready, _, _ = select.select([master], [], [], 1.0)
+            if not ready:
+                raise TimeoutError("no response from simulator")
+            received += len(os.read(master, 256))
+
+    try:
+        return measure(roundtrip, pairs, frames)
+    finally:
+        worker.stop()
+        os.close(master)
+        os.close(slave)
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=BASE_DIR,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, baseline_path):
+    """打印与之前结果的对比, 吞吐量和 p99 的变化以百分比表示"""
+    with open(baseline_path, 'r', encoding='utf-8') as f:
+        baseline = json.load(f)
+    print(f"\ncompared with {baseline_path} (commit {baseline['meta'].get('commit')})")
+    print(f"{'stage':<10} {'frames/s':>12} {'change':>8} {'p99 us':>10} {'change':>8}")
+    for name, current in results.items():
+        previous = baseline['results'].get(name)
+        if previous is None:
+            continue
+        fps_change = (current['frames_per_s'] / previous['frames_per_s'] - 1.0) * 100.0
+        p99_change = (current['p99_us'] / previous['p99_us'] - 1.0) * 100.0
+        print(f"{name:<10} {current['frames_per_s']:>12.0f} {fps_change:>+7.1f}% "
+              f"{current['p99_us']:>10.1f} {p99_change:>+7.1f}%")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Frame path benchmark suite")
+    parser.add_argument('--protocol', default=DEFAULT_PROTOCOL)
+    parser.add_argument('--iterations', type=int, default=20000)
+    parser.add_argument('--e2e-frames', type=int, default=2000)
+    parser.add_argument('--output', help="result file, defaults to benchmarks/results/frame_path-<time>.json")
+    parser.add_argument('--compare', help="earlier result file to compare with")
+    args = parser.parse_args()
+
+    protocol_map = ProtocolMap(read_jsonc(args.protocol))
+    internal_vars = InternalVariables.from_protocol(protocol_map)
+    responder = ModbusResponder(internal_vars, protocol_map)
+    modbus_parser = ModbusParser(internal_vars)
+    modbus_parser.set_protocol(protocol_map)
+
+    pairs = build_frames(protocol_map, responder)
+    requests = [request for request, _ in pairs]
+    # 总线上请求和响应交替出现, 解析器据此解码读响应
+    bus_frames = [frame for pair in pairs for frame in pair]
+    parsed = [modbus_parser.parse_message(frame, 'bench') for frame in bus_frames]
+
+    results = {
+        'crc': measure(check_crc, bus_frames, args.iterations),
+        'framing': bench_framing(bus_frames, args.iterations),
+        'parse': measure(lambda frame: modbus_parser.parse_message(frame, 'bench'),
+                         bus_frames, args.iterations),
+        'format': measure(modbus_parser.format_parse_result, parsed, args.iterations),
+        'respond': measure(responder.handle_frame, requests, args.iterations),
+    }
+    if os.name == 'posix' and args.e2e_frames:
+        results['e2e'] = bench_e2e(protocol_map, pairs, args.e2e_frames)
+
+    report = {
+        'meta': {
+            'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'commit': git_commit(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'protocol': os.path.basename(args.protocol),
+            'frame_sizes': [len(frame) for frame in bus_frames],
+            'iterations': args.iterations,
+        },
+        'results': results,
+    }
+
+    output = args.output
+    if output is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        output = os.path.join(RESULTS_DIR, f"frame_path-{time.strftime('%Y%m%d-%H%M%S')}.json")
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=4)
+
+    print(f"{'stage':<10} {'frames/s':>12} {'p50 us':>9} {'p90 us':>9} {'p99 us':>9} {'max us':>9}")
+    for name, r in results.items():
+        print(f"{name:<10} {r['frames_per_s']:>12.0f} {r['p50_us']:>9.1f} {r['p90_us']:>9.1f} "
+              f"{r['p99_us']:>9.1f} {r['max_us']:>9.1f}")
+    print(f"results written to {output}")
+
+    if args.compare:
+        compare(results, args.compare)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
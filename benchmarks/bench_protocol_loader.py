@@ -0,0 +1,68 @@
+"""
+协议加载基准测试
+
+用 bench_variable_store 生成大型协议, 写成每个寄存器带行注释的协议文件,
+分别统计首次加载 (去注释、解析、编译并写入缓存)、新进程中从磁盘缓存加载
+和同一进程内再次加载的耗时。
+
+用法:
+    python benchmarks/bench_protocol_loader.py [--points 20000] [--repeat 5]
+"""
+import os
+import sys
+import time
+import json
+import shutil
+import argparse
+import tempfile
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_DIR)
+
+from bench_variable_store import make_protocol
+from protocol_loader import ProtocolLoader
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Protocol loader cache benchmark")
+    parser.add_argument('--points', type=int, default=20000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp()
+    try:
+        path = os.path.join(work_dir, 'vendor_protocol.json')
+        text = json.dumps(make_protocol(args.points), ensure_ascii=False, indent=4)
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(text.replace('"unit": "V",', '"unit": "V",  // 单位: 伏'))
+        cache_dir = os.path.join(work_dir, 'cache')
+
+        start = time.perf_counter()
+        ProtocolLoader(cache_dir).load(path)
+        cold_ms = (time.perf_counter() - start) * 1000.0
+
+        cached_times = []
+        for _ in range(args.repeat):
+            loader = ProtocolLoader(cache_dir)
+            start = time.perf_counter()
+            loader.load(path)
+            cached_times.append((time.perf_counter() - start) * 1000.0)
+
+        start = time.perf_counter()
+        loader.load(path)
+        memory_ms = (time.perf_counter() - start) * 1000.0
+
+        print(json.dumps({
+            'points': args.points,
+            'file_mb': os.path.getsize(path) / 1e6,
+            'cold_ms': cold_ms,
+            'disk_cache_ms_min': min(cached_times),
+            'memory_cache_ms': memory_ms,
+        }, indent=4))
+    finally:
+        shutil.rmtree(work_dir)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
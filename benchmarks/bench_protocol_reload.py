@@ -0,0 +1,133 @@
+"""
+协议热加载基准测试
+
+在临时目录中建立配置和 bench_variable_store 生成的大型协议, 以无界面模式
+启动 Modbus TCP 服务和协议文件监视。客户端线程持续发送 FC03 读请求,
+主线程反复修改协议文件 (每次改动一个寄存器的单位), 统计每次重新编译和
+交换的耗时, 以及期间客户端的请求数、异常应答数和最大往返时间。
+
+用法:
+    python benchmarks/bench_protocol_reload.py [--points 5000] [--reloads 10]
+"""
+import os
+import sys
+import time
+import json
+import shutil
+import socket
+import struct
+import argparse
+import tempfile
+import threading
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_DIR)
+
+from bench_variable_store import make_protocol
+from config_manager import ConfigManager
+from headless import HeadlessSimulator
+
+
+class ReadClient(threading.Thread):
+    """持续发送 FC03 读请求的 Modbus TCP 客户端"""
+
+    def __init__(self, port, count=100):
+        super().__init__(daemon=True)
+        self.sock = socket.create_connection(('127.0.0.1', port))
+        self.request = struct.pack('>HHHB', 1, 0, 6, 1) + struct.pack('>BHH', 3, 0, count)
+        self.stop_event = threading.Event()
+        self.requests = 0
+        self.exceptions = 0
+        self.max_rtt = 0.0
+
+    def _recv(self, size):
+        data = b''
+        while len(data) < size:
+            chunk = self.sock.recv(size - len(data))
+            if not chunk:
+                raise ConnectionError("server closed connection")
+            data += chunk
+        return data
+
+    def run(self):
+        while not self.stop_event.is_set():
+            started = time.perf_counter()
+            self.sock.sendall(self.request)
+            header = self._recv(7)
+            body = self._recv(struct.unpack('>H', header[4:6])[0] - 1)
+            rtt = time.perf_counter() - started
+            self.requests += 1
+            if body[0] & 0x80:
+                self.exceptions += 1
+            if rtt > self.max_rtt:
+                self.max_rtt = rtt
+        self.sock.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Protocol hot-reload swap latency under live traffic")
+    parser.add_argument('--points', type=int, default=5000)
+    parser.add_argument('--reloads', type=int, default=10)
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp()
+    try:
+        os.mkdir(os.path.join(work_dir, 'protocols'))
+        protocol = make_protocol(args.points)
+        protocol_path = os.path.join(work_dir, 'protocols', 'bench_protocol.json')
+        with open(protocol_path, 'w', encoding='utf-8') as f:
+            json.dump(protocol, f, ensure_ascii=False)
+
+        config_manager = ConfigManager(os.path.join(work_dir, 'config.json'))
+        config_manager.load_config()
+        config_manager.config.update(
+            protocols={"bench": {"config_file": "bench_protocol.json"}},
+            tcp_server={"enabled": True, "host": "127.0.0.1", "port": 0},
+            protocol_watch={"enabled": True, "interval": 0.05})
+
+        simulator = HeadlessSimulator(config_manager)
+        simulator.load_protocol("bench")
+        simulator.start()
+        watcher = simulator.protocol_watcher
+        swap = simulator.protocol_swap
+        client = ReadClient(simulator.tcp_server.port)
+        client.start()
+
+        compile_ms = []
+        swap_ms = []
+        registers = protocol["registers"]
+        keys = list(registers)
+        for i in range(args.reloads):
+            registers[keys[i % len(keys)]]["unit"] = f"V{i}"
+            with open(protocol_path, 'w', encoding='utf-8') as f:
+                json.dump(protocol, f, ensure_ascii=False)
+            deadline = time.monotonic() + 10.0
+            # 本脚本代替 HeadlessSimulator.run 的主循环交换协议
+            while swap.swaps + swap.failures + watcher.failures <= i and time.monotonic() < deadline:
+                swap.apply()
+                time.sleep(0.01)
+            compile_ms.append(watcher.last_compile_ms)
+            swap_ms.append(swap.last_swap_ms)
+
+        client.stop_event.set()
+        client.join()
+        simulator.stop()
+
+        print(json.dumps({
+            'points': args.points,
+            'reloads': swap.swaps,
+            'failures': watcher.failures + swap.failures,
+            'compile_ms_mean': sum(compile_ms) / len(compile_ms),
+            'swap_ms_mean': sum(swap_ms) / len(swap_ms),
+            'swap_ms_max': max(swap_ms),
+            'client_requests': client.requests,
+            'client_exceptions': client.exceptions,
+            'client_max_rtt_ms': client.max_rtt * 1000.0,
+        }, indent=4))
+    finally:
+        shutil.rmtree(work_dir)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
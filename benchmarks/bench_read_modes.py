@@ -0,0 +1,136 @@
+"""
+串口读取模式基准测试
+
+比较 poll (原10ms轮询 / t1.5轮询) 与 blocking 读取方式的唤醒延迟、成帧延迟
+以及空闲时的CPU占用。使用 pty 模拟串口, 仅支持 POSIX 系统。
+
+用法:
+    python benchmarks/bench_read_modes.py [--frames 200] [--baudrate 115200] [--idle 2]
+"""
+import os
+import sys
+import time
+import argparse
+import threading
+import statistics
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import serial
+from serial_reader import SerialReader, READ_MODE_POLL, READ_MODE_BLOCKING
+
+# 读保持寄存器请求: 从站1, 起始地址0x0000, 数量2
+FRAME = bytes.fromhex('010300000002C40B')
+
+MODES = [
+    ('poll-10ms', READ_MODE_POLL, 0.010),
+    ('poll-t1.5', READ_MODE_POLL, None),
+    ('blocking', READ_MODE_BLOCKING, None),
+]
+
+
+def percentile(values, pct):
+    if not values:
+        return float('nan')
+    ordered = sorted(values)
+    index = min(int(round(pct / 100.0 * (len(ordered) - 1))), len(ordered) - 1)
+    return ordered[index]
+
+
+class ReaderLoop(threading.Thread):
+    """在后台线程中运行 SerialReader, 记录每次唤醒和成帧的时刻"""
+
+    def __init__(self, reader):
+        super().__init__(daemon=True)
+        self.reader = reader
+        self.running = True
+        self.wakeups = []
+        self.frame_event = threading.Event()
+        self.frame_time = None
+
+        feed = reader.framer.feed
+
+        def timed_feed(data, now):
+            self.wakeups.append(now)
+            return feed(data, now)
+
+        reader.framer.feed = timed_feed
+
+    def run(self):
+        while self.running:
+            frames = self.reader.read_frames()
+            if frames:
+                self.frame_time = time.perf_counter()
+                self.frame_event.set()
+        self.reader.flush()
+
+
+def run_mode(name, read_mode, poll_interval, args):
+    master, slave = os.openpty()
+    port = serial.Serial(os.ttyname(slave), baudrate=args.baudrate, timeout=1)
+    try:
+        reader = SerialReader(port, read_mode, poll_interval)
+        loop = ReaderLoop(reader)
+        loop.start()
+
+        # 空闲阶段: 主线程休眠, 进程CPU时间即读取线程的开销
+        cpu_start = time.process_time()
+        time.sleep(args.idle)
+        idle_cpu = (time.process_time() - cpu_start) / args.idle * 100.0
+
+        wake_latency = []
+        frame_latency = []
+        for _ in range(args.frames):
+            loop.wakeups.clear()
+            loop.frame_event.clear()
+            t_write = time.perf_counter()
+            os.write(master, FRAME)
+            if not loop.frame_event.wait(1.0):
+                continue
+            if loop.wakeups:
+                wake_latency.append((loop.wakeups[0] - t_write) * 1000.0)
+            frame_latency.append((loop.frame_time - t_write) * 1000.0)
+            # 保证帧间静默时间大于t3.5
+            time.sleep(reader.framer.t35 * 2)
+
+        loop.running = False
+        loop.join()
+        return {
+            'mode': name,
+            'idle_cpu_pct': idle_cpu,
+            'frames': len(frame_latency),
+            'wake_p50_ms': percentile(wake_latency, 50),
+            'wake_p99_ms': percentile(wake_latency, 99),
+            'frame_p50_ms': percentile(frame_latency, 50),
+            'frame_p99_ms': percentile(frame_latency, 99),
+            'frame_mean_ms': statistics.mean(frame_latency) if frame_latency else float('nan'),
+        }
+    finally:
+        port.close()
+        os.close(master)
+        os.close(slave)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare serial read modes")
+    parser.add_argument('--frames', type=int, default=200)
+    parser.add_argument('--baudrate', type=int, default=115200)
+    parser.add_argument('--idle', type=float, default=2.0, help="idle CPU sampling seconds")
+    args = parser.parse_args()
+
+    if os.name != 'posix':
+        print("This benchmark requires a POSIX pty")
+        return 1
+
+    print(f"{'mode':<10} {'idle CPU%':>9} {'frames':>6} {'wake p50':>9} {'wake p99':>9} "
+          f"{'frame p50':>10} {'frame p99':>10}")
+    for name, read_mode, poll_interval in MODES:
+        r = run_mode(name, read_mode, poll_interval, args)
+        print(f"{r['mode']:<10} {r['idle_cpu_pct']:>9.2f} {r['frames']:>6} "
+              f"{r['wake_p50_ms']:>8.3f}ms {r['wake_p99_ms']:>8.3f}ms "
+              f"{r['frame_p50_ms']:>9.3f}ms {r['frame_p99_ms']:>9.3f}ms")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
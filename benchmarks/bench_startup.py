@@ -0,0 +1,102 @@
+"""
+启动时间和内存占用对比: 无界面模式 vs 图形界面
+
+每种模式在独立的子进程中运行多次, 统计从子进程执行第一行代码到仿真器
+可以应答 (无界面: 协议已加载、TCP服务已监听; 图形界面: 主窗口已创建并
+处理完首批事件) 的时间、包含解释器启动和退出的墙钟时间, 以及峰值RSS。图形界面使用 offscreen 平台插件, 未安装
+PyQt5 时该项报告为不可用。
+
+用法:
+    python benchmarks/bench_startup.py [--runs 5]
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import subprocess
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+HEADLESS_SNIPPET = """
+import time, resource, json, sys
+from main import parse_args
+from headless import HeadlessSimulator
+from config_manager import ConfigManager
+args = parse_args(['--headless'])
+manager = ConfigManager(args.config)
+manager.load_config()
+simulator = HeadlessSimulator(manager)
+if manager.config.get('last_protocol'):
+    simulator.load_protocol(manager.config['last_protocol'])
+simulator.setup_units()
+simulator.start(None, 0)
+elapsed = time.perf_counter() - START
+simulator.stop()
+print(json.dumps({'startup_s': elapsed,
+                  'maxrss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+                  'qt_loaded': any(name.startswith('PyQt5') for name in sys.modules)}))
+"""
+
+GUI_SNIPPET = """
+import time, resource, json, sys
+from PyQt5.QtWidgets import QApplication
+from modbus import ModbusSimulator
+app = QApplication(['bench'])
+window = ModbusSimulator()
+window.show()
+app.processEvents()
+elapsed = time.perf_counter() - START
+window.close()
+print(json.dumps({'startup_s': elapsed,
+                  'maxrss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+                  'qt_loaded': True}))
+"""
+
+
+def run_snippet(snippet):
+    """运行一次, 返回子进程报告的结果 (startup_s 从第一行代码开始计时) 和墙钟时间"""
+    code = "import time\nSTART = time.perf_counter()\n" + snippet
+    env = dict(os.environ, QT_QPA_PLATFORM='offscreen')
+    launched = time.perf_counter()
+    proc = subprocess.run([sys.executable, '-c', code], cwd=BASE_DIR, env=env,
+                          capture_output=True, text=True)
+    wall = time.perf_counter() - launched
+    if proc.returncode != 0:
+        return None, proc.stderr.strip().splitlines()[-1] if proc.stderr else 'failed'
+    result = json.loads(proc.stdout.strip().splitlines()[-1])
+    # 墙钟时间包含解释器启动和退出
+    result['wall_s'] = wall
+    return result, None
+
+
+def summarize(snippet, runs):
+    results = []
+    for _ in range(runs):
+        result, error = run_snippet(snippet)
+        if result is None:
+            return {'available': False, 'error': error}
+        results.append(result)
+    return {
+        'available': True,
+        'startup_ms_min': min(r['startup_s'] for r in results) * 1000.0,
+        'wall_ms_min': min(r['wall_s'] for r in results) * 1000.0,
+        'maxrss_mb': max(r['maxrss_kb'] for r in results) / 1024.0,
+        'qt_loaded': results[0]['qt_loaded'],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Headless vs GUI startup time and RSS")
+    parser.add_argument('--runs', type=int, default=5)
+    args = parser.parse_args()
+
+    print(json.dumps({
+        'headless': summarize(HEADLESS_SNIPPET, args.runs),
+        'gui': summarize(GUI_SNIPPET, args.runs),
+    }, indent=4))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,121 @@
+"""
+Modbus TCP 服务吞吐量基准测试
+
+在本机回环地址启动 ModbusTCPServer, 用多个 asyncio 客户端并发连接, 每个
+连接保持固定数量的流水线请求 (FC03 读取协议中全部连续寄存器), 统计
+每秒事务数和事务延迟分布。
+
+用法:
+    python benchmarks/bench_tcp_server.py [--clients 200] [--pipeline 4] [--duration 5]
+"""
+import os
+import sys
+import time
+import json
+import struct
+import asyncio
+import argparse
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_DIR)
+
+from internal_variables import InternalVariables
+from modbus_responder import ModbusResponder
+from modbus_tcp_server import ModbusTCPServer, MBAP_HEADER
+from protocol_map import ProtocolMap
+
+DEFAULT_PROTOCOL = os.path.join(BASE_DIR, 'protocols', 'growatt_protocol.json')
+
+
+def percentile(values, pct):
+    if not values:
+        return float('nan')
+    ordered = sorted(values)
+    index = min(int(round(pct / 100.0 * (len(ordered) - 1))), len(ordered) - 1)
+    return ordered[index]
+
+
+async def run_client(host, port, request_pdu, pipeline, deadline, latencies):
+    reader, writer = await asyncio.open_connection(host, port)
+    sent_at = {}
+    transaction_id = 0
+    completed = 0
+
+    def send():
+        nonlocal transaction_id
+        transaction_id = (transaction_id + 1) & 0xFFFF
+        sent_at[transaction_id] = time.perf_counter()
+        writer.write(MBAP_HEADER.pack(transaction_id, 0, len(request_pdu) + 1, 1) + request_pdu)
+
+    for _ in range(pipeline):
+        send()
+    try:
+        while time.perf_counter() < deadline:
+            header = await reader.readexactly(MBAP_HEADER.size)
+            tid, _, length, _ = MBAP_HEADER.unpack(header)
+            await reader.readexactly(length - 1)
+            latencies.append(time.perf_counter() - sent_at.pop(tid))
+            completed += 1
+            send()
+    finally:
+        writer.close()
+    return completed
+
+
+async def run_benchmark(args, server):
+    protocol_map = server.responder._protocol
+    first = protocol_map.entries[0]
+    count = protocol_map.entries[-1].end - first.address
+    request_pdu = struct.pack('>BHH', 3, first.address, count)
+
+    latencies = []
+    start = time.perf_counter()
+    deadline = start + args.duration
+    results = await asyncio.gather(*[
+        run_client('127.0.0.1', server.port, request_pdu, args.pipeline, deadline, latencies)
+        for _ in range(args.clients)
+    ], return_exceptions=True)
+    elapsed = time.perf_counter() - start
+
+    errors = [r for r in results if isinstance(r, Exception)]
+    transactions = sum(r for r in results if not isinstance(r, Exception))
+    return {
+        'clients': args.clients,
+        'pipeline': args.pipeline,
+        'duration_s': elapsed,
+        'transactions': transactions,
+        'transactions_per_s': transactions / elapsed,
+        'latency_p50_ms': percentile(latencies, 50) * 1000.0,
+        'latency_p99_ms': percentile(latencies, 99) * 1000.0,
+        'client_errors': len(errors),
+        'server': server.get_stats(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Modbus TCP server loopback throughput benchmark")
+    parser.add_argument('--clients', type=int, default=200)
+    parser.add_argument('--pipeline', type=int, default=4, help="outstanding requests per connection")
+    parser.add_argument('--duration', type=float, default=5.0)
+    parser.add_argument('--protocol', default=DEFAULT_PROTOCOL)
+    args = parser.parse_args()
+
+    with open(args.protocol, 'r', encoding='utf-8') as f:
+        protocol = json.load(f)
+
+    responder = ModbusResponder(InternalVariables(), ProtocolMap(protocol))
+    server = ModbusTCPServer(responder, '127.0.0.1', 0)
+    if not server.start_in_thread():
+        print("Failed to start server")
+        return 1
+    try:
+        result = asyncio.run(run_benchmark(args, server))
+    finally:
+        server.stop()
+
+    print(json.dumps(result, indent=4))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,83 @@
+"""
+内部变量表加载基准测试
+
+生成包含指定数量寄存器 (每个寄存器绑定一个变量) 的协议, 分别统计协议编译
+时间、由协议生成变量表的时间, 以及变量表每个变量占用的内存。
+
+用法:
+    python benchmarks/bench_variable_store.py [--points 5000]
+"""
+import os
+import sys
+import time
+import json
+import argparse
+import tracemalloc
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_DIR)
+
+from internal_variables import InternalVariables
+from protocol_map import ProtocolMap
+
+REGISTER_TYPES = ('uint16', 'int16', 'uint32', 'float32')
+
+
+def make_protocol(points):
+    """生成厂商风格的大型协议, 寄存器类型和转换交替出现"""
+    registers = {}
+    address = 0
+    for i in range(points):
+        reg_type = REGISTER_TYPES[i % len(REGISTER_TYPES)]
+        length = 2 if reg_type in ('uint32', 'float32') else 1
+        registers[f"0x{address:04X}"] = {
+            "name": f"测点{i}",
+            "length": length,
+            "type": reg_type,
+            "unit": "V",
+            "scale": 0.1 if i % 3 == 0 else None,
+            "variable_mapping": {
+                "name": f"point_{i}",
+                "conversion": {"read": "value * 10" if i % 5 == 0 else "value",
+                               "write": "value / 10" if i % 5 == 0 else "value"}
+            }
+        }
+        address += length
+    return {"registers": registers}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Internal variable store load benchmark")
+    parser.add_argument('--points', type=int, default=5000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    protocol = make_protocol(args.points)
+
+    start = time.perf_counter()
+    protocol_map = ProtocolMap(protocol)
+    compile_ms = (time.perf_counter() - start) * 1000.0
+
+    load_times = []
+    for _ in range(args.repeat):
+        start = time.perf_counter()
+        InternalVariables.from_protocol(protocol_map, defaults=False)
+        load_times.append((time.perf_counter() - start) * 1000.0)
+
+    tracemalloc.start()
+    variables = InternalVariables.from_protocol(protocol_map, defaults=False)
+    allocated, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    print(json.dumps({
+        'points': len(variables),
+        'protocol_compile_ms': compile_ms,
+        'load_ms_min': min(load_times),
+        'load_ms_mean': sum(load_times) / len(load_times),
+        'bytes_per_point': allocated / len(variables),
+    }, indent=4))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,196 @@
+import os
+import time
+import struct
+import logging
+import threading
+from typing import Dict, Iterator, Optional, Tuple
+from serial_reader import DIRECTION_RX, DIRECTION_TX
+
+logger = logging.getLogger(__name__)
+
+# 文件头: 魔数, 版本, 打开时的系统时间和单调时钟 (纳秒), 用于把记录时间换算为绝对时间
+MAGIC = b'MBCP'
+VERSION = 1
+FILE_HEADER = struct.Struct('<4sHqq')
+
+# 记录头: 负载长度, 记录类型, 端口编号, 单调时钟时间戳 (纳秒), 之后是负载
+RECORD_HEADER = struct.Struct('<HBBq')
+
+RECORD_RX = 0
+RECORD_TX = 1
+RECORD_PORT = 2    # 端口声明, 负载为端口名 (UTF-8), 每个文件中端口首次出现时写入
+
+RECORD_TYPES = {DIRECTION_RX: RECORD_RX, DIRECTION_TX: RECORD_TX}
+DIRECTIONS = {RECORD_RX: DIRECTION_RX, RECORD_TX: DIRECTION_TX}
+
+MAX_PORTS = 256     # 记录头中的端口编号为1字节, 单个文件内最多声明的端口数
+MAX_PAYLOAD = 0xFFFF
+FLUSH_INTERVAL = 1.0
+
+
+class CaptureWriter:
+    """
+    二进制抓包文件写入
+
+    在读取线程的 on_frame(端口名, 数据, 方向) 回调中直接写入原始帧, 每帧一条
+    长度前缀记录 (12 字节记录头 + 帧数据), 不做十六进制格式化和解码, 不经过
+    GUI。文件只追加, 写入缓冲满时落盘, 另有后台线程每 FLUSH_INTERVAL 秒刷新
+    一次, 总线空闲时最后几帧也能及时写入磁盘; 超过 max_bytes 或单个文件中的
+    端口数超过 MAX_PORTS 时按 RotatingFileHandler 的方式轮转为 path.1 ... path.N。
+
+    多个端口的读取线程共用一个写入器, 写入时持有锁 (只包含打包和缓冲写入)。
+    """
+
+    def __init__(self, path: str, max_bytes: int = 16 * 1024 * 1024, backup_count: int = 5,
+                 buffer_size: int = 64 * 1024):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self.buffer_size = buffer_size
+        self._file = None
+        self._size = 0
+        self._port_ids: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._flush_thread: Optional[threading.Thread] = None
+
+        self.frames = 0
+        self.bytes_written = 0
+        self.rotations = 0
+        self.dropped = 0
+
+    def open(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._lock:
+            # 文件头中的单调时钟只在本进程内有效, 已有的抓包文件先轮转出去
+            if os.path.exists(self.path) and os.path.getsize(self.path) > 0:
+                self._shift_backups()
+            self._open_file()
+        self._stop_event.clear()
+        self._flush_thread = threading.Thread(target=self._flush_loop, name="CaptureFlush", daemon=True)
+        self._flush_thread.start()
+        logger.info(f"Capturing frames to {self.path}")
+
+    def _open_file(self):
+        self._file = open(self.path, 'ab', buffering=self.buffer_size)
+        self._file.write(FILE_HEADER.pack(MAGIC, VERSION, time.time_ns(), time.monotonic_ns()))
+        # 文件头立即落盘, 刷新前读取正在写入的文件也是有效的抓包文件
+        self._file.flush()
+        self._size = FILE_HEADER.size
+        # 端口编号只在当前文件内有效, 新文件中重新声明
+        self._port_ids = {}
+
+    def _shift_backups(self):
+        if self.backup_count > 0:
+            for index in range(self.backup_count - 1, 0, -1):
+                source = f"{self.path}.{index}"
+                if os.path.exists(source):
+                    os.replace(source, f"{self.path}.{index + 1}")
+            os.replace(self.path, f"{self.path}.1")
+        else:
+            os.remove(self.path)
+
+    def _rotate(self):
+        self._file.close()
+        self._shift_backups()
+        self.rotations += 1
+        self._open_file()
+
+    def _port_id(self, port: str, now: int) -> int:
+        if len(self._port_ids) >= MAX_PORTS:
+            # 编号用完时轮转到新文件重新编号, 不复用已声明的编号
+            logger.info(f"More than {MAX_PORTS} ports in {self.path}, rotating")
+            self._rotate()
+        name = (port or '').encode('utf-8')[:MAX_PAYLOAD]
+        port_id = len(self._port_ids)
+        self._port_ids[port] = port_id
+        self._file.write(RECORD_HEADER.pack(len(name), RECORD_PORT, port_id, now) + name)
+        self._size += RECORD_HEADER.size + len(name)
+        return port_id
+
+    def write(self, port: str, data: bytes, direction: str):
+        """记录一帧, 签名与 on_frame 回调相同, 在读取线程中调用"""
+        now = time.monotonic_ns()
+        length = len(data)
+        if length > MAX_PAYLOAD:
+            self.dropped += 1
+            return
+        with self._lock:
+            if self._file is None:
+                self.dropped += 1
+                return
+            if self._size >= self.max_bytes:
+                self._rotate()
+            port_id = self._port_ids.get(port)
+            if port_id is None:
+                port_id = self._port_id(port, now)
+            self._file.write(RECORD_HEADER.pack(length, RECORD_TYPES[direction], port_id, now))
+            self._file.write(data)
+            self._size += RECORD_HEADER.size + length
+            self.frames += 1
+            self.bytes_written += RECORD_HEADER.size + length
+
+    def _flush_loop(self):
+        while not self._stop_event.wait(FLUSH_INTERVAL):
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error(f"Error flushing capture file: {e}")
+
+    def flush(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.flush()
+
+    def close(self):
+        self._stop_event.set()
+        if self._flush_thread is not None:
+            self._flush_thread.join()
+            self._flush_thread = None
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    def get_stats(self) -> Dict[str, int]:
+        return {
+            'frames': self.frames,
+            'bytes_written': self.bytes_written,
+            'rotations': self.rotations,
+            'dropped': self.dropped
+        }
+
+
+def read_capture(path: str) -> Iterator[Tuple[int, str, str, bytes]]:
+    """
+    读取抓包文件
+    Yields:
+        tuple: (系统时间纳秒, 端口名, 方向, 帧数据)
+    """
+    with open(path, 'rb') as f:
+        magic, version, wall_ns, monotonic_ns = FILE_HEADER.unpack(f.read(FILE_HEADER.size))
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a capture file")
+        if version != VERSION:
+            raise ValueError(f"Unsupported capture version {version}")
+        offset = wall_ns - monotonic_ns
+
+        ports: Dict[int, str] = {}
+        while True:
+            header = f.read(RECORD_HEADER.size)
+            if len(header) < RECORD_HEADER.size:
+                # 文件末尾, 或进程退出时未写完的记录
+                return
+            length, record_type, port_id, timestamp = RECORD_HEADER.unpack(header)
+            payload = f.read(length)
+            if len(payload) < length:
+                return
+            if record_type == RECORD_PORT:
+                ports[port_id] = payload.decode('utf-8', errors='replace')
+                continue
+            direction: Optional[str] = DIRECTIONS.get(record_type)
+            if direction is None:
+                raise ValueError(f"Unknown record type {record_type} in {path}")
+            yield timestamp + offset, ports.get(port_id, str(port_id)), direction, payload
@@ -1,13 +1,35 @@
 import json
 import os
 import logging
+import time
+import tempfile
+import threading
+from protocol_loader import ProtocolLoader, read_jsonc
 
 logger = logging.getLogger(__name__)
 
 class ConfigManager:
-    def __init__(self):
+    """
+    配置服务
+
+    配置保存在内存中, 各处修改后调用 save_config 安排保存: 最后一次修改后
+    debounce 秒内没有新的修改时, 由后台写入线程一次性原子写入 (临时文件 +
+    fsync + 改名), 不阻塞界面线程。退出前调用 flush 立即写入。
+    """
+
+    def __init__(self, path='config.json', debounce=0.5):
+        self.path = path
+        self.debounce = debounce
         self.config = None
         self.protocols = {}
+        self.writes = 0
+        self._dirty = False
+        self._deadline = 0.0
+        self._writer = None
+        self._lock = threading.RLock()
+        self._write_lock = threading.Lock()
+        self._changed = threading.Condition(self._lock)
+        self.protocol_loader = ProtocolLoader(os.path.join(self._base_dir(), '.protocol_cache'))
         
     def get_default_config(self):
         return {
@@ -17,7 +39,8 @@ class ConfigManager:
                 "parity": "N", 
                 "stopbits": 1,
                 "bytesize": 8,
-                "timeout": 1000
+                "timeout": 1000,
+                "echo_suppression": False
             },
             "protocols": {
                 "古瑞瓦特逆变器 Modbus RTU Protocol_II V1.24简版": {
@@ -31,13 +54,39 @@ class ConfigManager:
                     "config_file": "chint_protocol.json"
                 }
             },
-            "last_protocol": ""
+            "last_protocol": "",
+            "tcp_server": {
+                "enabled": False,
+                "host": "0.0.0.0",
+                "port": 502
+            },
+            "ports": [],
+            "simulation": {
+                "enabled": False,
+                "rate": 10,
+                "generators": {}
+            },
+            "protocol_watch": {
+                "enabled": False,
+                "interval": 1.0
+            },
+            "metrics": {
+                "enabled": False,
+                "host": "127.0.0.1",
+                "port": 9464
+            },
+            "capture": {
+                "enabled": False,
+                "path": "captures/modbus.cap",
+                "max_bytes": 16777216,
+                "backup_count": 5
+            }
         }
 
     def load_config(self):
         try:
-            if os.path.exists('config.json'):
-                with open('config.json', 'r', encoding='utf-8') as f:
+            if os.path.exists(self.path):
+                with open(self.path, 'r', encoding='utf-8') as f:
                     self.config = json.load(f)
                     logger.info("Configuration loaded successfully")
             else:
@@ -49,39 +98,120 @@ class ConfigManager:
         except Exception as e:
             logger.error(f"Error loading configuration: {e}")
             self.config = self.get_default_config()
+        self.protocols = self.config.get("protocols", {})
 
     def create_default_config(self):
         default_config = self.get_default_config()
         try:
-            with open('config.json', 'w', encoding='utf-8') as f:
-                json.dump(default_config, f, indent=4, ensure_ascii=False)
+            self._write_atomic(self._serialize(default_config))
             logger.info("Created default configuration file")
             return default_config
         except Exception as e:
             logger.error(f"Error creating default config: {e}")
             return None
 
+    def get(self, key, default=None):
+        with self._lock:
+            return self.config.get(key, default)
+
+    def set(self, key, value):
+        """修改一项配置并安排保存"""
+        with self._lock:
+            self.config[key] = value
+        self.save_config()
+
     def save_config(self):
-        try:
-            with open('config.json', 'w', encoding='utf-8') as f:
-                json.dump(self.config, f, indent=4, ensure_ascii=False)
+        """
+        安排保存配置
+        在 debounce 秒内的多次调用合并为一次写入, 写入在后台线程中完成
+        """
+        with self._lock:
+            self._dirty = True
+            self._deadline = time.monotonic() + self.debounce
+            if self._writer is None:
+                self._writer = threading.Thread(target=self._write_loop, name="ConfigWriter", daemon=True)
+                self._writer.start()
+            self._changed.notify()
+
+    def _write_loop(self):
+        """后台写入线程: 等到最后一次修改后 debounce 秒内没有新修改再写入"""
+        while True:
+            with self._lock:
+                while not self._dirty:
+                    self._changed.wait()
+                delay = self._deadline - time.monotonic()
+                while delay > 0:
+                    self._changed.wait(delay)
+                    delay = self._deadline - time.monotonic()
+            self.flush()
+
+    def flush(self):
+        """立即写入未保存的配置 (退出前调用)"""
+        # 写入串行化, 避免定时器线程与退出时的 flush 以相反顺序写入新旧内容
+        with self._write_lock:
+            with self._lock:
+                if not self._dirty:
+                    return
+                self._dirty = False
+                data = self._serialize(self.config)
+
+            try:
+                self._write_atomic(data)
+                self.writes += 1
                 logger.info("Configuration saved successfully")
-        except Exception as e:
-            logger.error(f"Error saving configuration: {e}")
+            except Exception as e:
+                logger.error(f"Error saving configuration: {e}")
 
-    def load_protocols(self):
+    @staticmethod
+    def _serialize(config):
+        return json.dumps(config, indent=4, ensure_ascii=False)
+
+    def _write_atomic(self, data):
+        """写入临时文件并 fsync, 再替换原文件, 中途崩溃不会留下不完整的配置"""
+        directory = os.path.dirname(os.path.abspath(self.path))
+        fd, temp_path = tempfile.mkstemp(prefix='.config-', suffix='.tmp', dir=directory)
         try:
-            if os.path.exists('config.json'):
-                with open('config.json', 'r', encoding='utf-8') as f:
-                    config = json.load(f)
-                    if "protocols" in config:
-                        self.protocols = config["protocols"]
-                        logger.info("Protocol configurations loaded successfully")
-                    else:
-                        logger.warning("No protocols found in configuration")
-            else:
-                logger.warning("Configuration file not found")
-                self.create_default_config()
-                
-        except Exception as e:
-            logger.error(f"Error loading protocols: {e}") 
\ No newline at end of file
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(temp_path, self.path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+
+        # 同步目录项, 确保改名本身已落盘 (Windows 不支持打开目录)
+        if hasattr(os, 'O_DIRECTORY'):
+            dir_fd = os.open(directory, os.O_RDONLY | os.O_DIRECTORY)
+            try:
+                os.fsync(dir_fd)
+            finally:
+                os.close(dir_fd)
+
+    def _base_dir(self):
+        return os.path.dirname(os.path.abspath(self.path))
+
+    def protocol_path(self, protocol_name):
+        """协议名称对应的协议文件路径 (位于配置文件旁的 protocols 目录)"""
+        protocol_info = self.config["protocols"][protocol_name]
+        return os.path.join(self._base_dir(), 'protocols', protocol_info['config_file'])
+
+    def read_protocol_file(self, protocol_name):
+        """读取协议名称对应的协议定义 (允许带注释)"""
+        return read_jsonc(self.protocol_path(protocol_name))
+
+    def load_protocol_map(self, protocol_name):
+        """加载协议名称对应的编译后协议, 文件未修改时直接使用缓存"""
+        return self.protocol_loader.load(self.protocol_path(protocol_name))
+
+    def load_protocols(self):
+        """协议列表来自内存中的配置"""
+        if self.config is None:
+            self.load_config()
+        self.protocols = self.config.get("protocols", {})
+        if self.protocols:
+            logger.info("Protocol configurations loaded successfully")
+        else:
+            logger.warning("No protocols found in configuration")
+        return self.protocols
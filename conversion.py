@@ -0,0 +1,107 @@
+import ast
+import logging
+from functools import lru_cache
+from typing import Any, Callable
+
+logger = logging.getLogger(__name__)
+
+# 转换表达式中允许调用的函数
+SAFE_FUNCTIONS = {
+    'abs': abs,
+    'round': round,
+    'min': min,
+    'max': max,
+    'int': int,
+    'float': float,
+}
+
+_ALLOWED_NODES = (
+    ast.Expression, ast.BinOp, ast.UnaryOp, ast.Constant, ast.Name, ast.Load,
+    ast.Call, ast.IfExp, ast.Compare,
+    ast.Add, ast.Sub, ast.Mult, ast.Div, ast.FloorDiv, ast.Mod, ast.Pow,
+    ast.BitAnd, ast.BitOr, ast.BitXor, ast.LShift, ast.RShift,
+    ast.UAdd, ast.USub, ast.Invert,
+    ast.Eq, ast.NotEq, ast.Lt, ast.LtE, ast.Gt, ast.GtE,
+)
+
+
+# 只含这些语法的表达式对 numpy 数组逐元素求值的结果与逐个标量求值相同
+_VECTOR_NODES = (
+    ast.Expression, ast.BinOp, ast.UnaryOp, ast.Constant, ast.Name, ast.Load,
+    ast.Add, ast.Sub, ast.Mult, ast.Div, ast.FloorDiv, ast.Mod, ast.Pow,
+    ast.UAdd, ast.USub,
+)
+
+
+class ConversionError(ValueError):
+    """转换表达式不合法"""
+
+
+def _validate(tree: ast.AST, expression: str):
+    for node in ast.walk(tree):
+        if not isinstance(node, _ALLOWED_NODES):
+            raise ConversionError(
+                f"Unsupported syntax {type(node).__name__} in conversion '{expression}'")
+        if isinstance(node, ast.Name) and node.id != 'value' and node.id not in SAFE_FUNCTIONS:
+            raise ConversionError(f"Unknown name '{node.id}' in conversion '{expression}'")
+        if isinstance(node, ast.Call):
+            if not isinstance(node.func, ast.Name) or node.func.id not in SAFE_FUNCTIONS:
+                raise ConversionError(f"Function call not allowed in conversion '{expression}'")
+            if node.keywords:
+                raise ConversionError(f"Keyword arguments not allowed in conversion '{expression}'")
+        if isinstance(node, ast.Constant) and not isinstance(node.value, (int, float)):
+            raise ConversionError(f"Only numeric constants allowed in conversion '{expression}'")
+
+
+def _identity(value: Any) -> Any:
+    return value
+
+
+@lru_cache(maxsize=None)
+def is_vectorizable(expression: str) -> bool:
+    """
+    表达式是否只含算术运算 (不含函数调用、比较、条件和位运算),
+    编译结果可以直接作用于浮点 numpy 数组
+    """
+    try:
+        tree = ast.parse(expression.strip(), mode='eval')
+    except SyntaxError:
+        return False
+    return all(isinstance(node, _VECTOR_NODES) for node in ast.walk(tree))
+
+
+@lru_cache(maxsize=None)
+def compile_conversion(expression: str) -> Callable[[Any], Any]:
+    """
+    校验并编译转换表达式
+    表达式只能使用变量 value、数字常量、算术/位运算/比较以及 SAFE_FUNCTIONS,
+    编译结果为普通函数, 相同表达式只编译一次
+    Args:
+        expression: 协议文件中的转换表达式, 如 "value * 1000"
+    Returns:
+        callable: 接受 value 返回转换结果的函数
+    Raises:
+        ConversionError: 表达式语法错误或使用了不允许的语法
+    """
+    expression = expression.strip()
+    if expression == 'value':
+        return _identity
+
+    try:
+        tree = ast.parse(expression, mode='eval')
+    except SyntaxError as e:
+        raise ConversionError(f"Invalid conversion '{expression}': {e.msg}") from None
+    _validate(tree, expression)
+
+    # 编译已校验的语法树本身, 不重新拼接源码 (带 # 注释等的表达式拼接后含义会变)
+    function = ast.Expression(ast.Lambda(
+        args=ast.arguments(posonlyargs=[], args=[ast.arg(arg='value')], vararg=None,
+                           kwonlyargs=[], kw_defaults=[], kwarg=None, defaults=[]),
+        body=tree.body))
+    ast.copy_location(function.body, tree.body)
+    ast.fix_missing_locations(function)
+    try:
+        code = compile(function, f"<conversion: {expression}>", 'eval')
+    except (SyntaxError, ValueError) as e:
+        raise ConversionError(f"Invalid conversion '{expression}': {e}") from None
+    return eval(code, {'__builtins__': {}, **SAFE_FUNCTIONS})
@@ -0,0 +1,94 @@
+import logging
+from typing import Iterable, List
+
+try:
+    import numpy as np
+except ImportError:  # numpy 为可选依赖, 缺失时批量校验退化为逐帧查表
+    np = None
+
+logger = logging.getLogger(__name__)
+
+CRC16_INIT = 0xFFFF
+CRC16_POLY = 0xA001  # 0x8005 的位反转形式
+
+
+def _build_table():
+    table = []
+    for byte in range(256):
+        crc = byte
+        for _ in range(8):
+            if crc & 1:
+                crc = (crc >> 1) ^ CRC16_POLY
+            else:
+                crc >>= 1
+        table.append(crc)
+    return tuple(table)
+
+
+CRC16_TABLE = _build_table()
+_NP_TABLE = np.array(CRC16_TABLE, dtype=np.uint16) if np is not None else None
+
+
+def crc16(data: bytes, crc: int = CRC16_INIT) -> int:
+    """计算 CRC16/Modbus 校验值"""
+    table = CRC16_TABLE
+    for byte in data:
+        crc = (crc >> 8) ^ table[(crc ^ byte) & 0xFF]
+    return crc
+
+
+def crc16_bytes(data: bytes) -> bytes:
+    """返回按Modbus传输顺序(低字节在前)排列的CRC"""
+    crc = crc16(data)
+    return bytes((crc & 0xFF, crc >> 8))
+
+
+def append_crc(payload: bytes) -> bytes:
+    """在报文末尾附加CRC"""
+    return bytes(payload) + crc16_bytes(payload)
+
+
+def write_crc(frame: bytearray):
+    """计算 frame[:-2] 的CRC并原地写入末尾预留的两个字节, 不复制报文"""
+    crc = crc16(memoryview(frame)[:-2])
+    frame[-2] = crc & 0xFF
+    frame[-1] = crc >> 8
+
+
+def check_crc(frame: bytes) -> bool:
+    """
+    校验帧尾部的CRC
+    对包含正确CRC(低字节在前)的完整帧再次计算CRC, 结果恒为0
+    """
+    if len(frame) < 3:
+        return False
+    return crc16(frame) == 0
+
+
+def check_crc_batch(frames: Iterable[bytes]) -> List[bool]:
+    """
+    批量校验大量帧的CRC
+    有numpy时按帧长分组, 每组的所有帧按列并行查表计算; 否则逐帧校验
+    Returns:
+        list: 与输入顺序一致的校验结果
+    """
+    frames = list(frames)
+    if np is None:
+        return [check_crc(frame) for frame in frames]
+
+    results = [False] * len(frames)
+    groups = {}
+    for index, frame in enumerate(frames):
+        if len(frame) >= 3:
+            groups.setdefault(len(frame), []).append(index)
+
+    for length, indices in groups.items():
+        data = np.frombuffer(b''.join(frames[i] for i in indices),
+                             dtype=np.uint8).reshape(len(indices), length)
+        crc = np.full(len(indices), CRC16_INIT, dtype=np.uint16)
+        for column in range(length):
+            crc = (crc >> 8) ^ _NP_TABLE[(crc ^ data[:, column]) & 0xFF]
+        for index, valid in zip(indices, (crc == 0).tolist()):
+            results[index] = valid
+
+    return results
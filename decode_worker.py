@@ -0,0 +1,137 @@
+import time
+import queue
+import logging
+from typing import Dict
+from PyQt5.QtCore import QThread, pyqtSignal
+from log_view import format_log_entry
+from metrics import DECODE_QUEUE_DEPTH
+from serial_reader import DIRECTION_RX
+from stage_timer import STAGE_ENTRY, STAGE_FORMAT, STAGE_HEX, STAGE_PARSE, STAGE_QUEUE
+
+logger = logging.getLogger(__name__)
+
+_QUEUE_DEPTH = DECODE_QUEUE_DEPTH.labels()
+
+
+class DecodeWorker(QThread):
+    """
+    解码工作线程
+
+    串口读取线程把收发的帧放入队列, 本线程完成十六进制格式化、解析和结果
+    格式化, 再把格式化好的日志条目按批次交给GUI线程, 避免繁忙的总线阻塞
+    界面重绘和输入。队列满时新帧被丢弃并计数。
+    """
+
+    batch_ready = pyqtSignal(list)
+
+    def __init__(self, parser, max_queue: int = 10000, batch_size: int = 200):
+        super().__init__()
+        self.parser = parser
+        self.batch_size = batch_size
+        self.running = False
+        self._queue = queue.Queue(maxsize=max_queue)
+
+        self.processed = 0
+        self.dropped = 0
+        self.max_queue_depth = 0
+        self._latency_total = 0.0
+        self._latency_max = 0.0
+        self.timer = None
+
+    def submit(self, data: bytes, direction: str = DIRECTION_RX, port=None):
+        """提交一帧待解码数据 (可从任意线程调用)"""
+        try:
+            self._queue.put_nowait((time.perf_counter(), data, direction, port))
+        except queue.Full:
+            self.dropped += 1
+            return
+        depth = self._queue.qsize()
+        _QUEUE_DEPTH.observe(depth)
+        if depth > self.max_queue_depth:
+            self.max_queue_depth = depth
+
+    def set_timer(self, timer):
+        """启用 (timer 为 StageTimer) 或关闭 (None) 分阶段计时"""
+        if timer is not None:
+            self._stage_indices = tuple(timer.index(stage) for stage in
+                                        (STAGE_QUEUE, STAGE_HEX, STAGE_PARSE, STAGE_FORMAT, STAGE_ENTRY))
+        self.timer = timer
+
+    def run(self):
+        self.running = True
+        while self.running:
+            try:
+                items = [self._queue.get(timeout=0.1)]
+            except queue.Empty:
+                continue
+            while len(items) < self.batch_size:
+                try:
+                    items.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            entries = []
+            # 每批选择一次处理函数, 未启用计时时不增加逐帧开销
+            timer = self.timer
+            for queued_at, data, direction, port in items:
+                try:
+                    if timer is None:
+                        entries.extend(self._decode(data, direction, port))
+                    else:
+                        entries.extend(self._decode_timed(data, direction, port, queued_at, timer))
+                except Exception as e:
+                    logger.error(f"Error decoding frame: {e}")
+                    entries.append(format_log_entry(f"解析Modbus消息时发生错误: {e}", "ERROR"))
+                latency = time.perf_counter() - queued_at
+                self._latency_total += latency
+                if latency > self._latency_max:
+                    self._latency_max = latency
+            self.processed += len(items)
+            self.batch_ready.emit(entries)
+
+    def _decode(self, data: bytes, direction: str, port):
+        hex_data = ' '.join([f'{b:02X}' for b in data])
+        label = "Received data" if direction == DIRECTION_RX else "Sent data"
+        result = self.parser.parse_message(data, port)
+        return [
+            format_log_entry(f"{label}: {hex_data}"),
+            format_log_entry(self.parser.format_parse_result(result))
+        ]
+
+    def _decode_timed(self, data: bytes, direction: str, port, queued_at: float, timer):
+        """与 _decode 相同, 记录各阶段的 perf_counter_ns 耗时"""
+        clock = time.perf_counter_ns
+        queue_index, hex_index, parse_index, format_index, entry_index = self._stage_indices
+        t0 = clock()
+        timer.record(queue_index, int((time.perf_counter() - queued_at) * 1e9))
+
+        hex_data = ' '.join([f'{b:02X}' for b in data])
+        t1 = clock()
+        label = "Received data" if direction == DIRECTION_RX else "Sent data"
+        result = self.parser.parse_message(data, port)
+        t2 = clock()
+        formatted = self.parser.format_parse_result(result)
+        t3 = clock()
+        entries = [format_log_entry(f"{label}: {hex_data}"), format_log_entry(formatted)]
+        t4 = clock()
+
+        timer.record(hex_index, t1 - t0)
+        timer.record(parse_index, t2 - t1)
+        timer.record(format_index, t3 - t2)
+        timer.record(entry_index, t4 - t3)
+        return entries
+
+    def stop(self):
+        self.running = False
+
+    def get_stats(self) -> Dict[str, float]:
+        """获取队列深度和解码延迟统计 (延迟为入队到解码完成, 单位毫秒)"""
+        mean = self._latency_total / self.processed if self.processed else 0.0
+        return {
+            'queue_depth': self._queue.qsize(),
+            'max_queue_depth': self.max_queue_depth,
+            'processed': self.processed,
+            'dropped': self.dropped,
+            'latency_mean_ms': mean * 1000.0,
+            'latency_max_ms': self._latency_max * 1000.0
+        }
@@ -0,0 +1,244 @@
+import struct
+import logging
+from typing import Any, Dict, List, Optional
+from crc16 import check_crc
+
+logger = logging.getLogger(__name__)
+
+# 标准功能码
+FC_READ_COILS = 0x01
+FC_READ_DISCRETE_INPUTS = 0x02
+FC_READ_HOLDING_REGISTERS = 0x03
+FC_READ_INPUT_REGISTERS = 0x04
+FC_WRITE_SINGLE_COIL = 0x05
+FC_WRITE_SINGLE_REGISTER = 0x06
+FC_WRITE_MULTIPLE_COILS = 0x0F
+FC_WRITE_MULTIPLE_REGISTERS = 0x10
+FC_READ_WRITE_MULTIPLE_REGISTERS = 0x17
+
+EXCEPTION_FLAG = 0x80
+
+# 异常码
+EXC_ILLEGAL_FUNCTION = 0x01
+EXC_ILLEGAL_DATA_ADDRESS = 0x02
+EXC_ILLEGAL_DATA_VALUE = 0x03
+EXC_SLAVE_DEVICE_FAILURE = 0x04
+
+EXCEPTION_NAMES = {
+    EXC_ILLEGAL_FUNCTION: "非法功能码",
+    EXC_ILLEGAL_DATA_ADDRESS: "非法数据地址",
+    EXC_ILLEGAL_DATA_VALUE: "非法数据值",
+    EXC_SLAVE_DEVICE_FAILURE: "从站设备故障",
+    0x05: "确认",
+    0x06: "从站设备忙",
+    0x08: "存储奇偶性差错",
+    0x0A: "网关路径不可用",
+    0x0B: "网关目标设备响应失败",
+}
+
+FRAME_REQUEST = 'request'
+FRAME_RESPONSE = 'response'
+FRAME_EXCEPTION = 'exception'
+
+
+def _fixed(length):
+    return lambda buf: length
+
+
+def _counted(count_index, overhead):
+    """长度由第 count_index 字节的字节数决定: 总长 = overhead + buf[count_index]"""
+    def rule(buf):
+        if len(buf) <= count_index:
+            return None
+        return overhead + buf[count_index]
+    return rule
+
+
+class FunctionDecoder:
+    """
+    单个功能码的解码器
+    request_rule/response_rule 根据已收到的字节给出完整RTU帧长度
+    (含地址和CRC), 字节不足以判断时返回None
+    """
+
+    def __init__(self, code: int, name: str, request_rule, response_rule):
+        self.code = code
+        self.name = name
+        self.request_rule = request_rule
+        self.response_rule = response_rule
+
+    def frame_length(self, buf) -> Optional[int]:
+        """
+        按长度规则在缓冲区开头寻找CRC正确的完整帧
+        Returns:
+            int: 帧长度; 0 表示还需要更多字节; None 表示没有规则匹配
+        """
+        waiting = False
+        for rule in (self.request_rule, self.response_rule):
+            length = rule(buf)
+            if length is None or len(buf) < length:
+                waiting = True
+            elif check_crc(buf[:length]):
+                return length
+        return 0 if waiting else None
+
+    def frame_type(self, message: bytes, pending: bool = False) -> Optional[str]:
+        """
+        根据帧长度判断是请求还是响应
+        两者长度相同时 (FC05/06 回显, 字节数为3的FC01/02响应等) 由 pending 决定:
+        同一从站有尚未应答的本功能码请求时为响应, 否则为请求
+        """
+        length = len(message)
+        is_request = self.request_rule(message) == length
+        is_response = self.response_rule(message) == length
+        if is_request and is_response:
+            return FRAME_RESPONSE if pending else FRAME_REQUEST
+        if is_request:
+            return FRAME_REQUEST
+        if is_response:
+            return FRAME_RESPONSE
+        return None
+
+    def decode(self, message: bytes, pending: bool = False) -> Dict[str, Any]:
+        """
+        解码RTU帧的数据字段, 返回包含 'kind' 的字典
+        Args:
+            pending: 同一从站是否有尚未应答的本功能码请求, 见 frame_type
+        """
+        kind = self.frame_type(message, pending)
+        if kind is None:
+            raise ValueError(f"Invalid frame length {len(message)} for function 0x{self.code:02X}")
+        fields = self._decode_request(message) if kind == FRAME_REQUEST else self._decode_response(message)
+        fields['kind'] = kind
+        return fields
+
+    def _decode_request(self, message: bytes) -> Dict[str, Any]:
+        return {}
+
+    def _decode_response(self, message: bytes) -> Dict[str, Any]:
+        return {}
+
+
+class ReadDecoder(FunctionDecoder):
+    """FC01/02/03/04: 请求为起始地址+数量, 响应为字节数+数据"""
+
+    def __init__(self, code, name, registers: bool):
+        super().__init__(code, name, _fixed(8), _counted(2, 5))
+        self.registers = registers
+
+    def _decode_request(self, message):
+        start, count = struct.unpack('>HH', message[2:6])
+        return {'start': start, 'count': count}
+
+    def _decode_response(self, message):
+        data = message[3:-2]
+        if self.registers:
+            return {'byte_count': message[2],
+                    'registers': list(struct.unpack('>%dH' % (len(data) // 2), data[:len(data) // 2 * 2]))}
+        return {'byte_count': message[2], 'bits': _unpack_bits(data)}
+
+
+class WriteSingleDecoder(FunctionDecoder):
+    """FC05/06: 请求与响应格式相同"""
+
+    def __init__(self, code, name):
+        super().__init__(code, name, _fixed(8), _fixed(8))
+
+    def _decode_request(self, message):
+        address, value = struct.unpack('>HH', message[2:6])
+        return {'address': address, 'value': value}
+
+    _decode_response = _decode_request
+
+
+class WriteMultipleDecoder(FunctionDecoder):
+    """FC0F/10: 请求带字节数和数据, 响应为起始地址+数量"""
+
+    def __init__(self, code, name, registers: bool):
+        super().__init__(code, name, _counted(6, 9), _fixed(8))
+        self.registers = registers
+
+    def _decode_request(self, message):
+        start, count, byte_count = struct.unpack('>HHB', message[2:7])
+        data = message[7:-2]
+        fields = {'start': start, 'count': count, 'byte_count': byte_count}
+        if self.registers:
+            fields['registers'] = list(struct.unpack('>%dH' % (len(data) // 2), data[:len(data) // 2 * 2]))
+        else:
+            fields['bits'] = _unpack_bits(data)[:count]
+        return fields
+
+    def _decode_response(self, message):
+        start, count = struct.unpack('>HH', message[2:6])
+        return {'start': start, 'count': count}
+
+
+class ReadWriteDecoder(FunctionDecoder):
+    """FC17: 读写多个寄存器"""
+
+    def __init__(self):
+        super().__init__(FC_READ_WRITE_MULTIPLE_REGISTERS, "读写多个寄存器",
+                         _counted(10, 13), _counted(2, 5))
+
+    def _decode_request(self, message):
+        read_start, read_count, write_start, write_count, byte_count = \
+            struct.unpack('>HHHHB', message[2:11])
+        data = message[11:-2]
+        return {
+            'start': read_start, 'count': read_count,
+            'write_start': write_start, 'write_count': write_count,
+            'registers': list(struct.unpack('>%dH' % (len(data) // 2), data[:len(data) // 2 * 2]))
+        }
+
+    def _decode_response(self, message):
+        data = message[3:-2]
+        return {'byte_count': message[2],
+                'registers': list(struct.unpack('>%dH' % (len(data) // 2), data[:len(data) // 2 * 2]))}
+
+
+class ExceptionDecoder(FunctionDecoder):
+    """异常响应: 功能码 | 0x80 + 异常码"""
+
+    def __init__(self, code):
+        super().__init__(code, "异常响应", _fixed(5), _fixed(5))
+
+    def frame_type(self, message, pending=False):
+        return FRAME_EXCEPTION if len(message) == 5 else None
+
+    def decode(self, message, pending=False):
+        if len(message) != 5:
+            raise ValueError(f"Invalid exception frame length {len(message)}")
+        code = message[2]
+        return {
+            'kind': FRAME_EXCEPTION,
+            'request_function_code': message[1] & ~EXCEPTION_FLAG,
+            'exception_code': code,
+            'exception_name': EXCEPTION_NAMES.get(code, "未知异常")
+        }
+
+
+def _unpack_bits(data: bytes) -> List[int]:
+    return [(byte >> bit) & 1 for byte in data for bit in range(8)]
+
+
+def _build_dispatch_table():
+    table: List[Optional[FunctionDecoder]] = [None] * 256
+    for decoder in (
+        ReadDecoder(FC_READ_COILS, "读线圈", registers=False),
+        ReadDecoder(FC_READ_DISCRETE_INPUTS, "读离散输入", registers=False),
+        ReadDecoder(FC_READ_HOLDING_REGISTERS, "读保持寄存器", registers=True),
+        ReadDecoder(FC_READ_INPUT_REGISTERS, "读输入寄存器", registers=True),
+        WriteSingleDecoder(FC_WRITE_SINGLE_COIL, "写单个线圈"),
+        WriteSingleDecoder(FC_WRITE_SINGLE_REGISTER, "写单个寄存器"),
+        WriteMultipleDecoder(FC_WRITE_MULTIPLE_COILS, "写多个线圈", registers=False),
+        WriteMultipleDecoder(FC_WRITE_MULTIPLE_REGISTERS, "写多个寄存器", registers=True),
+        ReadWriteDecoder(),
+    ):
+        table[decoder.code] = decoder
+    for code in range(EXCEPTION_FLAG | 1, 256):
+        table[code] = ExceptionDecoder(code)
+    return tuple(table)
+
+
+# 以功能码字节为下标的解码器表, 未知功能码为None
+FUNCTION_DECODERS = _build_dispatch_table()
@@ -0,0 +1,318 @@
+import time
+import signal
+import logging
+import threading
+from typing import Any, Dict, Optional
+from config_manager import ConfigManager
+from internal_variables import InternalVariables
+from modbus_parser import ModbusParser
+from modbus_responder import ModbusResponder
+from serial_handler import SerialHandler
+from stage_timer import StageTimer, HEADLESS_STAGES, STAGE_HEX, STAGE_PARSE, STAGE_FORMAT, STAGE_LOG
+from unit_dispatcher import UnitDispatcher
+
+logger = logging.getLogger(__name__)
+
+
+class HeadlessSimulator:
+    """
+    无界面仿真器
+
+    按配置加载协议, 在串口、多串口和Modbus TCP上应答, 可选运行波形仿真。
+    与图形界面使用相同的核心模块 (应答引擎、解析器、内部变量), 整个进程
+    不导入Qt, 适合服务器和CI环境。
+    """
+
+    def __init__(self, config_manager: ConfigManager, log_frames: bool = False,
+                 stage_timing: bool = False):
+        self.config_manager = config_manager
+        self.config: Dict[str, Any] = config_manager.config
+        self.internal_vars = InternalVariables()
+        self.parser = ModbusParser(self.internal_vars)
+        self.responder = ModbusResponder(self.internal_vars, on_write=self.internal_vars.batch_update)
+        self.bus_responder = self.responder
+        self.log_frames = log_frames
+        # 分阶段计时需要逐帧解码, 因此同时启用帧日志
+        self.stage_timer = StageTimer(HEADLESS_STAGES) if stage_timing else None
+        if self.stage_timer is not None:
+            self._stage_indices = tuple(self.stage_timer.index(stage) for stage in
+                                        (STAGE_HEX, STAGE_PARSE, STAGE_FORMAT, STAGE_LOG))
+
+        self.serial_handler: Optional[SerialHandler] = None
+        self.port_manager = None
+        self.tcp_server = None
+        self.waveform_engine = None
+        self.protocol_watcher = None
+        self.protocol_swap = None
+        self.metrics_server = None
+        self.capture_writer = None
+        self.protocol_name: Optional[str] = None
+        self.unit_dispatcher: Optional[UnitDispatcher] = None
+        self._stop_event = threading.Event()
+        # 有热加载的协议等待交换或收到停止请求时唤醒主循环
+        self._wake_event = threading.Event()
+
+    def load_protocol(self, protocol_name: str):
+        """加载协议, 由内部变量、解析器和应答引擎共享"""
+        protocol_map = self.config_manager.load_protocol_map(protocol_name)
+        self.internal_vars.load_protocol(protocol_map)
+        self.parser.set_protocol(protocol_map)
+        self.responder.set_protocol(protocol_map)
+        self.protocol_name = protocol_name
+        logger.info(f"Loaded protocol {protocol_name}: {len(protocol_map)} registers")
+
+    def reload_protocol(self, protocol_name: str, protocol_map):
+        """由主循环经 ProtocolSwap 调用, 把热加载线程编译好的协议交换到所有使用它的地方"""
+        if protocol_name == self.protocol_name:
+            self.responder.swap_protocol(protocol_map)
+            self.parser.set_protocol(protocol_map)
+        if self.unit_dispatcher:
+            for unit_id in self.unit_dispatcher.reload_protocol(protocol_name, protocol_map):
+                self.parser.set_unit_protocol(unit_id, protocol_map)
+        if self.port_manager:
+            self.port_manager.reload_protocol(protocol_name, protocol_map)
+
+    def setup_units(self):
+        """与界面相同: 主协议绑定到 slave_id, units 中的其他地址各自独立仿真"""
+        units = dict(self.config.get("units") or {})
+        if not units:
+            return
+        gui_unit = int(self.config.get("slave_id", 1))
+        units.pop(str(gui_unit), None)
+        dispatcher = UnitDispatcher.from_config(units, self.config_manager.load_protocol_map)
+        dispatcher.bind(gui_unit, self.responder)
+        self.unit_dispatcher = dispatcher
+        self.bus_responder = dispatcher
+        logger.info(f"Simulating units {dispatcher.unit_ids()}")
+
+    def _on_frame(self, port: str, data: bytes, direction: str):
+        result = self.parser.parse_message(data, port)
+        logger.info(f"{port} {direction}: {data.hex(' ').upper()} | "
+                    f"{self.parser.format_parse_result(result)}")
+
+    def _on_frame_timed(self, port: str, data: bytes, direction: str):
+        """与 _on_frame 相同, 记录每个阶段的耗时"""
+        clock = time.perf_counter_ns
+        timer = self.stage_timer
+        hex_index, parse_index, format_index, log_index = self._stage_indices
+        t0 = clock()
+        hex_data = data.hex(' ').upper()
+        t1 = clock()
+        result = self.parser.parse_message(data, port)
+        t2 = clock()
+        formatted = self.parser.format_parse_result(result)
+        t3 = clock()
+        logger.info(f"{port} {direction}: {hex_data} | {formatted}")
+        t4 = clock()
+        timer.record(hex_index, t1 - t0)
+        timer.record(parse_index, t2 - t1)
+        timer.record(format_index, t3 - t2)
+        timer.record(log_index, t4 - t3)
+
+    def _with_capture(self, on_frame):
+        """在读取线程上先写入抓包文件, 再交给原来的帧回调"""
+        write = self.capture_writer.write
+        if on_frame is None:
+            return write
+
+        def capture_and_handle(port: str, data: bytes, direction: str):
+            write(port, data, direction)
+            on_frame(port, data, direction)
+        return capture_and_handle
+
+    def start(self, serial_settings: Optional[Dict[str, Any]] = None,
+              tcp_port: Optional[int] = None, watch_protocols: bool = False,
+              metrics_port: Optional[int] = None, capture_path: Optional[str] = None) -> bool:
+        """
+        启动全部已配置的服务
+        Args:
+            serial_settings: 主串口设置, None 表示不打开主串口
+            tcp_port: 覆盖配置中的TCP端口并启用TCP服务
+            watch_protocols: 启用协议文件热加载 (也可在配置的 protocol_watch 中启用)
+            metrics_port: 覆盖配置中的指标端口并启用 Prometheus 指标端点
+            capture_path: 覆盖配置中的抓包文件路径并启用二进制抓包
+        Returns:
+            bool: 是否至少有一个服务在运行
+        """
+        if self.stage_timer is not None:
+            on_frame = self._on_frame_timed
+        else:
+            on_frame = self._on_frame if self.log_frames else None
+
+        capture_settings = dict(self.config.get("capture") or {})
+        if capture_path is not None:
+            capture_settings.update(enabled=True, path=capture_path)
+        if capture_settings.get("enabled"):
+            from capture import CaptureWriter
+            self.capture_writer = CaptureWriter(capture_settings.get("path", "captures/modbus.cap"),
+                                                capture_settings.get("max_bytes", 16 * 1024 * 1024),
+                                                capture_settings.get("backup_count", 5))
+            try:
+                self.capture_writer.open()
+                on_frame = self._with_capture(on_frame)
+            except OSError as e:
+                logger.error(f"Failed to open capture file: {e}")
+                self.capture_writer = None
+
+        if serial_settings:
+            self.serial_handler = SerialHandler(self.bus_responder, on_frame)
+            settings = dict(serial_settings)
+            if not self.serial_handler.open_port(settings.pop("port"), settings.pop("baudrate", 9600),
+                                                 **settings):
+                self.serial_handler = None
+
+        if self.config.get("ports"):
+            from port_manager import PortManager
+            self.port_manager = PortManager(self.config_manager.load_protocol_map, on_frame=on_frame,
+                                            parser=self.parser)
+            failed = self.port_manager.open_ports(self.config["ports"])
+            if failed:
+                logger.error(f"Failed to open ports: {', '.join(failed)}")
+
+        tcp_settings = dict(self.config.get("tcp_server") or {})
+        if tcp_port is not None:
+            tcp_settings.update(enabled=True, port=tcp_port)
+        if tcp_settings.get("enabled"):
+            from modbus_tcp_server import ModbusTCPServer
+            self.tcp_server = ModbusTCPServer(self.bus_responder, tcp_settings.get("host", "0.0.0.0"),
+                                              tcp_settings.get("port", 502))
+            if not self.tcp_server.start_in_thread():
+                self.tcp_server = None
+
+        simulation = self.config.get("simulation") or {}
+        if simulation.get("enabled"):
+            from waveform_engine import WaveformEngine
+            self.waveform_engine = WaveformEngine(self.internal_vars, simulation.get("rate", 10))
+            self.waveform_engine.load_config(simulation.get("generators", {}))
+            self.waveform_engine.start()
+
+        watch = self.config.get("protocol_watch") or {}
+        if watch_protocols or watch.get("enabled"):
+            from protocol_watcher import ProtocolSwap, ProtocolWatcher
+            self.protocol_swap = ProtocolSwap(self.reload_protocol, on_pending=self._wake_event.set)
+            self.protocol_watcher = ProtocolWatcher(self.config_manager, self.protocol_swap.submit,
+                                                    watch.get("interval", 1.0))
+            self.protocol_watcher.start()
+
+        metrics_settings = dict(self.config.get("metrics") or {})
+        if metrics_port is not None:
+            metrics_settings.update(enabled=True, port=metrics_port)
+        if metrics_settings.get("enabled"):
+            from metrics import MetricsServer
+            self.metrics_server = MetricsServer(host=metrics_settings.get("host", "127.0.0.1"),
+                                                port=metrics_settings.get("port", 9464))
+            if not self.metrics_server.start():
+                self.metrics_server = None
+
+        serving = (self.serial_handler is not None or self.tcp_server is not None
+                   or bool(self.port_manager and self.port_manager.workers))
+        if not serving:
+            logger.error("No serial port or TCP server could be started")
+        return serving
+
+    def run(self, duration: Optional[float] = None, stats_interval: float = 60.0):
+        """
+        运行直到收到 SIGINT/SIGTERM 或超过 duration 秒, 期间定期输出统计
+        热加载的协议在此主循环中交换
+        """
+        deadline = time.monotonic() + duration if duration is not None else None
+        next_stats = time.monotonic() + stats_interval
+        while not self._stop_event.is_set():
+            now = time.monotonic()
+            timeout = next_stats - now
+            if deadline is not None:
+                timeout = min(timeout, deadline - now)
+                if timeout <= 0:
+                    break
+            if self._wake_event.wait(timeout):
+                self._wake_event.clear()
+            if self._stop_event.is_set():
+                break
+            if self.protocol_swap:
+                self.protocol_swap.apply()
+            if time.monotonic() >= next_stats:
+                self.log_stats()
+                next_stats = time.monotonic() + stats_interval
+
+    def request_stop(self, *_):
+        self._stop_event.set()
+        self._wake_event.set()
+
+    def log_stats(self):
+        if self.serial_handler and self.serial_handler.serial_monitor:
+            logger.info(f"Serial port stats: {self.serial_handler.serial_monitor.get_stats()}")
+        if self.port_manager:
+            logger.info(f"Port manager stats: {self.port_manager.get_stats()['total']}")
+        if self.tcp_server:
+            logger.info(f"Modbus TCP server stats: {self.tcp_server.get_stats()}")
+        if self.waveform_engine:
+            logger.info(f"Waveform engine stats: {self.waveform_engine.get_stats()}")
+        if self.protocol_watcher:
+            logger.info(f"Protocol reload stats: {self.protocol_watcher.get_stats()}, "
+                        f"swap {self.protocol_swap.get_stats()}")
+        if self.capture_writer:
+            logger.info(f"Capture stats: {self.capture_writer.get_stats()}")
+        if self.stage_timer:
+            logger.info("Stage timing:\n" + '\n'.join(self.stage_timer.format_summary()))
+
+    def stop(self):
+        self.log_stats()
+        if self.protocol_watcher:
+            self.protocol_watcher.stop()
+        if self.metrics_server:
+            self.metrics_server.stop()
+        if self.waveform_engine:
+            self.waveform_engine.stop()
+        if self.tcp_server:
+            self.tcp_server.stop()
+        if self.port_manager:
+            self.port_manager.close_all()
+        if self.serial_handler:
+            self.serial_handler.close_port()
+        if self.capture_writer:
+            self.capture_writer.close()
+
+
+def run_headless(args) -> int:
+    """命令行无界面模式入口"""
+    config_manager = ConfigManager(args.config)
+    config_manager.load_config()
+    config = config_manager.config
+
+    simulator = HeadlessSimulator(config_manager, log_frames=args.log_frames,
+                                  stage_timing=args.stage_timing)
+    protocol_name = args.protocol or config.get("last_protocol")
+    if protocol_name:
+        try:
+            simulator.load_protocol(protocol_name)
+        except Exception as e:
+            logger.error(f"Failed to load protocol {protocol_name}: {e}")
+            return 1
+    else:
+        logger.warning("No protocol configured, all register reads will be rejected")
+    simulator.setup_units()
+
+    serial_settings = None
+    if not args.no_serial:
+        serial_settings = dict(config.get("serial_settings") or {})
+        serial_settings.pop("timeout", None)
+        if args.port:
+            serial_settings["port"] = args.port
+        if args.baudrate:
+            serial_settings["baudrate"] = args.baudrate
+        if "port" not in serial_settings:
+            serial_settings = None
+
+    if not simulator.start(serial_settings, args.tcp_port, args.watch_protocols, args.metrics_port,
+                           args.capture):
+        simulator.stop()
+        return 1
+
+    signal.signal(signal.SIGINT, simulator.request_stop)
+    signal.signal(signal.SIGTERM, simulator.request_stop)
+    logger.info("Headless simulator running")
+    try:
+        simulator.run(args.duration, args.stats_interval)
+    finally:
+        simulator.stop()
+    return 0
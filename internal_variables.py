@@ -1,10 +1,70 @@
 from datetime import datetime
+import math
 import logging
-from typing import Any, Dict, Optional, List, Tuple
+import threading
+from array import array
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Any, Dict, Iterable, Optional, List, Set, Tuple
 from dataclasses import dataclass
+from protocol_map import ProtocolMap
+from register_codec import INTEGER_TYPES, register_type
 
 logger = logging.getLogger(__name__)
 
+# 变量值的存储类型, 每种类型一列
+KIND_FLOAT = 0
+KIND_INT = 1
+KIND_OBJECT = 2
+
+KIND_NAMES = {'float': KIND_FLOAT, 'int': KIND_INT}
+OBJECT_TYPES = {'datetime': datetime}
+KIND_TYPES = (float, int, None)
+
+# 未加载协议时的内置变量, 格式与协议中的 variable_mapping 相同
+DEFAULT_VARIABLES = {
+    'timestamp': {
+        'name': "时间戳",
+        'type': 'datetime',
+        'description': "Current timestamp",
+        'format': "%Y-%m-%d %H:%M:%S"
+    },
+    'voltage': {
+        'name': "电压",
+        'type': 'float',
+        'description': "Current voltage",
+        'unit': "V",
+        'min': 0.0,
+        'max': 380.0,
+        'default': 220.0
+    },
+    'current': {
+        'name': "电流",
+        'type': 'float',
+        'description': "Current amperage",
+        'unit': "A",
+        'min': 0.0,
+        'max': 100.0
+    },
+    'power': {
+        'name': "功率",
+        'type': 'float',
+        'description': "Active power",
+        'unit': "kW",
+        'min': 0.0,
+        'max': 999999.9
+    },
+    'energy': {
+        'name': "电能",
+        'type': 'float',
+        'description': "Total energy consumption",
+        'unit': "kWh",
+        'min': 0.0,
+        'max': 999999.9
+    }
+}
+
+
 @dataclass
 class VariableInfo:
     """变量信息数据类"""
@@ -17,158 +77,359 @@ class VariableInfo:
     max_value: Optional[float] = None
     format_str: str = "{:.1f}"
 
+
+def _field(definition: Dict[str, Any], key: str) -> Any:
+    """读取变量定义字段, variable_mapping 中的字段优先于寄存器定义"""
+    mapping = definition.get('variable_mapping')
+    if mapping and key in mapping:
+        return mapping[key]
+    return definition.get(key)
+
+
 class InternalVariables:
-    def __init__(self):
-        # 初始化内部变量
-        self._variables = {
-            'timestamp': VariableInfo(
-                name="时间戳",
-                value=datetime.now(),
-                type=datetime,
-                description="Current timestamp",
-                unit=None,
-                format_str="%Y-%m-%d %H:%M:%S"
-            ),
-            'voltage': VariableInfo(
-                name="电压",
-                value=220.0,
-                type=float,
-                description="Current voltage",
-                unit="V",
-                min_value=0.0,
-                max_value=380.0
-            ),
-            'current': VariableInfo(
-                name="电流",
-                value=0.0,
-                type=float,
-                description="Current amperage",
-                unit="A",
-                min_value=0.0,
-                max_value=100.0
-            ),
-            'power': VariableInfo(
-                name="功率",
-                value=0.0,
-                type=float,
-                description="Active power",
-                unit="kW",
-                min_value=0.0,
-                max_value=999999.9
-            ),
-            'energy': VariableInfo(
-                name="电能",
-                value=0.0,
-                type=float,
-                description="Total energy consumption",
-                unit="kWh",
-                min_value=0.0,
-                max_value=999999.9
-            )
-        }
-        
-        # 寄存器到变量的映射
-        self._register_mapping = {
-            '0x1000': 'voltage',
-            '0x1001': 'current',
-            '0x1002': 'power',
-            '0x1003': 'energy',
-            '0x1004': 'timestamp'
-        }
-        
-        self._observers = []
-
-    def add_observer(self, observer):
-        """添加观察者"""
-        if observer not in self._observers:
-            self._observers.append(observer)
+    """
+    内部变量表
+
+    变量由协议中的 variable_mapping 生成 (未加载协议时为内置变量), 按列存储:
+    变量值按类型存放在 array('d') / array('q') / list 中, 范围按 (下限, 上限)
+    去重后只保存编号 (NaN表示不限), 其余元数据只保存对协议定义的引用, 在需要
+    时才生成 VariableInfo。
+
+    变量名索引不使用 dict (每个变量要一个字典项和一个行号整数对象, 约50字节),
+    而是按名称哈希排序的 array('q') 和对应行号 array('I'), 查找时二分后比较
+    名称。每个变量的开销约为 45 字节。
+
+    变化通知是合并的: 写入只把变量名加入脏集合, 在 batch() 结束 (或单独的
+    set_variable 完成) 时以一次 on_variables_updated(names) 事件交给观察者,
+    观察者可以只订阅关心的变量。
+    """
+
+    def __init__(self, defaults: bool = True):
+        self._names: List[str] = []                # 行号 -> 变量名
+        # 名称索引: (按哈希排序的名称哈希, 对应的行号), 整体替换以便无锁读取
+        self._lookup = (array('q'), array('I'))
+        self._kinds = bytearray()                  # 行号 -> 存储类型
+        self._slots = array('I')                   # 行号 -> 所在列中的下标
+        self._columns = (array('d'), array('q'), [])
+        self._object_types: List[type] = []        # object 列中各值的类型
+        self._limit_ids = array('I')               # 行号 -> 范围编号
+        self._limits: List[Tuple[float, float]] = []
+        self._limit_table: Dict[tuple, int] = {}
+        self._definitions: List[Dict[str, Any]] = []
+        self._protocol_map: Optional[ProtocolMap] = None
+        self._observers: List[Tuple[Any, Optional[frozenset]]] = []
+        # 脏集合由 _notify_lock 保护; 批量深度按线程记录, 仿真、串口读取和协议监视
+        # 线程各自的 batch() 只推迟本线程的通知, 互不干扰
+        self._dirty: Set[str] = set()
+        self._batch_state = threading.local()
+        self._notify_lock = threading.Lock()
+        # 变量表结构 (新增变量) 的锁, 协议热加载时在整个交换过程中持有, 见 ModbusResponder.swap_protocol
+        self.layout_lock = threading.RLock()
+
+        if defaults:
+            for name, definition in DEFAULT_VARIABLES.items():
+                self._add(name, definition)
+            self._reindex()
+            self._columns[KIND_OBJECT][self._slots[self._row('timestamp')]] = datetime.now()
+
+    @classmethod
+    def from_protocol(cls, protocol, defaults: bool = True) -> 'InternalVariables':
+        """根据协议定义 (或已编译的ProtocolMap) 生成变量表"""
+        variables = cls(defaults)
+        variables.load_protocol(protocol)
+        return variables
+
+    def load_protocol(self, protocol) -> List[str]:
+        """
+        为协议中 variable_mapping 引用的变量建立存储, 已存在的变量保持不变
+        Returns:
+            list: 新增的变量名
+        """
+        protocol_map = ProtocolMap.compile(protocol)
+        added = []
+        seen = set()
+        with self.layout_lock:
+            self._protocol_map = protocol_map
+            for entry in protocol_map.entries:
+                name = entry.variable
+                if name is None or name in seen or self._row(name) is not None:
+                    continue
+                self._add(name, entry.info, self._entry_kind(entry.info))
+                seen.add(name)
+                added.append(name)
+            if added:
+                self._reindex()
+        if added:
+            logger.info(f"Added {len(added)} variables from protocol")
+        return added
+
+    @staticmethod
+    def _entry_kind(info: Dict[str, Any]) -> str:
+        """推断寄存器绑定变量的类型: 无缩放、无转换的整数寄存器为整数, 其余为浮点"""
+        declared = info['variable_mapping'].get('type')
+        if declared:
+            return declared
+        read = info['variable_mapping'].get('conversion', {}).get('read', 'value')
+        if register_type(info) in INTEGER_TYPES and not info.get('scale') and read.strip() == 'value':
+            return 'int'
+        return 'float'
+
+    def _row(self, name: str) -> Optional[int]:
+        """变量名对应的行号, 不存在时返回None"""
+        hashes, rows = self._lookup
+        key = hash(name)
+        names = self._names
+        position = bisect_left(hashes, key)
+        count = len(hashes)
+        while position < count and hashes[position] == key:
+            row = rows[position]
+            if names[row] == name:
+                return row
+            position += 1
+        return None
+
+    def _reindex(self):
+        """添加变量后重建名称索引"""
+        names = self._names
+        keys = [hash(name) for name in names]
+        order = sorted(range(len(names)), key=keys.__getitem__)
+        self._lookup = (array('q', [keys[row] for row in order]), array('I', order))
+
+    def _add(self, name: str, definition: Dict[str, Any], type_name: Optional[str] = None):
+        type_name = type_name or definition.get('type', 'float')
+        if type_name in KIND_NAMES:
+            kind = KIND_NAMES[type_name]
+            value = KIND_TYPES[kind](_field(definition, 'default') or 0)
+        elif type_name in OBJECT_TYPES:
+            kind = KIND_OBJECT
+            value = None
+            self._object_types.append(OBJECT_TYPES[type_name])
+        else:
+            raise ValueError(f"Unknown variable type {type_name} for {name}")
+
+        lo, hi = _field(definition, 'min'), _field(definition, 'max')
+        limits = (math.nan if lo is None else float(lo), math.nan if hi is None else float(hi))
+        limit_key = (lo, hi)
+        limit_id = self._limit_table.get(limit_key)
+        if limit_id is None:
+            limit_id = self._limit_table[limit_key] = len(self._limits)
+            self._limits.append(limits)
+
+        column = self._columns[kind]
+        self._names.append(name)
+        self._kinds.append(kind)
+        self._slots.append(len(column))
+        column.append(value)
+        self._limit_ids.append(limit_id)
+        self._definitions.append(definition)
+
+    def __len__(self) -> int:
+        return len(self._names)
+
+    def __contains__(self, name: str) -> bool:
+        return self._row(name) is not None
+
+    def add_observer(self, observer, names: Optional[Iterable[str]] = None):
+        """
+        添加观察者, 已添加的观察者更新订阅范围
+        Args:
+            observer: 实现 on_variables_updated(names) 或 on_variable_updated(name) 的对象
+            names: 只订阅这些变量, None 表示全部
+        """
+        subscription = None if names is None else frozenset(names)
+        with self._notify_lock:
+            self._observers = [(obs, subs) for obs, subs in self._observers if obs is not observer]
+            self._observers.append((observer, subscription))
 
     def remove_observer(self, observer):
         """移除观察者"""
-        if observer in self._observers:
-            self._observers.remove(observer)
+        with self._notify_lock:
+            self._observers = [(obs, subs) for obs, subs in self._observers if obs is not observer]
 
     def notify_observers(self, var_name: str):
-        """通知所有观察者变量更新"""
-        for observer in self._observers:
-            observer.on_variable_updated(var_name)
+        """标记变量已更新, 不在批量更新中时立即通知"""
+        with self._notify_lock:
+            self._dirty.add(var_name)
+        if not self._in_batch():
+            self.flush()
+
+    def _in_batch(self) -> bool:
+        """当前线程是否处于 batch() 中"""
+        return getattr(self._batch_state, 'depth', 0) > 0
+
+    @contextmanager
+    def batch(self):
+        """批量更新: 当前线程期间的所有变化在结束时合并为一次通知"""
+        state = self._batch_state
+        state.depth = getattr(state, 'depth', 0) + 1
+        try:
+            yield self
+        finally:
+            state.depth -= 1
+            if not state.depth:
+                self.flush()
+
+    def flush(self):
+        """把脏集合中的变量一次性通知给订阅了它们的观察者"""
+        with self._notify_lock:
+            if not self._dirty:
+                return
+            changed, self._dirty = self._dirty, set()
+            observers = self._observers
+
+        for observer, subscription in observers:
+            names = changed if subscription is None else changed & subscription
+            if not names:
+                continue
+            handler = getattr(observer, 'on_variables_updated', None)
+            if handler is not None:
+                handler(names)
+            else:
+                # 兼容只实现单变量回调的观察者
+                for name in names:
+                    observer.on_variable_updated(name)
+
+    def _type_of(self, index: int) -> type:
+        kind = self._kinds[index]
+        return KIND_TYPES[kind] or self._object_types[self._slots[index]]
+
+    def _format_of(self, index: int) -> str:
+        format_str = _field(self._definitions[index], 'format')
+        if format_str:
+            return format_str
+        return "{}" if self._kinds[index] == KIND_INT else "{:.1f}"
 
     def get_variable_info(self, name: str) -> Optional[VariableInfo]:
-        """获取变量的完整信息"""
-        return self._variables.get(name)
+        """获取变量的完整信息 (快照)"""
+        index = self._row(name)
+        if index is None:
+            return None
+        definition = self._definitions[index]
+        lo, hi = self._limits[self._limit_ids[index]]
+        return VariableInfo(
+            name=definition.get('name') or name,
+            value=self._columns[self._kinds[index]][self._slots[index]],
+            type=self._type_of(index),
+            description=_field(definition, 'description') or "",
+            unit=_field(definition, 'unit'),
+            min_value=None if math.isnan(lo) else lo,
+            max_value=None if math.isnan(hi) else hi,
+            format_str=self._format_of(index)
+        )
 
     def get_variable(self, name: str) -> Optional[Any]:
         """获取变量值"""
-        var_info = self._variables.get(name)
-        return var_info.value if var_info else None
+        index = self._row(name)
+        if index is None:
+            return None
+        return self._columns[self._kinds[index]][self._slots[index]]
 
     def get_formatted_value(self, name: str) -> Optional[str]:
         """获取格式化后的变量值"""
-        var_info = self._variables.get(name)
-        if not var_info:
+        index = self._row(name)
+        if index is None:
             return None
-            
+
+        value = self._columns[self._kinds[index]][self._slots[index]]
+        format_str = self._format_of(index)
         try:
-            if isinstance(var_info.value, datetime):
-                return var_info.value.strftime(var_info.format_str)
-            return var_info.format_str.format(var_info.value)
+            if isinstance(value, datetime):
+                return value.strftime(format_str)
+            return format_str.format(value)
         except Exception as e:
             logger.error(f"Error formatting value for {name}: {e}")
-            return str(var_info.value)
+            return str(value)
 
     def set_variable(self, name: str, value: Any) -> bool:
         """设置变量值"""
-        if name not in self._variables:
+        index = self._row(name)
+        if index is None:
             logger.error(f"Variable {name} does not exist")
             return False
 
         try:
-            var_info = self._variables[name]
-            
             # 类型检查和转换
-            if not isinstance(value, var_info.type):
-                value = var_info.type(value)
-            
+            value_type = self._type_of(index)
+            if not isinstance(value, value_type):
+                value = value_type(value)
+
             # 范围检查
-            if var_info.min_value is not None and var_info.max_value is not None:
-                if value < var_info.min_value or value > var_info.max_value:
+            lo, hi = self._limits[self._limit_ids[index]]
+            if not (math.isnan(lo) or math.isnan(hi)):
+                if value < lo or value > hi:
                     logger.error(f"Value {value} out of range for {name}")
                     return False
-            
-            var_info.value = value
+
+            self._columns[self._kinds[index]][self._slots[index]] = value
             self.notify_observers(name)
             return True
-            
-        except ValueError as e:
+
+        except (ValueError, TypeError, OverflowError) as e:
             logger.error(f"Error setting variable {name}: {e}")
             return False
 
+    def float_slots(self, names: Iterable[str]) -> List[int]:
+        """获取浮点变量在浮点列中的下标, 供 store_floats 批量写入"""
+        slots = []
+        for name in names:
+            index = self._row(name)
+            if index is None:
+                raise KeyError(f"Variable {name} does not exist")
+            if self._kinds[index] != KIND_FLOAT:
+                raise ValueError(f"Variable {name} is not a float variable")
+            slots.append(self._slots[index])
+        return slots
+
+    def float_values(self) -> array:
+        """浮点列的副本 (按 float_slots 的下标), 供批量编码一次读取全部浮点变量"""
+        return array('d', self._columns[KIND_FLOAT])
+
+    def store_floats(self, names: List[str], slots: List[int], values: Iterable[float]):
+        """
+        批量写入浮点变量并合并为一次通知
+        跳过类型和范围检查, 调用方需保证数值有效 (用于仿真引擎等高频写入)
+        """
+        column = self._columns[KIND_FLOAT]
+        for slot, value in zip(slots, values):
+            column[slot] = value
+        with self._notify_lock:
+            self._dirty.update(names)
+        if not self._in_batch():
+            self.flush()
+
     def get_all_variables(self) -> Dict[str, VariableInfo]:
         """获取所有变量信息"""
-        return self._variables
+        return {name: self.get_variable_info(name) for name in self._names}
 
     def get_all_formatted_values(self) -> Dict[str, str]:
         """获取所有变量的格式化值"""
-        return {name: self.get_formatted_value(name) 
-                for name in self._variables}
+        return {name: self.get_formatted_value(name)
+                for name in self._names}
 
     def update_timestamp(self):
-        """更新时间戳"""
-        self.set_variable('timestamp', datetime.now())
+        """更新时间戳 (值类型固定, 跳过类型和范围检查), 没有时间戳变量时不做处理"""
+        index = self._row('timestamp')
+        if index is None or self._kinds[index] != KIND_OBJECT:
+            return
+        self._columns[KIND_OBJECT][self._slots[index]] = datetime.now()
+        self.notify_observers('timestamp')
 
     def get_register_value(self, register_addr: str) -> Optional[Any]:
-        """通过寄存器地址获取对应的变量值"""
-        if register_addr in self._register_mapping:
-            var_name = self._register_mapping[register_addr]
-            return self.get_variable(var_name)
-        return None
+        """通过寄存器地址 (如 "0x0002") 获取绑定变量的值"""
+        if self._protocol_map is None:
+            return None
+        entry = self._protocol_map.lookup(int(register_addr, 16))
+        if entry is None or entry.variable is None:
+            return None
+        return self.get_variable(entry.variable)
 
     def get_variable_metadata(self) -> List[Dict[str, Any]]:
         """获取所有变量的元数据，用于UI显示"""
         metadata = []
-        for name, info in self._variables.items():
+        for name in self._names:
             if name == 'timestamp':
                 continue  # 时间戳单独处理
+            info = self.get_variable_info(name)
             metadata.append({
                 'name': name,
                 'display_name': info.name,
@@ -180,13 +441,14 @@ class InternalVariables:
         return metadata
 
     def batch_update(self, updates: Dict[str, Any]) -> Tuple[bool, List[str]]:
-        """批量更新变量值"""
+        """批量更新变量值, 全部更新完成后只通知一次"""
         success = True
         errors = []
-        
-        for name, value in updates.items():
-            if not self.set_variable(name, value):
-                success = False
-                errors.append(name)
-                
-        return success, errors 
\ No newline at end of file
+
+        with self.batch():
+            for name, value in updates.items():
+                if not self.set_variable(name, value):
+                    success = False
+                    errors.append(name)
+
+        return success, errors
@@ -0,0 +1,126 @@
+import time
+import datetime
+import threading
+import logging
+from collections import deque
+from typing import List, Tuple
+from PyQt5.QtWidgets import QPlainTextEdit
+from PyQt5.QtCore import QTimer
+from stage_timer import STAGE_APPEND
+
+logger = logging.getLogger(__name__)
+
+
+def format_log_entry(message: str, message_type: str = "INFO") -> str:
+    """生成带时间戳和级别的日志条目"""
+    timestamp = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    return f"[{timestamp}] [{message_type}] {message}"
+
+
+class LogBuffer:
+    """
+    线程安全的环形日志缓冲区
+    缓冲区满时丢弃最旧的条目并计数
+    """
+
+    def __init__(self, capacity: int = 5000):
+        self._entries = deque(maxlen=capacity)
+        self._lock = threading.Lock()
+        self._dropped = 0
+        self.dropped_total = 0
+
+    def append(self, entry: str):
+        with self._lock:
+            if len(self._entries) == self._entries.maxlen:
+                self._dropped += 1
+                self.dropped_total += 1
+            self._entries.append(entry)
+
+    def extend(self, entries: List[str]):
+        with self._lock:
+            overflow = len(self._entries) + len(entries) - self._entries.maxlen
+            if overflow > 0:
+                self._dropped += overflow
+                self.dropped_total += overflow
+            self._entries.extend(entries)
+
+    def drain(self) -> Tuple[List[str], int]:
+        """
+        取出全部条目
+        Returns:
+            tuple: (条目列表, 上次取出后丢弃的条目数)
+        """
+        with self._lock:
+            entries = list(self._entries)
+            self._entries.clear()
+            dropped, self._dropped = self._dropped, 0
+        return entries, dropped
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class LogView(QPlainTextEdit):
+    """
+    批量刷新的有界日志窗口
+
+    日志先写入环形缓冲区, 由合并定时器每 flush_interval 毫秒一次性追加到
+    窗口; 窗口最多保留 max_blocks 行。单次刷新超过 max_flush_entries 条时
+    只显示最新的条目, 丢弃的条数以一行提示报告。
+    """
+
+    def __init__(self, parent=None, max_blocks: int = 10000, flush_interval: int = 100,
+                 buffer_capacity: int = 5000, max_flush_entries: int = 1000):
+        super().__init__(parent)
+        self.setReadOnly(True)
+        self.setMaximumBlockCount(max_blocks)
+        self.buffer = LogBuffer(buffer_capacity)
+        self.max_flush_entries = max_flush_entries
+        self.dropped_total = 0
+        self.timer = None
+
+        self._flush_timer = QTimer(self)
+        self._flush_timer.timeout.connect(self.flush)
+        self._flush_timer.start(flush_interval)
+
+    def set_timer(self, timer):
+        """启用 (timer 为 StageTimer) 或关闭 (None) 窗口追加计时, 按条目平均记录"""
+        if timer is not None:
+            self._append_index = timer.index(STAGE_APPEND)
+        self.timer = timer
+
+    def append_entry(self, text: str):
+        """添加一条日志 (可从任意线程调用)"""
+        self.buffer.append(text)
+
+    def append_entries(self, entries: List[str]):
+        """批量添加日志 (可从任意线程调用)"""
+        self.buffer.extend(entries)
+
+    def flush(self):
+        """把缓冲区中的日志一次性追加到窗口"""
+        entries, dropped = self.buffer.drain()
+        if not entries and not dropped:
+            return
+
+        if len(entries) > self.max_flush_entries:
+            dropped += len(entries) - self.max_flush_entries
+            entries = entries[-self.max_flush_entries:]
+
+        if dropped:
+            self.dropped_total += dropped
+            logger.warning(f"Log view overloaded, dropped {dropped} entries")
+            entries.insert(0, f"[日志过载] 已丢弃 {dropped} 条日志 (累计 {self.dropped_total} 条)")
+
+        timer = self.timer
+        started = time.perf_counter_ns() if timer is not None else 0
+        self.appendPlainText('\n'.join(entries))
+        scrollbar = self.verticalScrollBar()
+        scrollbar.setValue(scrollbar.maximum())
+        if timer is not None:
+            timer.record(self._append_index, (time.perf_counter_ns() - started) // len(entries))
+
+    def clear(self):
+        self.buffer.clear()
+        super().clear()
@@ -1,8 +1,6 @@
 import sys
+import argparse
 import logging
-from PyQt5.QtWidgets import QApplication
-from PyQt5.QtGui import QFont
-from modbus import ModbusSimulator
 
 # 配置日志
 logging.basicConfig(
@@ -16,21 +14,55 @@ logging.basicConfig(
 
 logger = logging.getLogger(__name__)
 
-def main():
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Modbus Protocol Simulator")
+    parser.add_argument('--headless', action='store_true', help="run without GUI (PyQt5 is not imported)")
+    parser.add_argument('--config', default='config.json', help="configuration file")
+    parser.add_argument('--protocol', help="protocol name, defaults to last_protocol in the configuration")
+    parser.add_argument('--port', help="serial port, overrides serial_settings.port")
+    parser.add_argument('--baudrate', type=int, help="overrides serial_settings.baudrate")
+    parser.add_argument('--no-serial', action='store_true', help="do not open the main serial port")
+    parser.add_argument('--tcp-port', type=int, help="enable the Modbus TCP server on this port")
+    parser.add_argument('--duration', type=float, help="exit after this many seconds")
+    parser.add_argument('--stats-interval', type=float, default=60.0, help="seconds between stats logs")
+    parser.add_argument('--log-frames', action='store_true', help="decode and log every frame")
+    parser.add_argument('--watch-protocols', action='store_true',
+                        help="reload protocol files when they change on disk")
+    parser.add_argument('--metrics-port', type=int,
+                        help="serve Prometheus metrics on http://127.0.0.1:PORT/metrics")
+    parser.add_argument('--stage-timing', action='store_true',
+                        help="time each decode stage of every frame (implies --log-frames)")
+    parser.add_argument('--capture', metavar='PATH',
+                        help="write every raw frame to a rotating binary capture file")
+    return parser.parse_known_args(argv)[0]
+
+def run_gui():
+    # Qt 只在图形界面模式下导入
+    from PyQt5.QtWidgets import QApplication
+    from PyQt5.QtGui import QFont
+    from modbus import ModbusSimulator
+    
+    # 创建QApplication实例
+    app = QApplication(sys.argv)
+    
+    # 设置应用程序范围的字体
+    app.setFont(QFont('Segoe UI', 9))
+    
+    # 创建并显示主窗口
+    logger.info("Starting Modbus Simulator...")
+    window = ModbusSimulator()
+    window.show()
+    
+    # 启动应用程序事件循环
+    return app.exec_()
+
+def main(argv=None):
     try:
-        # 创建QApplication实例
-        app = QApplication(sys.argv)
-        
-        # 设置应用程序范围的字体
-        app.setFont(QFont('Segoe UI', 9))
-        
-        # 创建并显示主窗口
-        logger.info("Starting Modbus Simulator...")
-        window = ModbusSimulator()
-        window.show()
-        
-        # 启动应用程序事件循环
-        return app.exec_()
+        args = parse_args(argv)
+        if args.headless:
+            from headless import run_headless
+            return run_headless(args)
+        return run_gui()
         
     except Exception as e:
         logger.error(f"Application error: {str(e)}")
@@ -0,0 +1,251 @@
+import math
+import logging
+import threading
+from bisect import bisect_left
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+# 应答耗时 (秒): 0.1ms ~ 1s
+LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025,
+                   0.05, 0.1, 0.25, 0.5, 1.0)
+# 队列深度
+DEPTH_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 5000, 10000)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+class Counter:
+    """
+    单调递增计数器
+    热路径上只做一次属性自增, 与各模块原有的统计计数相同, 不加锁
+    """
+
+    def __init__(self):
+        self.value = 0
+
+    def inc(self, amount: int = 1):
+        self.value += amount
+
+
+class Histogram:
+    """
+    累积分桶直方图 (Prometheus 语义: 每个桶统计 <= 上界的观测数)
+    观测时只增加第一个命中的桶, 导出时再累加
+    """
+
+    def __init__(self, buckets: Sequence[float]):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        cumulative = []
+        total = 0
+        for bound, count in zip(self.buckets + (math.inf,), self.counts):
+            total += count
+            cumulative.append((bound, total))
+        return {'buckets': cumulative, 'sum': self.sum, 'count': self.count}
+
+
+class MetricFamily:
+    """同名指标按标签值区分的一组计数器或直方图"""
+
+    def __init__(self, name: str, kind: str, help_text: str,
+                 label_names: Tuple[str, ...] = (), buckets: Sequence[float] = ()):
+        self.name = name
+        self.kind = kind
+        self.help = help_text
+        self.label_names = label_names
+        self.buckets = tuple(buckets)
+        self._children: Dict[Tuple[str, ...], Any] = {}
+        self._lock = threading.Lock()
+
+    def labels(self, *values) -> Any:
+        """获取标签值对应的指标, 应在初始化时取得并保存, 不在热路径上调用"""
+        key = tuple(str(value) for value in values)
+        if len(key) != len(self.label_names):
+            raise ValueError(f"Metric {self.name} expects labels {self.label_names}")
+        child = self._children.get(key)
+        if child is None:
+            with self._lock:
+                child = self._children.get(key)
+                if child is None:
+                    child = Histogram(self.buckets) if self.kind == 'histogram' else Counter()
+                    self._children[key] = child
+        return child
+
+    def children(self):
+        with self._lock:
+            return list(self._children.items())
+
+
+class MetricsRegistry:
+    """
+    指标注册表
+
+    各模块在初始化时注册 (同名重复注册返回同一指标) 并保存标签对应的
+    计数器或直方图, 运行中只做自增和分桶计数。snapshot() 返回字典形式的
+    快照, render() 输出 Prometheus 文本格式。
+    """
+
+    def __init__(self):
+        self._families: Dict[str, MetricFamily] = {}
+        self._lock = threading.Lock()
+
+    def _register(self, name, kind, help_text, label_names, buckets=()) -> MetricFamily:
+        with self._lock:
+            family = self._families.get(name)
+            if family is None:
+                family = MetricFamily(name, kind, help_text, tuple(label_names), buckets)
+                self._families[name] = family
+            elif family.kind != kind or family.label_names != tuple(label_names):
+                raise ValueError(f"Metric {name} already registered with a different definition")
+            return family
+
+    def counter(self, name: str, help_text: str, label_names: Sequence[str] = ()) -> MetricFamily:
+        return self._register(name, 'counter', help_text, label_names)
+
+    def histogram(self, name: str, help_text: str, buckets: Sequence[float] = LATENCY_BUCKETS,
+                  label_names: Sequence[str] = ()) -> MetricFamily:
+        return self._register(name, 'histogram', help_text, label_names, buckets)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """
+        获取全部指标的快照
+        Returns:
+            dict: {指标名: {"type", "help", "samples": [{"labels": {...}, "value" 或 直方图字段}]}}
+        """
+        with self._lock:
+            families = list(self._families.values())
+        result = {}
+        for family in families:
+            samples = []
+            for key, child in family.children():
+                labels = dict(zip(family.label_names, key))
+                if family.kind == 'histogram':
+                    samples.append(dict(child.snapshot(), labels=labels))
+                else:
+                    samples.append({'labels': labels, 'value': child.value})
+            result[family.name] = {'type': family.kind, 'help': family.help, 'samples': samples}
+        return result
+
+    def render(self) -> str:
+        """Prometheus 文本格式 (version 0.0.4)"""
+        lines = []
+        for name, family in self.snapshot().items():
+            lines.append(f"# HELP {name} {family['help']}")
+            lines.append(f"# TYPE {name} {family['type']}")
+            for sample in family['samples']:
+                labels = sample['labels']
+                if family['type'] == 'histogram':
+                    for bound, count in sample['buckets']:
+                        le = '+Inf' if bound == math.inf else repr(float(bound))
+                        lines.append(f"{name}_bucket{_format_labels(labels, le=le)} {count}")
+                    lines.append(f"{name}_sum{_format_labels(labels)} {sample['sum']!r}")
+                    lines.append(f"{name}_count{_format_labels(labels)} {sample['count']}")
+                else:
+                    lines.append(f"{name}{_format_labels(labels)} {sample['value']}")
+        lines.append('')
+        return '\n'.join(lines)
+
+
+def _format_labels(labels: Dict[str, str], **extra) -> str:
+    items = dict(labels, **extra)
+    if not items:
+        return ''
+    escaped = (f'{key}="{_escape(value)}"' for key, value in items.items())
+    return '{' + ','.join(escaped) + '}'
+
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+# 进程内默认注册表, 各模块的指标都注册到这里
+REGISTRY = MetricsRegistry()
+
+FRAMES_RECEIVED = REGISTRY.counter(
+    'modbus_frames_received_total', "RTU frames received by the serial reader", ('port',))
+FRAMES_SENT = REGISTRY.counter(
+    'modbus_frames_sent_total', "Response frames written by the serial reader", ('port',))
+TURNAROUND = REGISTRY.histogram(
+    'modbus_turnaround_seconds', "Time from a complete request to the response being written",
+    LATENCY_BUCKETS, ('port',))
+CRC_ERRORS = REGISTRY.counter(
+    'modbus_crc_errors_total', "Frames with an invalid CRC", ('source',))
+UNKNOWN_FUNCTIONS = REGISTRY.counter(
+    'modbus_unknown_function_total', "Frames with an unsupported function code", ('source',))
+EXCEPTIONS_SENT = REGISTRY.counter(
+    'modbus_exceptions_sent_total', "Exception responses sent by the responder", ('code',))
+REQUESTS = REGISTRY.counter(
+    'modbus_requests_total', "Requests handled by the responder", ('function',))
+FRAMES_PARSED = REGISTRY.counter(
+    'modbus_frames_parsed_total', "Frames decoded by the parser")
+DECODE_QUEUE_DEPTH = REGISTRY.histogram(
+    'modbus_decode_queue_depth', "Frames waiting in the decode queue when a frame is submitted",
+    DEPTH_BUCKETS)
+
+
+def snapshot() -> Dict[str, Any]:
+    """默认注册表的快照"""
+    return REGISTRY.snapshot()
+
+
+class MetricsServer:
+    """
+    本机 HTTP 指标端点
+    GET /metrics 返回 Prometheus 文本格式, 在后台线程中服务, 默认只监听回环地址
+    """
+
+    def __init__(self, registry: MetricsRegistry = REGISTRY, host: str = '127.0.0.1', port: int = 9464):
+        self.registry = registry
+        self.host = host
+        self.port = port
+        self._server: Optional[ThreadingHTTPServer] = None
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> bool:
+        registry = self.registry
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split('?', 1)[0] != '/metrics':
+                    self.send_error(404)
+                    return
+                body = registry.render().encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', CONTENT_TYPE)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        try:
+            self._server = ThreadingHTTPServer((self.host, self.port), Handler)
+        except OSError as e:
+            logger.error(f"Failed to start metrics endpoint on {self.host}:{self.port}: {e}")
+            return False
+        self._server.daemon_threads = True
+        self.port = self._server.server_address[1]
+        self._thread = threading.Thread(target=self._server.serve_forever, name="MetricsServer", daemon=True)
+        self._thread.start()
+        logger.info(f"Metrics endpoint listening on http://{self.host}:{self.port}/metrics")
+        return True
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._thread.join()
+            self._server = None
+            self._thread = None
@@ -1,5 +1,4 @@
 import sys
-import json
 import serial
 import logging
 from PyQt5.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout, 
@@ -8,14 +7,21 @@ from PyQt5.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout,
 from PyQt5.QtCore import Qt, QThread, pyqtSignal, QTimer
 from PyQt5.QtGui import QFont, QPalette, QColor, QIcon, QPixmap
 from serial.serialutil import SerialException
-import datetime
 from serial_settings_dialog import SerialSettingsDialog
 from protocol_settings_dialog import ProtocolSettingsDialog
-import os
 from config_manager import ConfigManager
 from serial_handler import SerialHandler
+from serial_monitor import SerialMonitorThread
+from serial_reader import DIRECTION_RX, DIRECTION_TX
 from modbus_parser import ModbusParser
+from modbus_responder import ModbusResponder
 from internal_variables import InternalVariables
+from log_view import LogView, format_log_entry
+from decode_worker import DecodeWorker
+from modbus_tcp_server import ModbusTCPServer
+from unit_dispatcher import UnitDispatcher
+from port_manager import PortManager
+from stage_timer import StageTimer, GUI_STAGES
 
 logger = logging.getLogger(__name__)
 
@@ -47,16 +53,24 @@ class PortComboBox(QComboBox):
         super().showPopup()
 
 class ModbusSimulator(QMainWindow):
+    # 主站 (串口或TCP) 写入寄存器后得到的变量值, 由读取线程发出
+    variables_written = pyqtSignal(dict)
+    # 内部变量变化通知可能来自仿真引擎线程, 经信号转到GUI线程刷新界面
+    variables_changed = pyqtSignal(object)
+    # 热加载线程编译好新协议后发出, 协议在GUI线程中交换
+    protocol_pending = pyqtSignal()
+    
     def __init__(self):
         super().__init__()
         self.setWindowTitle("Modbus Protocol Simulator")
         
         # Initialize serial port attribute
         self.serial_port = None
+        self.current_protocol = None
+        self.current_protocol_name = None
         
         # 首先初始化关键属性
-        self.output_text = QTextEdit()
-        self.output_text.setReadOnly(True)
+        self.output_text = LogView()
         
         # 设置应用图标
         icon_data = base64.b64decode(ICON_BASE64)
@@ -109,7 +123,7 @@ class ModbusSimulator(QMainWindow):
             QLabel {
                 font-size: 11pt;
             }
-            QTextEdit {
+            QTextEdit, QPlainTextEdit {
                 border: 1px solid #c0c0c0;
                 border-radius: 4px;
                 padding: 5px;
@@ -129,15 +143,34 @@ class ModbusSimulator(QMainWindow):
         # 初始化各个模块
         self.config_manager = ConfigManager()
         self.serial_handler = SerialHandler() 
-        self.modbus_parser = ModbusParser()
-        
-        # 加载配置
+        # 解析器与应答引擎共享同一组内部变量
+        self.internal_vars = InternalVariables()
+        self.modbus_parser = ModbusParser(self.internal_vars)
+        self.responder = ModbusResponder(self.internal_vars, on_write=self.variables_written.emit)
+        self.variables_written.connect(self.apply_written_variables)
+        # 串口和TCP使用的应答对象: 单从站时为 responder, 多从站时为 UnitDispatcher
+        self.bus_responder = self.responder
+        self.tcp_server = None
+        self.port_manager = None
+        self.waveform_engine = None
+        self.protocol_watcher = None
+        self.protocol_swap = None
+        self.metrics_server = None
+        self.stage_timer = None
+        self.capture_writer = None
+        self.unit_dispatcher = None
+        self.variables_changed.connect(self.refresh_variable_widgets)
+        self.protocol_pending.connect(self.apply_protocol_reloads)
+        
+        # 解析和格式化在工作线程中完成, GUI线程只追加结果
+        self.decode_worker = DecodeWorker(self.modbus_parser)
+        self.decode_worker.batch_ready.connect(self.output_text.append_entries)
+        self.decode_worker.start()
+        
+        # 加载配置, 界面与配置服务共用同一个内存中的配置
         self.config_manager.load_config()
         self.config_manager.load_protocols()
-        
-        # 按顺序加载配置
-        self.config_manager.load_protocols()  # 先加载协议
-        self.load_config()    # 再加载配置
+        self.config = self.config_manager.config
         
         # Create UI components
         self._create_protocol_section(layout)
@@ -153,51 +186,62 @@ class ModbusSimulator(QMainWindow):
         group = QGroupBox("内部变量")
         layout = QGridLayout()
         layout.setSpacing(15)
+        self.variable_layout = layout
         
-        # 创建内部变量管理器实例
-        self.internal_vars = InternalVariables()
-        self.internal_vars.add_observer(self)  # 添加自身为观察者
-        
-        # 创建变量显示和编辑控件
+        # 变量显示和编辑控件, 加载协议后按变量表重建
         self.var_widgets = {}
-        row = 0
+        self._variable_row_widgets = []
         
         # 时间戳显示（只读）
         timestamp_label = QLabel("时间戳:")
         self.timestamp_display = QLineEdit()
         self.timestamp_display.setReadOnly(True)
-        layout.addWidget(timestamp_label, row, 0)
-        layout.addWidget(self.timestamp_display, row, 1)
-        row += 1
+        layout.addWidget(timestamp_label, 0, 0)
+        layout.addWidget(self.timestamp_display, 0, 1)
+        
+        # 更新按钮
+        self.update_variables_btn = QPushButton("更新变量")
+        self.update_variables_btn.clicked.connect(self.update_internal_variables)
         
         # 创建其他变量的输入控件
+        self.rebuild_variable_widgets()
+        
+        # 启动定时器更新时间戳显示
+        self.timer = QTimer()
+        self.timer.timeout.connect(self.internal_vars.update_timestamp)
+        self.timer.start(1000)  # 每秒更新一次
+        
+        group.setLayout(layout)
+        parent_layout.addWidget(group)
+
+    def rebuild_variable_widgets(self):
+        """按当前变量表 (包括协议生成的变量) 重建变量输入控件, 协议加载或重新加载后调用"""
+        layout = self.variable_layout
+        for widget in self._variable_row_widgets:
+            layout.removeWidget(widget)
+            widget.deleteLater()
+        layout.removeWidget(self.update_variables_btn)
+        self._variable_row_widgets = []
+        self.var_widgets = {}
+        
+        row = 1
         for meta in self.internal_vars.get_variable_metadata():
             label = QLabel(f"{meta['display_name']} ({meta['unit']}):")
             input_widget = QLineEdit()
             input_widget.setPlaceholderText(str(meta['placeholder']))
             layout.addWidget(label, row, 0)
             layout.addWidget(input_widget, row, 1)
+            self._variable_row_widgets.extend((label, input_widget))
             self.var_widgets[meta['name']] = input_widget
             row += 1
+        layout.addWidget(self.update_variables_btn, row, 0, 1, 2)
         
-        # 更新按钮
-        update_btn = QPushButton("更新变量")
-        update_btn.clicked.connect(self.update_internal_variables)
-        layout.addWidget(update_btn, row, 0, 1, 2)
+        # 添加自身为内部变量的观察者, 只订阅界面上显示的变量
+        self.internal_vars.add_observer(self, ['timestamp', *self.var_widgets])
         
-        # 设置样式
+        # 设置样式并初始化显示
         self._apply_input_styles()
-        
-        # 初始化显示
         self.update_variable_displays()
-        
-        # 启动定时器更新时间戳显示
-        self.timer = QTimer()
-        self.timer.timeout.connect(self.internal_vars.update_timestamp)
-        self.timer.start(1000)  # 每秒更新一次
-        
-        group.setLayout(layout)
-        parent_layout.addWidget(group)
 
     def _create_communication_section(self, parent_layout):
         group = QGroupBox("Communication")
@@ -208,8 +252,6 @@ class ModbusSimulator(QMainWindow):
         self.input_text = QTextEdit()
         self.input_text.setPlaceholderText("Enter Modbus message here...")
         self.input_text.setMinimumHeight(250)
-        self.output_text = QTextEdit()
-        self.output_text.setReadOnly(True)
         self.output_text.setMinimumHeight(250)
         
         # Add headers with better styling
@@ -293,11 +335,22 @@ class ModbusSimulator(QMainWindow):
 
     def send_message(self):
         """Send Modbus message"""
-        message = self.input_text.toPlainText()
+        text = self.input_text.toPlainText().strip()
         try:
-            # TODO: Implement actual Modbus message sending
-            response = f"Simulated response for: {message}"
-            self.log_message(response)
+            message = bytes.fromhex(text)
+            if self.serial_port and self.serial_port.is_open:
+                self.serial_port.write(message)
+                self.handle_sent_data(message)
+                return
+                
+            # 串口未打开时直接交给应答引擎, 用于离线调试
+            response = self.bus_responder.handle_frame(message)
+            if response:
+                self.log_message(f"Simulated response: {' '.join(f'{b:02X}' for b in response)}")
+            else:
+                self.log_message("No response for message")
+        except ValueError:
+            self.log_message("报文格式错误, 请输入十六进制字节", "ERROR")
         except Exception as e:
             error_message = f"Error sending message: {str(e)}"
             self.log_message(error_message, "ERROR")
@@ -326,8 +379,10 @@ class ModbusSimulator(QMainWindow):
                 )
                 
                 # 创建并启动串口监听线程
-                self.serial_monitor = SerialMonitorThread(self.serial_port)
-                self.serial_monitor.data_received.connect(self.handle_received_data)
+                echo_suppression = self.config_manager.get("serial_settings", {}).get("echo_suppression", False)
+                self.serial_monitor = SerialMonitorThread(self.serial_port, responder=self.bus_responder,
+                                                          echo_suppression=echo_suppression)
+                self.attach_serial_monitor(self.serial_monitor)
                 self.serial_monitor.start()
                 
                 # 更新按钮文本和样式为"关闭串口"
@@ -393,25 +448,36 @@ class ModbusSimulator(QMainWindow):
             self.port_combo.setEnabled(True)
             self.baud_combo.setEnabled(True)
 
-    def handle_received_data(self, data):
-        """处理接收到的串口数据"""
-        try:
-            # 将接收到的数据转换为十六进制字符串
-            hex_data = ' '.join([f'{b:02X}' for b in data])
-            self.log_message(f"Received data: {hex_data}")
-            
-            # 解析Modbus帧
-            self.parse_modbus_message(data)
-            
-        except Exception as e:
-            self.log_message(f"Error handling received data: {str(e)}", "ERROR")
-            logger.error(f"Error handling received data: {e}")
+    def attach_serial_monitor(self, monitor):
+        """连接串口监听线程的信号"""
+        port = monitor.serial_port.port
+        # 直接在读取线程中把帧交给解码线程, 不经过GUI事件循环
+        monitor.data_received.connect(
+            lambda data: self.on_bus_frame(port, data, DIRECTION_RX), Qt.DirectConnection)
+        monitor.data_sent.connect(
+            lambda data: self.on_bus_frame(port, data, DIRECTION_TX), Qt.DirectConnection)
+
+    def on_bus_frame(self, port, data, direction):
+        """在读取线程中调用: 写入抓包文件 (如已启用) 并提交给解码线程"""
+        capture_writer = self.capture_writer
+        if capture_writer is not None:
+            capture_writer.write(port, data, direction)
+        self.decode_worker.submit(data, direction, port)
+
+    def handle_sent_data(self, data):
+        """记录发送到串口的数据"""
+        port = self.serial_port.port if self.serial_port else None
+        self.on_bus_frame(port, data, DIRECTION_TX)
+
+    def apply_written_variables(self, updates):
+        """应用主站写入寄存器后得到的变量值"""
+        success, errors = self.internal_vars.batch_update(updates)
+        if not success:
+            self.log_message(f"主站写入的变量更新失败: {', '.join(errors)}", "ERROR")
 
     def log_message(self, message, message_type="INFO"):
         """输出日志到Response窗"""
-        timestamp = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        formatted_message = f"[{timestamp}] [{message_type}] {message}"
-        self.output_text.append(formatted_message)
+        self.output_text.append_entry(format_log_entry(message, message_type))
 
     def _create_menu_bar(self):
         """创建菜单栏"""
@@ -479,6 +545,23 @@ class ModbusSimulator(QMainWindow):
         clear_logs_action.triggered.connect(self.clear_messages)
         tools_menu.addAction(clear_logs_action)
         
+        decode_stats_action = QAction('解码统计', self)
+        decode_stats_action.triggered.connect(self.show_decode_stats)
+        tools_menu.addAction(decode_stats_action)
+        
+        port_stats_action = QAction('端口统计', self)
+        port_stats_action.triggered.connect(self.show_port_stats)
+        tools_menu.addAction(port_stats_action)
+        
+        stage_timing_action = QAction('阶段计时', self)
+        stage_timing_action.setCheckable(True)
+        stage_timing_action.toggled.connect(self.set_stage_timing)
+        tools_menu.addAction(stage_timing_action)
+        
+        stage_stats_action = QAction('阶段耗时统计', self)
+        stage_stats_action.triggered.connect(self.show_stage_stats)
+        tools_menu.addAction(stage_stats_action)
+        
         # 帮助菜单
         help_menu = menubar.addMenu('帮助')
         
@@ -501,8 +584,7 @@ class ModbusSimulator(QMainWindow):
                 # 获取新的设置并保存
                 new_settings = dialog.get_settings()
                 self.serial_settings = new_settings
-                self.config["serial_settings"] = new_settings
-                self.save_config()
+                self.config_manager.set("serial_settings", new_settings)
                 self.log_message(f"Serial settings updated: {new_settings['port']}, {new_settings['baudrate']} baud")
         except Exception as e:
             self.log_message(f"Error showing serial settings dialog: {str(e)}", "ERROR")
@@ -515,6 +597,48 @@ class ModbusSimulator(QMainWindow):
             selected_protocol = dialog.get_selected_protocol()
             self.load_protocol_config(selected_protocol)
 
+    def show_decode_stats(self):
+        """输出解码线程的队列深度和延迟统计"""
+        stats = self.decode_worker.get_stats()
+        self.log_message(
+            f"解码统计: 队列深度 {stats['queue_depth']} (最大 {stats['max_queue_depth']}), "
+            f"已处理 {stats['processed']}, 丢弃 {stats['dropped']}, "
+            f"平均延迟 {stats['latency_mean_ms']:.2f} ms, 最大延迟 {stats['latency_max_ms']:.2f} ms")
+
+    def set_stage_timing(self, enabled):
+        """启用或关闭接收流水线的分阶段计时 (解码线程各阶段和日志窗口追加)"""
+        if enabled:
+            if self.stage_timer is None:
+                self.stage_timer = StageTimer(GUI_STAGES)
+            self.stage_timer.reset()
+        timer = self.stage_timer if enabled else None
+        self.decode_worker.set_timer(timer)
+        self.output_text.set_timer(timer)
+        self.log_message("阶段计时已启用" if enabled else "阶段计时已关闭")
+
+    def show_stage_stats(self):
+        """输出每帧在接收流水线各阶段的耗时分布"""
+        if self.stage_timer is None:
+            self.log_message("阶段计时未启用 (工具 -> 阶段计时)")
+            return
+        self.log_message("阶段耗时 (append 为每条日志的窗口追加耗时):\n"
+                         + '\n'.join(self.stage_timer.format_summary()))
+
+    def show_port_stats(self):
+        """输出多串口仿真的各端口计数和总吞吐量"""
+        if not self.port_manager:
+            self.log_message("未启动多串口仿真")
+            return
+        stats = self.port_manager.get_stats()
+        total = stats['total']
+        self.log_message(
+            f"端口统计: {total['ports']} 个端口, 收 {total['frames_in']} 帧, 发 {total['frames_out']} 帧, "
+            f"{total['frames_per_s']:.1f} 帧/秒, {total['bytes_per_s']:.0f} 字节/秒")
+        for name, port_stats in stats['ports'].items():
+            self.log_message(
+                f"  {name}: 收 {port_stats['frames_in']} 帧, 发 {port_stats['frames_out']} 帧, "
+                f"丢弃 {port_stats['frames_dropped']} 帧, 错误 {port_stats['errors']}")
+
     def show_about(self):
         """显示关于对话框"""
         QMessageBox.about(self, 
@@ -527,90 +651,69 @@ class ModbusSimulator(QMainWindow):
         """加载具体的协议配置"""
         try:
             if protocol_name in self.config["protocols"]:
-                protocol_info = self.config["protocols"][protocol_name]
-                config_file = f"protocols/{protocol_info['config_file']}"
+                # 协议只编译一次 (文件未修改时使用缓存), 由解析器和应答引擎共享
+                protocol_map = self.config_manager.load_protocol_map(protocol_name)
+                self.current_protocol = protocol_map.protocol
+                self.current_protocol_name = protocol_name
+                # 先为协议引用的变量建立存储, 应答引擎才能编码寄存器
+                self.internal_vars.load_protocol(protocol_map)
+                self.modbus_parser.set_protocol(protocol_map)
+                self.responder.set_protocol(protocol_map)
+                self.rebuild_variable_widgets()
+                self.log_message(f"已加载协议配置：{protocol_name}")
                 
-                # 读取具体的协议配置
-                with open(config_file, 'r', encoding='utf-8') as f:
-                    self.current_protocol = json.load(f)
-                    self.current_protocol_name = protocol_name
-                    self.log_message(f"已加载协议配置：{protocol_name}")
-                    
-                    # 保存当前协议选择到配置
-                    self.config["last_protocol"] = protocol_name
-                    self.save_config()
+                # 保存当前协议选择到配置
+                self.config_manager.set("last_protocol", protocol_name)
             else:
                 self.log_message(f"未找到协议配置：{protocol_name}", "ERROR")
                 
         except Exception as e:
             self.log_message(f"加载协议配置失败：{str(e)}", "ERROR")
 
-    def load_config(self):
-        """加载配置文件"""
-        try:
-            if os.path.exists('config.json'):
-                with open('config.json', 'r', encoding='utf-8') as f:
-                    self.config = json.load(f)
-                    self.log_message("Configuration loaded successfully")
-            else:
-                self.log_message("Configuration file not found, creating default configuration")
-                self.config = self.create_default_config()
-                if self.config is None:
-                    raise Exception("Failed to create default configuration")
+    def read_protocol_file(self, protocol_name):
+        """读取协议名称对应的协议文件"""
+        return self.config_manager.read_protocol_file(protocol_name)
+
+    def setup_units(self):
+        """
+        根据配置中的 units 建立多从站仿真
+        界面上的协议和内部变量绑定到 slave_id (默认1), units 中的其他地址
+        各自加载协议并使用独立的内部变量
+        """
+        units = self.config.get("units")
+        if not units:
+            self.bus_responder = self.responder
+            return
+            
+        dispatcher = UnitDispatcher()
+        gui_unit = int(self.config.get("slave_id", 1))
+        dispatcher.bind(gui_unit, self.responder)
+        
+        for unit_key, unit_settings in units.items():
+            unit_id = int(unit_key)
+            if unit_id == gui_unit:
+                logger.warning(f"Unit {unit_id} is bound to the GUI protocol, ignoring units entry")
+                continue
+            try:
+                protocol_name = unit_settings["protocol"]
+                protocol_map = self.config_manager.load_protocol_map(protocol_name)
+                unit_vars = InternalVariables.from_protocol(protocol_map)
+                # 非界面从站的变量不在界面显示, 主站写入直接在读取线程中更新
+                responder = ModbusResponder(unit_vars, protocol_map, unit_id=unit_id,
+                                            on_write=unit_vars.batch_update)
+                dispatcher.bind(unit_id, responder, protocol_name)
+                self.modbus_parser.set_unit_protocol(unit_id, protocol_map)
+            except Exception as e:
+                self.log_message(f"从站 {unit_key} 配置失败: {str(e)}", "ERROR")
                 
-        except Exception as e:
-            self.log_message(f"Error loading configuration: {str(e)}", "ERROR")
-            logger.error(f"Error loading configuration: {e}")
-            # 使用内存中的默认配置
-            self.config = self.get_default_config()
-
-    def get_default_config(self):
-        """获取默认配置"""
-        return {
-            "serial_settings": {
-                "port": "COM1",
-                "baudrate": 9600,
-                "parity": "N",
-                "stopbits": 1,
-                "bytesize": 8,
-                "timeout": 1000
-            },
-            "protocols": {
-                "古瑞瓦特逆变器 Modbus RTU Protocol_II V1.24简版": {
-                    "id": "growatt_inverter",
-                    "description": "古瑞瓦特逆变器通信协议",
-                    "config_file": "growatt_protocol.json"
-                },
-                "正泰——CPS SCAxxKTL-T 系列 Modbus协议": {
-                    "id": "chint_inverter",
-                    "description": "正泰CPS系列逆变器通信协议",
-                    "config_file": "chint_protocol.json"
-                }
-            },
-            "last_protocol": ""
-        }
-
-    def create_default_config(self):
-        """创建默认配置文件"""
-        default_config = self.get_default_config()
-        try:
-            with open('config.json', 'w', encoding='utf-8') as f:
-                json.dump(default_config, f, indent=4, ensure_ascii=False)
-            self.log_message("Created default configuration file")
-            return default_config
-        except Exception as e:
-            self.log_message(f"Error creating default config: {str(e)}", "ERROR")
-            return None
+        self.responder.unit_id = gui_unit
+        self.unit_dispatcher = dispatcher
+        self.bus_responder = dispatcher
+        self.log_message(f"多从站仿真: {', '.join(str(u) for u in dispatcher.unit_ids())}")
 
     def save_config(self):
-        """保存配置到文件"""
-        try:
-            with open('config.json', 'w', encoding='utf-8') as f:
-                json.dump(self.config, f, indent=4, ensure_ascii=False)
-                self.log_message("Configuration saved successfully")
-        except Exception as e:
-            self.log_message(f"Error saving configuration: {str(e)}", "ERROR")
-            logger.error(f"Error saving configuration: {e}")
+        """安排保存配置 (合并写入, 在后台线程中完成)"""
+        self.config_manager.save_config()
 
     def apply_last_config(self):
         """应用上次的配置"""
@@ -627,16 +730,167 @@ class ModbusSimulator(QMainWindow):
             if "last_protocol" in self.config:
                 protocol_name = self.config["last_protocol"]
                 if protocol_name in self.config["protocols"]:
-                    self.current_protocol = self.config["protocols"][protocol_name]
-                    self.current_protocol_name = protocol_name
-                    self.log_message(f"Loaded protocol: {protocol_name}")
+                    self.load_protocol_config(protocol_name)
+                    
+            # 建立多从站仿真
+            self.setup_units()
+            
+            # 启动Modbus TCP服务
+            tcp_settings = self.config.get("tcp_server", {})
+            if tcp_settings.get("enabled"):
+                self.start_tcp_server(tcp_settings.get("host", "0.0.0.0"),
+                                      tcp_settings.get("port", 502))
+            
+            # 启动多串口仿真
+            if self.config.get("ports"):
+                self.start_port_manager(self.config["ports"])
+            
+            # 启动波形仿真
+            simulation = self.config.get("simulation", {})
+            if simulation.get("enabled"):
+                self.start_waveform_engine(simulation)
+            
+            # 启动协议文件热加载
+            watch = self.config.get("protocol_watch", {})
+            if watch.get("enabled"):
+                self.start_protocol_watcher(watch.get("interval", 1.0))
+            
+            # 启动二进制抓包
+            capture_settings = self.config.get("capture", {})
+            if capture_settings.get("enabled"):
+                self.start_capture(capture_settings)
+            
+            # 启动指标端点
+            metrics_settings = self.config.get("metrics", {})
+            if metrics_settings.get("enabled"):
+                self.start_metrics_server(metrics_settings.get("host", "127.0.0.1"),
+                                          metrics_settings.get("port", 9464))
         except Exception as e:
             self.log_message(f"Error applying configuration: {str(e)}", "ERROR")
             logger.error(f"Error applying configuration: {e}")
 
+    def start_tcp_server(self, host, port):
+        """启动与串口共享寄存器映像的Modbus TCP服务"""
+        self.tcp_server = ModbusTCPServer(self.bus_responder, host, port)
+        if self.tcp_server.start_in_thread():
+            self.log_message(f"Modbus TCP 服务已启动: {host}:{self.tcp_server.port}")
+        else:
+            self.log_message(f"Modbus TCP 服务启动失败: {host}:{port}", "ERROR")
+            self.tcp_server = None
+
+    def start_port_manager(self, ports):
+        """按配置打开多个串口, 每个串口独立仿真各自的从站"""
+        self.port_manager = PortManager(
+            self.config_manager.load_protocol_map,
+            on_frame=self.on_bus_frame,
+            parser=self.modbus_parser)
+        failed = self.port_manager.open_ports(ports)
+        opened = len(self.port_manager.workers)
+        self.log_message(f"多串口仿真已启动: {opened} 个端口")
+        if failed:
+            self.log_message(f"串口打开失败: {', '.join(failed)}", "ERROR")
+
+    def start_waveform_engine(self, settings):
+        """按配置启动波形仿真引擎, 周期性改写内部变量"""
+        try:
+            from waveform_engine import WaveformEngine
+        except ImportError as e:
+            self.log_message(f"波形仿真需要numpy: {str(e)}", "ERROR")
+            return
+        self.waveform_engine = WaveformEngine(self.internal_vars, settings.get("rate", 10))
+        skipped = self.waveform_engine.load_config(settings.get("generators", {}))
+        if skipped:
+            self.log_message(f"波形配置无效: {', '.join(skipped)}", "ERROR")
+        self.waveform_engine.start()
+        self.log_message(f"波形仿真已启动: {len(self.waveform_engine)} 个变量, "
+                         f"{self.waveform_engine.rate:g} Hz")
+
+    def start_protocol_watcher(self, interval):
+        """监视协议文件, 修改后自动重新编译并交换到运行中的仿真"""
+        from protocol_watcher import ProtocolSwap, ProtocolWatcher
+        self.protocol_swap = ProtocolSwap(self.reload_protocol, on_pending=self.protocol_pending.emit)
+        self.protocol_watcher = ProtocolWatcher(self.config_manager, self.protocol_swap.submit, interval)
+        self.protocol_watcher.start()
+        self.log_message(f"协议文件热加载已启用, 检查间隔 {self.protocol_watcher.interval:g} 秒")
+
+    def start_capture(self, settings):
+        """把收发的原始帧写入按大小轮转的二进制抓包文件"""
+        from capture import CaptureWriter
+        capture_writer = CaptureWriter(settings.get("path", "captures/modbus.cap"),
+                                       settings.get("max_bytes", 16 * 1024 * 1024),
+                                       settings.get("backup_count", 5))
+        try:
+            capture_writer.open()
+        except OSError as e:
+            self.log_message(f"抓包文件打开失败: {str(e)}", "ERROR")
+            return
+        self.capture_writer = capture_writer
+        self.log_message(f"二进制抓包已启动: {capture_writer.path}")
+
+    def start_metrics_server(self, host, port):
+        """在本机启动 Prometheus 文本格式的指标端点"""
+        from metrics import MetricsServer
+        self.metrics_server = MetricsServer(host=host, port=port)
+        if self.metrics_server.start():
+            self.log_message(f"指标端点已启动: http://{host}:{self.metrics_server.port}/metrics")
+        else:
+            self.log_message(f"指标端点启动失败: {host}:{port}", "ERROR")
+            self.metrics_server = None
+
+    def reload_protocol(self, protocol_name, protocol_map):
+        """
+        在GUI线程中把热加载线程编译好的协议交换到解析器、应答引擎和内部变量
+        读取线程继续运行, 读请求应答旧映像或完整的新映像
+        """
+        if protocol_name == self.current_protocol_name:
+            self.responder.swap_protocol(protocol_map)
+            self.modbus_parser.set_protocol(protocol_map)
+            self.current_protocol = protocol_map.protocol
+        if self.unit_dispatcher:
+            for unit_id in self.unit_dispatcher.reload_protocol(protocol_name, protocol_map):
+                self.modbus_parser.set_unit_protocol(unit_id, protocol_map)
+        if self.port_manager:
+            self.port_manager.reload_protocol(protocol_name, protocol_map)
+
+    def apply_protocol_reloads(self):
+        for protocol_name, swap_ms in self.protocol_swap.apply():
+            self.on_protocol_reloaded(protocol_name, swap_ms)
+
+    def on_protocol_reloaded(self, protocol_name, swap_ms):
+        if protocol_name == self.current_protocol_name:
+            # 重新加载的协议可能新增变量
+            self.rebuild_variable_widgets()
+        self.log_message(f"协议已重新加载: {protocol_name}, 交换耗时 {swap_ms:.2f} ms")
+
     def closeEvent(self, event):
         """窗口关闭时的处理"""
         try:
+            # 停止协议文件热加载
+            if self.protocol_watcher:
+                self.protocol_watcher.stop()
+                logger.info(f"Protocol reload stats: {self.protocol_watcher.get_stats()}, "
+                            f"swap {self.protocol_swap.get_stats()}")
+                
+            # 停止指标端点
+            if self.metrics_server:
+                self.metrics_server.stop()
+                
+
+            # 停止Modbus TCP服务
+            if self.tcp_server:
+                self.tcp_server.stop()
+                logger.info(f"Modbus TCP server stats: {self.tcp_server.get_stats()}")
+                
+            # 停止波形仿真
+            if self.waveform_engine:
+                self.waveform_engine.stop()
+                logger.info(f"Waveform engine stats: {self.waveform_engine.get_stats()}")
+                
+            # 关闭多串口仿真
+            if self.port_manager:
+                logger.info(f"Port manager stats: {self.port_manager.get_stats()['total']}")
+                self.port_manager.close_all()
+                
             # 停止串口监听线程
             if hasattr(self, 'serial_monitor'):
                 self.serial_monitor.stop()
@@ -646,33 +900,25 @@ class ModbusSimulator(QMainWindow):
             if self.serial_port and self.serial_port.is_open:
                 self.serial_port.close()
             
-            # 保存配置
-            self.save_config()
+            # 关闭抓包文件
+            if self.capture_writer:
+                self.capture_writer.close()
+                logger.info(f"Capture stats: {self.capture_writer.get_stats()}")
+            
+            # 停止解码线程
+            self.decode_worker.stop()
+            self.decode_worker.wait()
+            logger.info(f"Decode worker stats: {self.decode_worker.get_stats()}")
+            
+            # 保存配置, 退出前立即写入
+            self.config_manager.save_config()
+            self.config_manager.flush()
             
         except Exception as e:
             logger.error(f"Error in closeEvent: {e}")
         
         event.accept()
 
-    def parse_modbus_message(self, message):
-        """
-        Parse received Modbus message and display result
-        Args:
-            message: bytes object containing the Modbus message
-        """
-        try:
-            # 使用ModbusParser解析消息
-            result = self.modbus_parser.parse_message(message)
-            
-            # 格式化并显示结果
-            formatted_result = self.modbus_parser.format_parse_result(result)
-            self.log_message(formatted_result)
-            
-        except Exception as e:
-            error_message = f"解析Modbus消息时发生错误: {str(e)}"
-            self.log_message(error_message, "ERROR")
-            logger.error(error_message)
-
     def update_internal_variables(self):
         """更新内部变量值"""
         updates = {}
@@ -698,15 +944,19 @@ class ModbusSimulator(QMainWindow):
         except Exception as e:
             self.log_message(f"更新显示时发生错误: {str(e)}", "ERROR")
 
-    def on_variable_updated(self, var_name: str):
-        """变量更新的观察者回调"""
-        if var_name == 'timestamp':
-            value = self.internal_vars.get_formatted_value('timestamp')
-            if value:
-                self.timestamp_display.setText(value)
-        elif var_name in self.var_widgets:
+    def on_variables_updated(self, var_names):
+        """变量更新的观察者回调, 每次批量更新只调用一次 (可能在非GUI线程中调用)"""
+        self.variables_changed.emit(var_names)
+
+    def refresh_variable_widgets(self, var_names):
+        """刷新已变化变量的显示"""
+        for var_name in var_names:
             value = self.internal_vars.get_formatted_value(var_name)
-            if value:
+            if not value:
+                continue
+            if var_name == 'timestamp':
+                self.timestamp_display.setText(value)
+            elif var_name in self.var_widgets:
                 self.var_widgets[var_name].setText(value)
 
     def _apply_input_styles(self):
@@ -1,80 +1,201 @@
 import logging
+from crc16 import check_crc
+from function_codes import (FUNCTION_DECODERS, FRAME_EXCEPTION, FRAME_REQUEST, FRAME_RESPONSE,
+                            FC_READ_HOLDING_REGISTERS, FC_READ_INPUT_REGISTERS,
+                            FC_WRITE_SINGLE_REGISTER, FC_WRITE_MULTIPLE_REGISTERS,
+                            FC_READ_WRITE_MULTIPLE_REGISTERS)
 from internal_variables import InternalVariables
+from metrics import CRC_ERRORS, FRAMES_PARSED, UNKNOWN_FUNCTIONS
+from protocol_map import ProtocolMap
 
 logger = logging.getLogger(__name__)
 
+_FRAMES_PARSED = FRAMES_PARSED.labels()
+_CRC_ERRORS = CRC_ERRORS.labels('parser')
+_UNKNOWN_FUNCTIONS = UNKNOWN_FUNCTIONS.labels('parser')
+
+READ_REGISTER_CODES = (FC_READ_HOLDING_REGISTERS, FC_READ_INPUT_REGISTERS)
+REGISTER_CODES = READ_REGISTER_CODES + (FC_WRITE_SINGLE_REGISTER, FC_WRITE_MULTIPLE_REGISTERS,
+                                        FC_READ_WRITE_MULTIPLE_REGISTERS)
+
+FRAME_TYPE_NAMES = {
+    FRAME_REQUEST: "请求",
+    FRAME_RESPONSE: "响应",
+    FRAME_EXCEPTION: "异常响应"
+}
+
 class ModbusParser:
-    def __init__(self):
+    def __init__(self, internal_vars=None):
         self.current_protocol = None
-        self.internal_vars = InternalVariables()
+        self.protocol_map = None
+        # 多从站仿真时各从站地址使用的协议, 未设置的地址使用当前协议
+        self.unit_protocol_maps = {}
+        # 多串口仿真时各端口的 {从站地址: 协议}, 这些端口的帧只按端口自己的协议解码
+        self.port_protocol_maps = {}
+        self.internal_vars = internal_vars if internal_vars is not None else InternalVariables()
+        # 按串口统计CRC错误帧数
+        self.crc_error_counts = {}
+        # 各 (端口, 从站) 尚未应答的请求的功能码, 用于区分长度相同的请求和响应
+        self._pending_functions = {}
+        # 各 (端口, 从站) 最近一次读请求的 (起始地址, 数量), 用于解码对应的响应
+        self._pending_reads = {}
         
     def set_protocol(self, protocol):
-        self.current_protocol = protocol
+        """设置当前协议, 接受协议定义或已编译的ProtocolMap"""
+        if protocol is None:
+            self.current_protocol = None
+            self.protocol_map = None
+            return
+        self.protocol_map = ProtocolMap.compile(protocol)
+        self.current_protocol = self.protocol_map.protocol
+        
+    def set_unit_protocol(self, unit_id, protocol):
+        """为指定从站地址设置协议, protocol为None时恢复使用当前协议"""
+        if protocol is None:
+            self.unit_protocol_maps.pop(unit_id, None)
+        else:
+            self.unit_protocol_maps[unit_id] = ProtocolMap.compile(protocol)
+        
+    def set_port_protocols(self, port, unit_protocols):
+        """
+        设置多串口仿真端口上各从站地址的协议
+        Args:
+            unit_protocols: {从站地址: 协议定义或已编译的ProtocolMap}, 为None时移除该端口
+        """
+        if unit_protocols is None:
+            self.port_protocol_maps.pop(port, None)
+            return
+        # 整体替换, 解码线程不会看到只更新了一半的映射
+        self.port_protocol_maps[port] = {unit_id: ProtocolMap.compile(protocol)
+                                         for unit_id, protocol in unit_protocols.items()}
+
+    def get_crc_error_count(self, port=None):
+        """获取指定串口的CRC错误计数"""
+        return self.crc_error_counts.get(port, 0)
         
-    def parse_message(self, message):
+    def parse_message(self, message, port=None):
         """
         Parse Modbus message and return parsed result
         Args:
             message: bytes object containing the Modbus message
+            port: name of the serial port the message was received on
         Returns:
             dict: Parsed message information or None if parsing fails
         """
-        if not self.current_protocol:
-            logger.error("No protocol loaded")
+        # 检查消息长度
+        if len(message) < 4:  # Modbus消息至少需要4字节
+            logger.warning("Message too short")
             return None
             
-        try:
-            # 检查消息长度
-            if len(message) < 4:  # Modbus消息至少需要4字节
-                logger.warning("Message too short")
+        _FRAMES_PARSED.inc()
+        # 在任何协议查找之前先校验CRC
+        if not check_crc(message):
+            _CRC_ERRORS.inc()
+            self.crc_error_counts[port] = self.crc_error_counts.get(port, 0) + 1
+            logger.warning(f"CRC check failed on {port}: {message.hex().upper()}")
+            return {
+                'error': 'CRC校验错误',
+                'data': message.hex().upper()
+            }
+            
+        unit_maps = self.port_protocol_maps.get(port)
+        if unit_maps is not None:
+            protocol_map = unit_maps.get(message[0])
+            if protocol_map is None:
+                logger.debug(f"No protocol for unit {message[0]} on {port}")
                 return None
-                
+        else:
+            protocol_map = self.unit_protocol_maps.get(message[0], self.protocol_map)
+            if protocol_map is None:
+                logger.error("No protocol loaded")
+                return None
+            
+        try:
             function_code = message[1]
-            if function_code in self.current_protocol['function_codes']:
-                result = {
-                    'function_code': function_code,
-                    'function_name': self.current_protocol['function_codes'][function_code]
+            decoder = FUNCTION_DECODERS[function_code]
+            if decoder is None:
+                _UNKNOWN_FUNCTIONS.inc()
+                return {
+                    'error': f"未知功能码 0x{function_code:02X}",
+                    'data': message.hex().upper()
                 }
                 
-                register_addr = f"0x{message[2:4].hex().upper()}"
-                if register_addr in self.current_protocol['registers']:
-                    reg_info = self.current_protocol['registers'][register_addr]
-                    result['register'] = {
-                        'address': register_addr,
-                        'name': reg_info['name'],
-                        'description': reg_info['description']
-                    }
+            key = (port, message[0])
+            fields = decoder.decode(message, self._pending_functions.get(key) == function_code)
+            frame_type = fields.pop('kind')
+            if frame_type == FRAME_REQUEST:
+                self._pending_functions[key] = function_code
+            else:
+                self._pending_functions.pop(key, None)
+            result = {
+                'slave_address': message[0],
+                'function_code': function_code,
+                'function_name': protocol_map.function_names.get(function_code, decoder.name),
+                'frame_type': frame_type,
+                'fields': fields,
+                'data': message[2:-2].hex().upper()
+            }
+            
+            if frame_type == FRAME_EXCEPTION:
+                self._pending_reads.pop((port, message[0]), None)
+                return result
+                
+            # 读寄存器请求: 记录起始地址和数量, 用于解码随后的响应
+            if function_code in READ_REGISTER_CODES:
+                if frame_type == FRAME_REQUEST:
+                    self._pending_reads[port, message[0]] = (fields['start'], fields['count'])
+                else:
+                    self._decode_read_response(message, result, protocol_map, port)
+                    return result
                     
-                    # 检查是否有变量映射
-                    if 'variable_mapping' in reg_info:
-                        var_mapping = reg_info['variable_mapping']
-                        var_name = var_mapping['name']
-                        var_value = self.internal_vars.get_variable(var_name)
-                        
-                        if var_value is not None:
-                            # 应用转换规则
-                            conversion = var_mapping.get('conversion', {})
-                            read_conversion = conversion.get('read', 'value')
-                            
-                            try:
-                                # 使用安全的eval执行转换表达式
-                                converted_value = eval(
-                                    read_conversion, 
-                                    {"__builtins__": {}}, 
-                                    {"value": var_value}
-                                )
-                                result['value'] = converted_value
-                            except Exception as e:
-                                logger.error(f"Error converting value: {e}")
-                                result['value'] = var_value
+            # 线圈/离散输入的地址不在寄存器表中
+            register_addr = fields.get('start', fields.get('address'))
+            if register_addr is None or function_code not in REGISTER_CODES:
+                return result
+                
+            entry = protocol_map.lookup(register_addr)
+            if entry is not None:
+                reg_info = entry.info
+                result['register'] = {
+                    'address': entry.key,
+                    'name': reg_info['name'],
+                    'description': reg_info['description']
+                }
+                
+                # 寄存器请求: 解析起始地址+数量覆盖的全部寄存器
+                if frame_type == FRAME_REQUEST and 'count' in fields:
+                    result['registers'] = [
+                        {'address': e.key, 'name': e.info['name']}
+                        for e in protocol_map.lookup_range(register_addr, fields['count'])
+                    ]
+                
+                # 检查是否有变量映射, 转换函数已在加载协议时编译
+                if entry.variable is not None:
+                    var_value = self.internal_vars.get_variable(entry.variable)
                     
-                    result['data'] = message[4:-2].hex().upper()
-                    return result
+                    if var_value is not None:
+                        try:
+                            result['value'] = entry.read(var_value)
+                        except Exception as e:
+                            logger.error(f"Error converting value: {e}")
+                            result['value'] = var_value
+                            
+            return result
                     
         except Exception as e:
             logger.error(f"Error parsing Modbus message: {e}")
             return None
             
+    def _decode_read_response(self, message, result, protocol_map, port=None):
+        """解码读寄存器响应, 起始地址取自同一端口上同一从站的上一个读请求"""
+        pending = self._pending_reads.pop((port, message[0]), None)
+        if pending is None or pending[1] * 2 != message[2]:
+            return
+            
+        start = pending[0]
+        result['start_address'] = f"0x{start:04X}"
+        result['values'] = protocol_map.decode_registers(start, message[3:-2])
+        
     def format_parse_result(self, result):
         """
         Format parsed result into human readable string
@@ -86,13 +207,24 @@ class ModbusParser:
         if not result:
             return "无法解析消息"
             
+        if 'error' in result:
+            return f"解析失败: {result['error']}\n原始数据: {result.get('data', '')}"
+            
         try:
             formatted_result = (
                 f"解析结果:\n"
+                f"从站地址: {result.get('slave_address', 'Unknown')}\n"
                 f"功能码: {result.get('function_code', 'Unknown')} "
-                f"({result.get('function_name', 'Unknown')})\n"
+                f"({result.get('function_name', 'Unknown')}) "
+                f"[{FRAME_TYPE_NAMES.get(result.get('frame_type'), 'Unknown')}]\n"
             )
             
+            if result.get('frame_type') == FRAME_EXCEPTION:
+                fields = result['fields']
+                formatted_result += (
+                    f"异常码: {fields['exception_code']} ({fields['exception_name']})\n"
+                )
+            
             if 'register' in result:
                 reg_info = result['register']
                 formatted_result += (
@@ -103,6 +235,20 @@ class ModbusParser:
                 
                 if 'value' in result:
                     formatted_result += f"变量值: {result['value']}\n"
+                    
+            if result.get('values'):
+                formatted_result += f"起始地址: {result['start_address']}\n"
+                for item in result['values']:
+                    line = f"  {item['address']} {item['name']}: {item['value']}"
+                    if item.get('unit'):
+                        line += f" {item['unit']}"
+                    if item.get('label'):
+                        line += f" ({item['label']})"
+                    formatted_result += line + "\n"
+                    
+            if len(result.get('registers', [])) > 1:
+                names = ', '.join(f"{r['address']} {r['name']}" for r in result['registers'])
+                formatted_result += f"覆盖寄存器: {names}\n"
             
             if 'data' in result:
                 formatted_result += f"原始数据: {result['data']}"
@@ -0,0 +1,421 @@
+import struct
+import logging
+import threading
+from typing import Any, Callable, Dict, Optional
+from crc16 import check_crc, write_crc
+from conversion import is_vectorizable
+from function_codes import (FC_READ_HOLDING_REGISTERS, FC_WRITE_SINGLE_REGISTER,
+                            FC_WRITE_MULTIPLE_REGISTERS, EXC_ILLEGAL_FUNCTION,
+                            EXC_ILLEGAL_DATA_ADDRESS, EXC_ILLEGAL_DATA_VALUE,
+                            EXCEPTION_FLAG)
+from metrics import CRC_ERRORS, EXCEPTIONS_SENT, REQUESTS, UNKNOWN_FUNCTIONS
+from protocol_map import ProtocolMap
+from register_codec import compile_encoder, decode_bytes, encode_array, np, register_type
+from register_image import RegisterImage
+
+logger = logging.getLogger(__name__)
+
+BROADCAST_ADDRESS = 0
+MAX_READ_REGISTERS = 125
+MAX_WRITE_REGISTERS = 123
+# 一次变化的变量数达到可批量编码变量数的 1/VECTOR_FRACTION (且不少于
+# VECTOR_MIN_VARIABLES) 时, 整体批量重新编码, 否则逐个编码变化的变量
+VECTOR_MIN_VARIABLES = 32
+VECTOR_FRACTION = 4
+
+_CRC_ERRORS = CRC_ERRORS.labels('responder')
+_UNKNOWN_FUNCTIONS = UNKNOWN_FUNCTIONS.labels('responder')
+_REQUESTS = {code: REQUESTS.labels(code) for code in
+             (FC_READ_HOLDING_REGISTERS, FC_WRITE_SINGLE_REGISTER, FC_WRITE_MULTIPLE_REGISTERS)}
+
+
+class TurnaroundStats:
+    """应答耗时统计 (从收到完整请求到响应写入串口)"""
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.last = 0.0
+
+    def record(self, seconds: float):
+        self.count += 1
+        self.total += seconds
+        self.last = seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def get_stats(self) -> Dict[str, float]:
+        """获取统计结果, 单位毫秒"""
+        mean = self.total / self.count if self.count else 0.0
+        return {
+            'count': self.count,
+            'mean_ms': mean * 1000.0,
+            'max_ms': self.max * 1000.0,
+            'last_ms': self.last * 1000.0
+        }
+
+
+class VectorPlan:
+    """
+    可批量编码的寄存器 (需要numpy)
+
+    绑定浮点变量、读转换只含算术运算的寄存器按 (读转换, 类型, 缩放) 分组,
+    每组保存变量在浮点列中的下标和寄存器在映像中的字节偏移。整组用一次
+    numpy 运算完成转换和编码, 再一次写入映像。其余绑定 (整数和时间变量、
+    含函数调用或条件的转换) 保留在 scalar_bindings 中逐个编码。
+    """
+
+    def __init__(self, groups, names, scalar_bindings):
+        self.groups = groups
+        self.names = names
+        self.scalar_bindings = scalar_bindings
+        self.scalar_names = frozenset(scalar_bindings)
+        self.threshold = max(VECTOR_MIN_VARIABLES, len(names) // VECTOR_FRACTION)
+
+    @classmethod
+    def build(cls, protocol, bindings, internal_vars, image) -> Optional['VectorPlan']:
+        if np is None or not bindings:
+            return None
+        grouped = {}
+        names = set()
+        for entry in protocol.entries:
+            name = entry.variable
+            if name is None:
+                continue
+            conversion = entry.info['variable_mapping'].get('conversion', {}).get('read', 'value')
+            slot = None
+            if is_vectorizable(conversion):
+                try:
+                    slot = internal_vars.float_slots([name])[0]
+                except (KeyError, ValueError):
+                    pass
+            if slot is None:
+                continue
+            key = (entry.read, register_type(entry.info), float(entry.info.get('scale') or 1))
+            slots, addresses = grouped.setdefault(key, ([], []))
+            slots.append(slot)
+            addresses.append(entry.address)
+            names.add(name)
+        if not names:
+            return None
+
+        groups = []
+        vector_addresses = set()
+        for (read, reg_type, scale), (slots, addresses) in grouped.items():
+            width = 4 if reg_type in ('uint32', 'int32', 'float32') else 2
+            groups.append((read, reg_type, scale, np.array(slots, dtype=np.intp),
+                           image.byte_index(addresses, width)))
+            vector_addresses.update(addresses)
+        scalar_bindings = {}
+        for name, targets in bindings.items():
+            remaining = [target for target in targets if target[0] not in vector_addresses]
+            if remaining:
+                scalar_bindings[name] = remaining
+        return cls(groups, frozenset(names), scalar_bindings)
+
+    def encode(self, float_values) -> list:
+        """按当前变量值编码全部分组, 返回 [(字节偏移, 数据)]"""
+        floats = np.frombuffer(float_values, dtype=np.float64)
+        encoded = []
+        with np.errstate(all='ignore'):
+            for read, reg_type, scale, slots, index in self.groups:
+                values = floats[slots]
+                try:
+                    values = np.broadcast_to(np.asarray(read(values), dtype=np.float64), values.shape)
+                    rows, valid = encode_array(values, reg_type, scale)
+                except Exception as e:
+                    logger.error(f"Error batch encoding {len(slots)} {reg_type} registers: {e}")
+                    continue
+                if not valid.all():
+                    logger.error(f"{int((~valid).sum())} {reg_type} register values out of range, skipped")
+                    rows, index = rows[valid], index[valid]
+                encoded.append((index, rows))
+        return encoded
+
+
+class ModbusResponder:
+    """
+    Modbus 从站应答引擎
+
+    根据协议文件和内部变量生成连续的寄存器映像 (RegisterImage), 应答
+    FC03/FC06/FC16 请求。寄存器仅在变量变化时编码写入映像一次, 读应答直接
+    切取映像中的字节, 由串口读取线程直接调用。
+    主站写入的寄存器经写转换后通过 on_write 回调交给调用方更新内部变量。
+    """
+
+    def __init__(self, internal_vars, protocol=None, unit_id: Optional[int] = None,
+                 on_write: Optional[Callable[[Dict[str, Any]], None]] = None):
+        self.internal_vars = internal_vars
+        self.unit_id = unit_id
+        self.on_write = on_write
+        self._lock = threading.Lock()
+        self._protocol = None
+        self._image = RegisterImage()
+        # 变量名 -> [(寄存器基地址, 读转换, 编码函数)]
+        self._bindings: Dict[str, list] = {}
+        self._plan: Optional[VectorPlan] = None
+        self._updates = 0
+
+        self.requests = 0
+        self.exceptions = 0
+        self.turnaround = TurnaroundStats()
+
+        self.set_protocol(protocol)
+
+    @property
+    def protocol_map(self) -> Optional[ProtocolMap]:
+        """当前使用的已编译协议"""
+        return self._protocol
+
+    def set_protocol(self, protocol):
+        """
+        根据协议定义 (或已编译的ProtocolMap) 重建寄存器映像
+        新映像在交换前已按当前变量值编码完毕, 运行中切换协议时读请求要么
+        应答旧映像、要么应答完整的新映像, 不会读到未填充的寄存器
+        """
+        bindings = {}
+        if protocol:
+            protocol = ProtocolMap.compile(protocol)
+            for entry in protocol.entries:
+                if entry.variable is not None:
+                    bindings.setdefault(entry.variable, []).append(
+                        (entry.address, entry.read, compile_encoder(entry.info)))
+        image = RegisterImage.from_protocol(protocol)
+        plan = VectorPlan.build(protocol, bindings, self.internal_vars, image) if protocol else None
+
+        # 先订阅新协议的变量, 之后的变化都会递增 _updates
+        self.internal_vars.add_observer(self, bindings.keys())
+        updates = self._updates
+        if plan is None:
+            image.write_batch(self._encode(bindings, bindings.keys()))
+        else:
+            image.write_batch(self._encode(plan.scalar_bindings, bindings.keys()))
+            for index, rows in plan.encode(self.internal_vars.float_values()):
+                image.scatter(index, rows)
+
+        with self._lock:
+            self._protocol = protocol
+            self._image = image
+            self._bindings = bindings
+            self._plan = plan
+
+        # 预填充期间有变量变化时, 按新绑定补写一次
+        if self._updates != updates:
+            self.on_variables_updated(bindings.keys())
+
+    def swap_protocol(self, protocol_map: ProtocolMap):
+        """
+        协议热加载的交换点: 持有内部变量的结构锁, 先为新协议建立变量,
+        再按新变量表构建映像并在应答引擎的锁内替换, 其他线程不会在两步之间
+        看到缺少变量的新映像。protocol_map 须已在监视线程中编译完毕
+        """
+        with self.internal_vars.layout_lock:
+            self.internal_vars.load_protocol(protocol_map)
+            self.set_protocol(protocol_map)
+
+    def _encode(self, bindings, var_names) -> list:
+        encoded = []
+        get_variable = self.internal_vars.get_variable
+        for var_name in var_names:
+            targets = bindings.get(var_name)
+            if not targets:
+                continue
+            value = get_variable(var_name)
+            if value is None:
+                continue
+            for base, read, encode in targets:
+                try:
+                    encoded.append((base, encode(read(value))))
+                except Exception as e:
+                    logger.error(f"Error encoding {var_name} for register 0x{base:04X}: {e}")
+        return encoded
+
+    def on_variables_updated(self, var_names):
+        """
+        内部变量变化时重新编码绑定的寄存器, 整批变化在一次加锁中写入映像
+        大批变化 (如波形仿真的每个节拍) 用 numpy 整体编码可批量编码的寄存器,
+        其余寄存器逐个编码
+        """
+        self._updates += 1
+        bindings, plan = self._bindings, self._plan
+        if plan is not None and len(var_names) >= plan.threshold:
+            encoded = self._encode(plan.scalar_bindings, plan.scalar_names.intersection(var_names))
+            scattered = plan.encode(self.internal_vars.float_values())
+        else:
+            encoded = self._encode(bindings, var_names)
+            scattered = ()
+        if not encoded and not scattered:
+            return
+        with self._lock:
+            # 绑定与映像来自同一协议, 地址必在映像范围内
+            if bindings is self._bindings:
+                self._image.write_batch(encoded)
+                for index, rows in scattered:
+                    self._image.scatter(index, rows)
+
+    def on_variable_updated(self, var_name: str):
+        self.on_variables_updated((var_name,))
+
+    def handle_frame(self, frame: bytes) -> Optional[memoryview]:
+        """
+        处理一帧RTU请求
+        Args:
+            frame: 包含CRC的完整RTU帧
+        Returns:
+            memoryview: 包含CRC的响应帧, 不需要应答时返回None
+        """
+        if len(frame) < 4:
+            return None
+        if not check_crc(frame):
+            _CRC_ERRORS.inc()
+            return None
+        return self.handle_request(frame[0], frame[1:-2], rtu=True)
+
+    def handle_request(self, unit: int, pdu: bytes, rtu: bool = False) -> Optional[memoryview]:
+        """
+        处理发给指定从站地址的PDU; 广播请求只执行不应答, 其他从站的请求不处理
+        rtu 为真时返回包含从站地址和CRC的完整RTU响应帧, 否则返回响应PDU
+        """
+        if unit == BROADCAST_ADDRESS:
+            self.handle_pdu(pdu)
+            return None
+        if not self.accepts(unit):
+            return None
+        return self.handle_pdu(pdu, unit if rtu else None)
+
+    def accepts(self, unit: int) -> bool:
+        """是否应答发给指定从站地址的请求"""
+        return self.unit_id is None or unit == self.unit_id
+
+    def handle_pdu(self, pdu: bytes, unit: Optional[int] = None) -> Optional[memoryview]:
+        """
+        处理PDU (功能码+数据), 返回响应PDU; 报文格式不符时返回None
+        指定 unit 时直接返回该从站地址的RTU响应帧: 从站地址、PDU和CRC在同一个
+        预分配的缓冲区中组装, 不再逐层拼接复制
+        """
+        function_code = pdu[0]
+        if function_code == FC_READ_HOLDING_REGISTERS:
+            handler = self._read_holding_registers
+        elif function_code == FC_WRITE_SINGLE_REGISTER:
+            handler = self._write_single_register
+        elif function_code == FC_WRITE_MULTIPLE_REGISTERS:
+            handler = self._write_multiple_registers
+        else:
+            # 响应帧的功能码带0x80标志, 不是发给本站的请求
+            if function_code & EXCEPTION_FLAG:
+                return None
+            _UNKNOWN_FUNCTIONS.inc()
+            return self._exception(function_code, EXC_ILLEGAL_FUNCTION, unit)
+
+        self.requests += 1
+        _REQUESTS[function_code].inc()
+        return handler(pdu, unit)
+
+    @staticmethod
+    def _seal(unit: Optional[int], buffer: bytearray) -> memoryview:
+        """
+        RTU响应帧填入从站地址和CRC
+        响应缓冲区由各处理函数按最终长度一次分配: 指定 unit 时PDU从偏移1开始,
+        前面是从站地址, 后面为CRC预留两个字节 (长度为 PDU长度 + 3)
+        """
+        if unit is not None:
+            buffer[0] = unit
+            write_crc(buffer)
+        return memoryview(buffer)
+
+    def _exception(self, function_code: int, code: int, unit: Optional[int] = None) -> memoryview:
+        self.exceptions += 1
+        EXCEPTIONS_SENT.labels(code).inc()
+        offset = 0 if unit is None else 1
+        buffer = bytearray(2 + 3 * offset)
+        buffer[offset] = function_code | EXCEPTION_FLAG
+        buffer[offset + 1] = code
+        return self._seal(unit, buffer)
+
+    def _is_aligned(self, start: int, count: int) -> bool:
+        return bool(self._protocol) and self._protocol.is_aligned(start, count)
+
+    def _read_holding_registers(self, pdu: bytes, unit: Optional[int]) -> Optional[memoryview]:
+        if len(pdu) != 5:
+            return None
+        start, count = struct.unpack('>HH', pdu[1:5])
+        if not 1 <= count <= MAX_READ_REGISTERS:
+            return self._exception(pdu[0], EXC_ILLEGAL_DATA_VALUE, unit)
+
+        size = count * 2
+        offset = 0 if unit is None else 1
+        buffer = bytearray(2 + size + 3 * offset)
+        buffer[offset] = pdu[0]
+        buffer[offset + 1] = size
+        offset += 2
+        with self._lock:
+            # 未映射的地址, 或从多寄存器值中间开始/结束的读请求应答异常02
+            if not self._is_aligned(start, count):
+                return self._exception(pdu[0], EXC_ILLEGAL_DATA_ADDRESS, unit)
+            # 在锁内复制寄存器数据, 避免读到正在更新的多寄存器值
+            buffer[offset:offset + size] = self._image.view(start, count)
+        return self._seal(unit, buffer)
+
+    def _write_single_register(self, pdu: bytes, unit: Optional[int]) -> Optional[memoryview]:
+        if len(pdu) != 5:
+            return None
+        address = (pdu[1] << 8) | pdu[2]
+        if not self._write_registers(address, pdu[3:5]):
+            return self._exception(pdu[0], EXC_ILLEGAL_DATA_ADDRESS, unit)
+        return self._echo(pdu, unit)
+
+    def _write_multiple_registers(self, pdu: bytes, unit: Optional[int]) -> Optional[memoryview]:
+        if len(pdu) < 6:
+            return None
+        start, count, byte_count = struct.unpack('>HHB', pdu[1:6])
+        if (not 1 <= count <= MAX_WRITE_REGISTERS or byte_count != count * 2
+                or len(pdu) != 6 + byte_count):
+            return self._exception(pdu[0], EXC_ILLEGAL_DATA_VALUE, unit)
+
+        if not self._write_registers(start, pdu[6:]):
+            return self._exception(pdu[0], EXC_ILLEGAL_DATA_ADDRESS, unit)
+        return self._echo(pdu, unit)
+
+    def _echo(self, pdu: bytes, unit: Optional[int]) -> memoryview:
+        """写请求的响应: 功能码、起始地址和寄存器数量 (FC06为寄存器值) 原样返回"""
+        offset = 0 if unit is None else 1
+        buffer = bytearray(5 + 3 * offset)
+        buffer[offset:offset + 5] = pdu[:5]
+        return self._seal(unit, buffer)
+
+    def _write_registers(self, start: int, data: bytes) -> bool:
+        """
+        写入寄存器映像 (大端寄存器数据), 并把受影响的变量经写转换后交给 on_write
+        与读请求相同, 只写多寄存器值一半的请求不执行 (返回False, 应答异常02),
+        否则半新半旧的寄存器会被解码成错误的变量值
+        """
+        updates = {}
+        count = len(data) // 2
+        with self._lock:
+            if not self._is_aligned(start, count):
+                return False
+            image = self._image
+            image.write_bytes(start, data)
+
+            for entry in self._protocol.lookup_range(start, count):
+                if entry.variable is None:
+                    continue
+                try:
+                    raw = decode_bytes(image.read_bytes(entry.address, entry.length), entry.info)
+                    updates[entry.variable] = entry.write(raw)
+                except Exception as e:
+                    logger.error(f"Error converting written register 0x{entry.address:04X}: {e}")
+
+        if updates and self.on_write:
+            self.on_write(updates)
+        return True
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取应答统计信息"""
+        stats = {
+            'requests': self.requests,
+            'exceptions': self.exceptions
+        }
+        stats.update({f"turnaround_{k}": v for k, v in self.turnaround.get_stats().items()})
+        return stats
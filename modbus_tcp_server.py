@@ -0,0 +1,144 @@
+import struct
+import asyncio
+import logging
+import threading
+from typing import Dict, Optional
+from function_codes import EXCEPTION_FLAG
+
+logger = logging.getLogger(__name__)
+
+MBAP_HEADER = struct.Struct('>HHHB')   # 事务号, 协议号, 长度, 单元号
+MAX_PDU_SIZE = 253
+# Modbus TCP 中单元号 0 和 0xFF 通常表示服务器本身
+LOCAL_UNITS = (0x00, 0xFF)
+EXC_GATEWAY_TARGET_FAILED = 0x0B
+
+
+class ModbusTCPServer:
+    """
+    asyncio Modbus TCP (MBAP) 服务器
+
+    与串口共用同一个 ModbusResponder, 因而共享协议寄存器映像和内部变量。
+    所有连接由一个事件循环处理; 同一连接上流水线发送的多个请求按顺序应答,
+    应答先写入传输缓冲区, 只在缓冲区超过高水位时才等待 drain。
+    """
+
+    def __init__(self, responder, host: str = '0.0.0.0', port: int = 502,
+                 backlog: int = 512):
+        self.responder = responder
+        self.host = host
+        self.port = port
+        self.backlog = backlog
+
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._thread: Optional[threading.Thread] = None
+        self._started = threading.Event()
+        self._start_error: Optional[Exception] = None
+
+        self.connections = 0
+        self.total_connections = 0
+        self.requests = 0
+        self.responses = 0
+
+    async def start(self):
+        """在当前事件循环中开始监听"""
+        self._server = await asyncio.start_server(
+            self._handle_client, self.host, self.port, backlog=self.backlog)
+        # 端口为0时由系统分配, 记录实际端口
+        self.port = self._server.sockets[0].getsockname()[1]
+        logger.info(f"Modbus TCP server listening on {self.host}:{self.port}")
+
+    async def close(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    async def _handle_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.connections += 1
+        self.total_connections += 1
+        peer = writer.get_extra_info('peername')
+        try:
+            while True:
+                header = await reader.readexactly(MBAP_HEADER.size)
+                transaction_id, protocol_id, length, unit = MBAP_HEADER.unpack(header)
+                if protocol_id != 0 or not 2 <= length <= MAX_PDU_SIZE + 1:
+                    logger.warning(f"Invalid MBAP header from {peer}, closing connection")
+                    break
+                pdu = await reader.readexactly(length - 1)
+                self.requests += 1
+
+                response = self._handle_pdu(unit, pdu)
+                if response is None:
+                    continue
+                writer.write(MBAP_HEADER.pack(transaction_id, 0, len(response) + 1, unit) + response)
+                self.responses += 1
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        except asyncio.CancelledError:
+            # 服务器关闭时取消连接任务, 正常结束
+            pass
+        except Exception as e:
+            logger.error(f"Modbus TCP client {peer} error: {e}")
+        finally:
+            self.connections -= 1
+            writer.close()
+
+    def _handle_pdu(self, unit: int, pdu: bytes) -> Optional[bytes]:
+        if unit in LOCAL_UNITS:
+            return self.responder.handle_pdu(pdu)
+        if not self.responder.accepts(unit):
+            return bytes((pdu[0] | EXCEPTION_FLAG, EXC_GATEWAY_TARGET_FAILED))
+        return self.responder.handle_request(unit, pdu)
+
+    def start_in_thread(self, timeout: float = 5.0) -> bool:
+        """在后台线程中运行独立的事件循环"""
+        self._thread = threading.Thread(target=self._run_loop, name="ModbusTCPServer", daemon=True)
+        self._thread.start()
+        self._started.wait(timeout)
+        if self._start_error is not None:
+            logger.error(f"Failed to start Modbus TCP server: {self._start_error}")
+            return False
+        return self._server is not None
+
+    def _run_loop(self):
+        self._loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self._loop)
+        try:
+            self._loop.run_until_complete(self.start())
+        except Exception as e:
+            self._start_error = e
+            self._started.set()
+            self._loop.close()
+            return
+        self._started.set()
+        try:
+            self._loop.run_forever()
+        finally:
+            # 先停止监听并取消所有连接任务, 再等待服务器关闭
+            self._server.close()
+            tasks = asyncio.all_tasks(self._loop)
+            for task in tasks:
+                task.cancel()
+            self._loop.run_until_complete(asyncio.gather(*tasks, return_exceptions=True))
+            self._loop.run_until_complete(self.close())
+            self._loop.close()
+
+    def stop(self):
+        """停止后台线程中的服务器"""
+        if self._loop is not None and self._loop.is_running():
+            self._loop.call_soon_threadsafe(self._loop.stop)
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def get_stats(self) -> Dict[str, int]:
+        """获取连接和请求统计"""
+        return {
+            'connections': self.connections,
+            'total_connections': self.total_connections,
+            'requests': self.requests,
+            'responses': self.responses
+        }
@@ -0,0 +1,206 @@
+import time
+import logging
+import threading
+from typing import Any, Callable, Dict, List, Optional
+import serial
+from serial_reader import SerialReader, READ_MODE_BLOCKING, DIRECTION_RX, DIRECTION_TX
+from unit_dispatcher import UnitDispatcher
+
+logger = logging.getLogger(__name__)
+
+PARITY_MAP = {
+    'N': serial.PARITY_NONE,
+    'E': serial.PARITY_EVEN,
+    'O': serial.PARITY_ODD
+}
+
+
+def open_port(settings: Dict[str, Any]) -> serial.Serial:
+    """按端口配置打开串口"""
+    return serial.Serial(
+        port=settings["port"],
+        baudrate=int(settings.get("baudrate", 9600)),
+        bytesize=int(settings.get("bytesize", 8)),
+        parity=PARITY_MAP[settings.get("parity", "N")],
+        stopbits=float(settings.get("stopbits", 1)),
+        timeout=SerialReader.IDLE_TIMEOUT
+    )
+
+
+class PortWorker(threading.Thread):
+    """
+    单个串口的读取线程
+    拥有独立的 SerialReader (帧检测器)、应答引擎和收发计数
+    """
+
+    def __init__(self, name: str, serial_port, responder=None,
+                 read_mode: str = READ_MODE_BLOCKING,
+                 on_frame: Optional[Callable[[str, bytes, str], None]] = None,
+                 echo_suppression: bool = False):
+        super().__init__(name=f"PortWorker-{name}", daemon=True)
+        self.port_name = name
+        self.serial_port = serial_port
+        self.responder = responder
+        self.on_frame = on_frame
+        self.reader = SerialReader(serial_port, read_mode, responder=responder,
+                                   echo_suppression=echo_suppression)
+        self.reader.on_sent = self._on_sent
+        self.running = False
+
+        self.frames_in = 0
+        self.frames_out = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.errors = 0
+
+    def run(self):
+        self.running = True
+        while self.running and self.serial_port.is_open:
+            try:
+                frames = self.reader.read_frames()
+            except Exception as e:
+                if not self.running:
+                    break
+                self.errors += 1
+                logger.error(f"Error reading {self.port_name}: {e}")
+                time.sleep(0.01)
+                continue
+            for frame in frames:
+                self.frames_in += 1
+                self.bytes_in += len(frame)
+                if self.on_frame is not None:
+                    self.on_frame(self.port_name, frame, DIRECTION_RX)
+        self.reader.flush()
+
+    def _on_sent(self, data: bytes):
+        self.frames_out += 1
+        self.bytes_out += len(data)
+        if self.on_frame is not None:
+            self.on_frame(self.port_name, data, DIRECTION_TX)
+
+    def stop(self, timeout: float = 1.0):
+        self.running = False
+        self.join(timeout)
+        if self.serial_port.is_open:
+            self.serial_port.close()
+
+    def get_stats(self) -> Dict[str, Any]:
+        stats = {
+            'frames_in': self.frames_in,
+            'frames_out': self.frames_out,
+            'bytes_in': self.bytes_in,
+            'bytes_out': self.bytes_out,
+            'errors': self.errors
+        }
+        stats.update(self.reader.framer.get_stats())
+        if self.responder is not None:
+            stats['responder'] = self.responder.get_stats()
+        return stats
+
+
+class PortManager:
+    """
+    多串口并发仿真引擎
+
+    按配置中的 ports 列表打开N个串口, 每个串口一个读取线程 (阻塞在各自的
+    文件描述符上, 空闲时不占用CPU), 各自拥有帧检测器、应答引擎和计数器。
+    端口之间不共享可变状态, 因此无需加锁; 汇总统计报告总吞吐量。
+    """
+
+    def __init__(self, load_protocol: Callable[[str], Any],
+                 read_mode: str = READ_MODE_BLOCKING,
+                 on_frame: Optional[Callable[[str, bytes, str], None]] = None,
+                 parser=None):
+        """
+        Args:
+            load_protocol: 根据协议名称返回协议定义 (或已编译的ProtocolMap) 的函数
+            read_mode: 读取模式
+            on_frame: 收发帧回调 (端口名, 数据, 方向), 在读取线程中调用
+            parser: 解码 on_frame 收发帧的 ModbusParser, 端口打开和协议重新加载时
+                登记该端口各从站的协议, 各端口的帧按自己的从站协议解码
+        """
+        self.load_protocol = load_protocol
+        self.read_mode = read_mode
+        self.on_frame = on_frame
+        self.parser = parser
+        self.workers: Dict[str, PortWorker] = {}
+        self._started_at: Optional[float] = None
+
+    def open_ports(self, ports: List[Dict[str, Any]]) -> List[str]:
+        """
+        打开并启动配置中的全部串口
+        Args:
+            ports: [{"port": "COM3", "baudrate": 9600, ..., "echo_suppression": false,
+                     "units": {"1": {"protocol": 名称}}}]
+        Returns:
+            list: 打开失败的端口名称
+        """
+        failed = []
+        for settings in ports:
+            name = settings.get("port", "?")
+            try:
+                self.open(settings)
+            except Exception as e:
+                logger.error(f"Failed to open port {name}: {e}")
+                failed.append(name)
+        return failed
+
+    def open(self, settings: Dict[str, Any]) -> PortWorker:
+        """打开单个串口并启动读取线程"""
+        name = settings["port"]
+        if name in self.workers:
+            raise ValueError(f"Port {name} already open")
+
+        responder = UnitDispatcher.from_config(settings.get("units", {}), self.load_protocol)
+        serial_port = open_port(settings)
+        worker = PortWorker(name, serial_port, responder, self.read_mode, self.on_frame,
+                            bool(settings.get("echo_suppression", False)))
+        self.workers[name] = worker
+        if self.parser is not None:
+            self.parser.set_port_protocols(name, responder.unit_protocols())
+        worker.start()
+        if self._started_at is None:
+            self._started_at = time.monotonic()
+        logger.info(f"Port {name} opened with units {responder.unit_ids()}")
+        return worker
+
+    def close(self, name: str):
+        worker = self.workers.pop(name, None)
+        if worker is not None:
+            worker.stop()
+            if self.parser is not None:
+                self.parser.set_port_protocols(name, None)
+
+    def close_all(self):
+        for name in list(self.workers):
+            self.close(name)
+        self._started_at = None
+
+    def reload_protocol(self, protocol_name: str, protocol_map) -> int:
+        """把各端口上使用指定协议的从站切换到新编译的协议, 返回切换的从站数"""
+        reloaded = 0
+        for name, worker in list(self.workers.items()):
+            units = worker.responder.reload_protocol(protocol_name, protocol_map)
+            if units and self.parser is not None:
+                self.parser.set_port_protocols(name, worker.responder.unit_protocols())
+            reloaded += len(units)
+        return reloaded
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        获取各端口统计和汇总吞吐量
+        吞吐量为自第一个端口打开以来的平均值
+        """
+        ports = {name: worker.get_stats() for name, worker in self.workers.items()}
+        elapsed = time.monotonic() - self._started_at if self._started_at else 0.0
+        totals = {key: sum(stats[key] for stats in ports.values())
+                  for key in ('frames_in', 'frames_out', 'bytes_in', 'bytes_out', 'errors')}
+        totals['ports'] = len(ports)
+        totals['elapsed_s'] = elapsed
+        if elapsed > 0:
+            totals['frames_per_s'] = (totals['frames_in'] + totals['frames_out']) / elapsed
+            totals['bytes_per_s'] = (totals['bytes_in'] + totals['bytes_out']) / elapsed
+        else:
+            totals['frames_per_s'] = 0.0
+            totals['bytes_per_s'] = 0.0
+        return {'total': totals, 'ports': ports}
@@ -0,0 +1,192 @@
+import os
+import re
+import sys
+import json
+import gc
+import hashlib
+import logging
+import tempfile
+import threading
+from typing import Any, Dict, Optional, Tuple
+from protocol_map import ProtocolMap
+
+logger = logging.getLogger(__name__)
+
+# 缓存格式版本, ProtocolMap 的序列化结构变化时递增
+CACHE_VERSION = 2
+
+# 行内的字符串 (原样保留) 和注释起始符
+_TOKEN_PATTERN = re.compile(r'"[^"\\]*(?:\\.[^"\\]*)*"|//|/\*')
+
+
+def strip_json_comments(text: str) -> str:
+    """
+    去掉带注释JSON中的 // 行注释和 /* */ 块注释
+    JSON字符串不能跨行, 因此逐行处理: 不含 // 和 /* 的行原样保留, 其余行跳过字符串
+    查找注释起始符, 字符串中的 // 不受影响。注释所在的行保留为空行, 解析错误
+    报告的行号与源文件一致。
+    """
+    if '//' not in text and '/*' not in text:
+        return text
+    lines = text.split('\n')
+    in_block = False
+    for i, line in enumerate(lines):
+        pos = 0
+        if in_block:
+            end = line.find('*/')
+            if end < 0:
+                lines[i] = ''
+                continue
+            in_block = False
+            pos = end + 2
+        if '//' not in line and '/*' not in line:
+            lines[i] = line[pos:]
+            continue
+
+        out = []
+        while True:
+            match = _TOKEN_PATTERN.search(line, pos)
+            if match is None:
+                out.append(line[pos:])
+                break
+            token = match.group()
+            if token[0] == '"':
+                out.append(line[pos:match.end()])
+                pos = match.end()
+                continue
+            out.append(line[pos:match.start()])
+            if token == '//':
+                break
+            end = line.find('*/', match.end())
+            if end < 0:
+                in_block = True
+                break
+            pos = end + 2
+        lines[i] = ''.join(out)
+    return '\n'.join(lines)
+
+
+def loads_jsonc(text: str) -> Any:
+    """解析带注释的JSON文本, 标准JSON不做预处理"""
+    try:
+        return json.loads(text)
+    except json.JSONDecodeError:
+        return json.loads(strip_json_comments(text))
+
+
+def read_jsonc(path: str) -> Any:
+    """读取带注释的JSON文件"""
+    with open(path, 'r', encoding='utf-8-sig') as f:
+        return loads_jsonc(f.read())
+
+
+class ProtocolLoader:
+    """
+    协议加载器
+
+    协议文件允许带注释 (JSONC), 加载后编译为 ProtocolMap (地址索引、
+    struct 格式、编译后的转换表达式)。编译结果按文件路径缓存在内存中,
+    文件的 mtime 和大小不变时直接返回; 否则按文件内容的 SHA-256 查找
+    cache_dir 下序列化的编译结果, 内容未变 (如只是重新检出) 时只需反序列化。
+    缓存损坏或版本不符时重新编译, 缓存写入失败只记录警告。
+
+    缓存为 JSON (ProtocolMap.to_state 的结果), 不使用 pickle: 缓存目录可能被
+    其他用户写入, 读取缓存不能执行任何代码, 最坏情况只是得到错误的协议。
+    """
+
+    def __init__(self, cache_dir: Optional[str] = None):
+        """
+        Args:
+            cache_dir: 磁盘缓存目录, None 表示只在内存中缓存
+        """
+        self.cache_dir = cache_dir
+        self._memory: Dict[str, Tuple[int, int, ProtocolMap]] = {}
+        self._lock = threading.Lock()
+        self.stats = {'memory_hits': 0, 'disk_hits': 0, 'compiles': 0}
+
+    def load(self, path: str) -> ProtocolMap:
+        """
+        加载并编译协议文件
+        Raises:
+            OSError: 文件无法读取
+            ValueError: JSON 语法错误或协议定义无效
+        """
+        path = os.path.abspath(path)
+        st = os.stat(path)
+        with self._lock:
+            cached = self._memory.get(path)
+        if cached is not None and cached[:2] == (st.st_mtime_ns, st.st_size):
+            self.stats['memory_hits'] += 1
+            return cached[2]
+
+        with open(path, 'rb') as f:
+            source = f.read()
+        digest = hashlib.sha256(source).hexdigest()
+
+        protocol_map = self._read_cache(path, digest)
+        if protocol_map is None:
+            protocol_map = ProtocolMap(loads_jsonc(source.decode('utf-8-sig')))
+            self.stats['compiles'] += 1
+            self._write_cache(path, digest, protocol_map)
+        else:
+            self.stats['disk_hits'] += 1
+
+        with self._lock:
+            self._memory[path] = (st.st_mtime_ns, st.st_size, protocol_map)
+        return protocol_map
+
+    def invalidate(self, path: Optional[str] = None):
+        """丢弃内存缓存 (path 为 None 时全部丢弃)"""
+        with self._lock:
+            if path is None:
+                self._memory.clear()
+            else:
+                self._memory.pop(os.path.abspath(path), None)
+
+    def _cache_path(self, path: str) -> str:
+        name = hashlib.sha1(path.encode('utf-8')).hexdigest()[:16]
+        return os.path.join(self.cache_dir, f"{os.path.basename(path)}.{name}.json")
+
+    def _cache_header(self, digest: str) -> list:
+        return [CACHE_VERSION, list(sys.version_info[:2]), digest]
+
+    def _read_cache(self, path: str, digest: str) -> Optional[ProtocolMap]:
+        if not self.cache_dir:
+            return None
+        cache_path = self._cache_path(path)
+        try:
+            with open(cache_path, 'r', encoding='utf-8') as f:
+                # 第一行为缓存头, 不匹配时不解析其余内容
+                if json.loads(f.readline()) != self._cache_header(digest):
+                    return None
+                # 反序列化大量小对象时暂停循环垃圾回收, 避免反复扫描新建的容器
+                enabled = gc.isenabled()
+                gc.disable()
+                try:
+                    return ProtocolMap.from_state(json.loads(f.read()))
+                finally:
+                    if enabled:
+                        gc.enable()
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logger.warning(f"Ignoring unreadable protocol cache {cache_path}: {e}")
+            return None
+
+    def _write_cache(self, path: str, digest: str, protocol_map: ProtocolMap):
+        if not self.cache_dir:
+            return
+        cache_path = self._cache_path(path)
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix='.tmp')
+            try:
+                with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                    f.write(json.dumps(self._cache_header(digest)) + '\n')
+                    json.dump(protocol_map.to_state(), f, ensure_ascii=False, separators=(',', ':'))
+                os.replace(tmp_path, cache_path)
+            except BaseException:
+                os.unlink(tmp_path)
+                raise
+        except Exception as e:
+            logger.warning(f"Failed to write protocol cache {cache_path}: {e}")
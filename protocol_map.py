@@ -0,0 +1,262 @@
+import struct
+import logging
+from bisect import bisect_left, bisect_right
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional
+from conversion import ConversionError, compile_conversion
+from register_codec import TYPE_FORMATS, register_type
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class RegisterEntry:
+    """编译后的寄存器定义"""
+    address: int
+    length: int
+    key: str
+    info: Dict[str, Any]
+    variable: Optional[str] = None
+    read: Optional[Callable[[Any], Any]] = None    # 变量值 -> 寄存器值
+    write: Optional[Callable[[Any], Any]] = None   # 寄存器值 -> 变量值
+
+    @property
+    def end(self) -> int:
+        return self.address + self.length
+
+
+class BlockDecoder:
+    """
+    一段连续寄存器范围的预编译解码器
+    整段负载用一次 struct.unpack 解出, 未定义或只被部分覆盖的寄存器按填充字节跳过
+    """
+
+    def __init__(self, start: int, count: int, entries: List[RegisterEntry],
+                 fmt: Optional[str] = None):
+        """
+        Args:
+            fmt: 已知的 struct 格式 (从缓存恢复时), 此时 entries 必须正好是格式中的寄存器
+        """
+        self.start = start
+        self.count = count
+        if fmt is None:
+            entries, fmt = self._layout(start, count, entries)
+        self.entries = entries
+        self.struct = struct.Struct(fmt)
+        self._scales = [entry.info.get('scale') for entry in self.entries]
+        self._labels = [entry.info.get('values') for entry in self.entries]
+
+    @staticmethod
+    def _layout(start: int, count: int, entries: List[RegisterEntry]):
+        inside = []
+        fmt = ['>']
+        pad_words = 0
+        position = start
+        for entry in entries:
+            if entry.address < start or entry.end > start + count:
+                continue
+            pad_words += entry.address - position
+            if pad_words:
+                fmt.append(f"{pad_words * 2}x")
+                pad_words = 0
+            fmt.append(TYPE_FORMATS[register_type(entry.info)])
+            inside.append(entry)
+            position = entry.end
+        pad_words += start + count - position
+        if pad_words:
+            fmt.append(f"{pad_words * 2}x")
+        return inside, ''.join(fmt)
+
+    def decode(self, payload: bytes) -> List[Dict[str, Any]]:
+        """
+        解码寄存器负载
+        Returns:
+            list: 每个寄存器一个字典, 包含地址、名称、原始值、缩放后的值、单位和枚举标签
+        """
+        raws = self.struct.unpack(payload)
+        values = []
+        for entry, raw, scale, labels in zip(self.entries, raws, self._scales, self._labels):
+            item = {
+                'address': entry.key,
+                'name': entry.info['name'],
+                'raw': raw,
+                'value': raw * scale if scale else raw,
+                'unit': entry.info.get('unit')
+            }
+            if labels:
+                item['label'] = labels.get(str(raw))
+            values.append(item)
+        return values
+
+
+class ProtocolMap:
+    """
+    按整数地址索引的协议寄存器表
+
+    加载协议时编译一次: 寄存器按起始地址排序, 用 bisect 在 O(log n) 内把任意
+    地址解析到覆盖它的寄存器 (包括多字寄存器的中间地址), 并能把 start+count
+    范围解析为所有重叠的寄存器。变量映射的读/写转换表达式也在此时编译,
+    表达式不合法时加载失败。每段地址连续的寄存器预编译一个 BlockDecoder,
+    其他范围的解码器在首次使用时生成并缓存。
+
+    编译结果可以导出为只含 JSON 基本类型的状态 (to_state), 由 protocol_loader
+    缓存到磁盘: 只保存协议定义、排好序的寄存器行和预编译解码器的格式, 恢复
+    (from_state) 时跳过地址解析、排序、重叠检查和格式生成, 转换表达式通过
+    compile_conversion 的缓存重新编译。
+    """
+
+    MAX_CACHED_DECODERS = 1024
+
+    def __init__(self, protocol: Dict[str, Any]):
+        self.protocol = protocol
+        entries = []
+        for key, info in protocol.get('registers', {}).items():
+            address = int(key, 16)
+            length = int(info.get('length', 1))
+            if length < 1:
+                raise ValueError(f"Register {key} has invalid length {length}")
+            entry = RegisterEntry(address, length, key, info)
+            if 'variable_mapping' in info:
+                self._compile_mapping(entry)
+            entries.append(entry)
+        entries.sort(key=lambda entry: entry.address)
+
+        for prev, entry in zip(entries, entries[1:]):
+            if entry.address < prev.end:
+                raise ValueError(f"Register {entry.key} overlaps register {prev.key}")
+
+        self.entries: List[RegisterEntry] = entries
+        self._starts = [entry.address for entry in entries]
+        self._ends = [entry.end for entry in entries]
+
+        # 协议文件中的功能码为十进制字符串 ("03", "16"), 转换为整数
+        self.function_names: Dict[int, str] = {
+            int(code): name for code, name in protocol.get('function_codes', {}).items()
+        }
+
+        self._decoders: Dict[tuple, BlockDecoder] = {}
+        for start, count in self._contiguous_blocks():
+            self._decoders[(start, count)] = BlockDecoder(start, count, self.lookup_range(start, count))
+
+    def to_state(self) -> Dict[str, Any]:
+        """编译结果的可序列化状态 (只含 dict/list/str/int)"""
+        return {
+            'protocol': self.protocol,
+            'rows': [(entry.address, entry.length, entry.key) for entry in self.entries],
+            'decoders': [(start, count, decoder.struct.format)
+                         for (start, count), decoder in self._decoders.items()],
+        }
+
+    @classmethod
+    def from_state(cls, state: Dict[str, Any]) -> 'ProtocolMap':
+        """
+        从 to_state 的结果恢复
+        Raises:
+            KeyError, ValueError, TypeError, struct.error: 状态与协议定义不一致
+        """
+        self = cls.__new__(cls)
+        self.protocol = state['protocol']
+        registers = self.protocol.get('registers', {})
+        entries = []
+        for address, length, key in state['rows']:
+            info = registers[key]
+            entry = RegisterEntry(address, length, key, info)
+            if 'variable_mapping' in info:
+                self._compile_mapping(entry)
+            entries.append(entry)
+
+        self.entries = entries
+        self._starts = [entry.address for entry in entries]
+        self._ends = [entry.end for entry in entries]
+        self.function_names = {
+            int(code): name for code, name in self.protocol.get('function_codes', {}).items()
+        }
+        self._decoders = {}
+        for start, count, fmt in state['decoders']:
+            inside = [entry for entry in self.lookup_range(start, count)
+                      if entry.address >= start and entry.end <= start + count]
+            self._decoders[(start, count)] = BlockDecoder(start, count, inside, fmt)
+        return self
+
+    def _contiguous_blocks(self):
+        block_start = None
+        block_end = None
+        for entry in self.entries:
+            if block_end is not None and entry.address == block_end:
+                block_end = entry.end
+                continue
+            if block_start is not None:
+                yield block_start, block_end - block_start
+            block_start, block_end = entry.address, entry.end
+        if block_start is not None:
+            yield block_start, block_end - block_start
+
+    @staticmethod
+    def _compile_mapping(entry: RegisterEntry):
+        var_mapping = entry.info['variable_mapping']
+        conversion = var_mapping.get('conversion', {})
+        try:
+            entry.read = compile_conversion(conversion.get('read', 'value'))
+            entry.write = compile_conversion(conversion.get('write', 'value'))
+        except ConversionError as e:
+            raise ValueError(f"Register {entry.key}: {e}") from None
+        entry.variable = var_mapping['name']
+
+    @classmethod
+    def compile(cls, protocol) -> 'ProtocolMap':
+        """编译协议定义, 已编译的对象原样返回"""
+        if isinstance(protocol, cls):
+            return protocol
+        return cls(protocol)
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def lookup(self, address: int) -> Optional[RegisterEntry]:
+        """获取覆盖指定地址的寄存器"""
+        index = bisect_right(self._starts, address) - 1
+        if index >= 0 and address < self._ends[index]:
+            return self.entries[index]
+        return None
+
+    def lookup_range(self, start: int, count: int) -> List[RegisterEntry]:
+        """获取与 [start, start+count) 重叠的所有寄存器, 按地址排序"""
+        first = bisect_right(self._ends, start)
+        last = bisect_left(self._starts, start + count)
+        return self.entries[first:last]
+
+    def is_mapped(self, start: int, count: int) -> bool:
+        """[start, start+count) 中的每个地址是否都属于某个寄存器"""
+        expected = start
+        for entry in self.lookup_range(start, count):
+            if entry.address > expected:
+                return False
+            expected = entry.end
+        return expected >= start + count
+
+    def is_aligned(self, start: int, count: int) -> bool:
+        """
+        [start, start+count) 是否完整映射, 且不从多寄存器值 (float32/int32
+        等) 的中间开始或结束; 读半个多寄存器值得到的数据没有意义
+        """
+        expected = start
+        for entry in self.lookup_range(start, count):
+            if entry.address != expected:
+                return False
+            expected = entry.end
+        return expected == start + count
+
+    def decoder_for(self, start: int, count: int) -> BlockDecoder:
+        """获取 [start, start+count) 范围的解码器"""
+        key = (start, count)
+        decoder = self._decoders.get(key)
+        if decoder is None:
+            if len(self._decoders) >= self.MAX_CACHED_DECODERS:
+                self._decoders.clear()
+            decoder = BlockDecoder(start, count, self.lookup_range(start, count))
+            self._decoders[key] = decoder
+        return decoder
+
+    def decode_registers(self, start: int, payload: bytes) -> List[Dict[str, Any]]:
+        """把从 start 开始的寄存器负载解码为带类型和缩放的值"""
+        return self.decoder_for(start, len(payload) // 2).decode(payload)
@@ -1,17 +1,14 @@
 from PyQt5.QtWidgets import (QDialog, QVBoxLayout, QHBoxLayout, QComboBox, 
                             QLabel, QPushButton, QGroupBox, QMessageBox)
 from PyQt5.QtCore import Qt
-import json
-import os
 
 class ProtocolSettingsDialog(QDialog):
     def __init__(self, parent=None):
         super().__init__(parent)
         self.parent = parent
         
-        # 初始化配置文件路径
-        self.base_dir = os.path.dirname(os.path.abspath(__file__))
-        self.config_path = os.path.join(self.base_dir, 'config.json')
+        # 与主窗口共用同一个配置服务, 读到的是内存中的最新配置 (包括尚未写入磁盘的修改)
+        self.config_manager = parent.config_manager
         
         self.setWindowTitle("协议配置")
         self.setModal(True)
@@ -80,31 +77,21 @@ class ProtocolSettingsDialog(QDialog):
     def load_protocol_list(self):
         """加载协议列表"""
         try:
-            if not os.path.exists(self.config_path):
+            protocols = self.config_manager.get("protocols")
+            if not protocols:
                 QMessageBox.critical(self, "错误", 
-                    f"配置文件不存在:\n{self.config_path}\n\n请确保配置文件存在且格式正确。")
-                self.parent.log_message(f"配置文件不存在: {self.config_path}", "ERROR")
+                    "配置文件格式错误：未找到protocols字段\n\n请检查配置文件格式。")
+                self.parent.log_message("配置文件中没有找到protocols字段", "ERROR")
                 return
                 
-            with open(self.config_path, 'r', encoding='utf-8') as f:
-                config = json.load(f)
-                if "protocols" not in config:
-                    QMessageBox.critical(self, "错误", 
-                        "配置文件格式错误：未找到protocols字段\n\n请检查配置文件格式。")
-                    self.parent.log_message("配置文件中没有找到protocols字段", "ERROR")
-                    return
-                    
-                self.protocol_combo.addItems(config["protocols"].keys())
-                
-                # 设置上次选择的协议
-                if "last_protocol" in config:
-                    index = self.protocol_combo.findText(config["last_protocol"])
-                    if index >= 0:
-                        self.protocol_combo.setCurrentIndex(index)
-        except json.JSONDecodeError:
-            QMessageBox.critical(self, "错误", 
-                "配置文件格式错误\n\n请确保配置文件是有效的JSON格式。")
-            self.parent.log_message("配置文件格式错误", "ERROR")
+            self.protocol_combo.addItems(protocols.keys())
+            
+            # 设置上次选择的协议
+            last_protocol = self.config_manager.get("last_protocol")
+            if last_protocol:
+                index = self.protocol_combo.findText(last_protocol)
+                if index >= 0:
+                    self.protocol_combo.setCurrentIndex(index)
         except Exception as e:
             QMessageBox.critical(self, "错误", 
                 f"加载协议列表失败：\n{str(e)}")
@@ -115,16 +102,5 @@ class ProtocolSettingsDialog(QDialog):
         return self.protocol_combo.currentText() 
     
     def load_config(self):
-        """加载配置"""
-        try:
-            with open(self.config_path, 'r', encoding='utf-8') as f:
-                self.config = json.load(f)
-                return self.config.get('protocols', {})
-        except FileNotFoundError:
-            QMessageBox.critical(self, "错误", 
-                f"配置文件未找到：\n{self.config_path}")
-            return {}
-        except json.JSONDecodeError:
-            QMessageBox.critical(self, "错误", 
-                "配置文件格式错误\n\n请确保配置文件是有效的JSON格式。")
-            return {} 
\ No newline at end of file
+        """获取协议配置"""
+        return self.config_manager.get('protocols', {})
@@ -0,0 +1,185 @@
+import os
+import time
+import logging
+import threading
+from typing import Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+MIN_INTERVAL = 0.1
+
+
+class ProtocolWatcher:
+    """
+    协议文件热加载
+
+    后台线程按 interval 轮询配置中各协议文件的 mtime 和大小, 只重新编译发生
+    变化的协议 (经 ConfigManager 的协议加载器, 内容未变时直接使用缓存)。
+    文件状态在连续两次轮询中相同才重新加载, 避免读到编辑器正在写入的文件。
+    监视线程只负责编译, 编译好的 ProtocolMap 经 on_reload(协议名称, ProtocolMap)
+    交给 ProtocolSwap, 由持有仿真对象的线程统一交换。编译失败 (如编辑器保存了
+    一半的文件) 时保留旧协议, 文件再次变化时重试。
+    """
+
+    def __init__(self, config_manager, on_reload: Callable[[str, object], None],
+                 interval: float = 1.0):
+        self.config_manager = config_manager
+        self.on_reload = on_reload
+        self.interval = max(float(interval), MIN_INTERVAL)
+        # 已加载的文件状态, 以及发生变化、等待写入完成的文件状态
+        self._signatures: Dict[str, Optional[Tuple[int, int]]] = {}
+        self._pending: Dict[str, Tuple[int, int]] = {}
+        self._thread: Optional[threading.Thread] = None
+        self._stop_event = threading.Event()
+
+        self.reloads = 0
+        self.failures = 0
+        self.last_compile_ms = 0.0
+
+    def _signature(self, protocol_name: str) -> Optional[Tuple[int, int]]:
+        try:
+            st = os.stat(self.config_manager.protocol_path(protocol_name))
+        except (OSError, KeyError):
+            return None
+        return st.st_mtime_ns, st.st_size
+
+    def _scan(self) -> Dict[str, Optional[Tuple[int, int]]]:
+        protocols = list(self.config_manager.config.get("protocols", {}))
+        return {name: self._signature(name) for name in protocols}
+
+    def check(self) -> List[str]:
+        """
+        检查一次协议文件, 重新加载发生变化的协议
+        Returns:
+            list: 成功重新加载的协议名称
+        """
+        reloaded = []
+        for name, signature in self._scan().items():
+            if name not in self._signatures:
+                # 新加入配置的协议只记录状态, 尚未被使用
+                self._signatures[name] = signature
+                continue
+            if signature is None or signature == self._signatures[name]:
+                self._pending.pop(name, None)
+                continue
+            if self._pending.get(name) != signature:
+                self._pending[name] = signature
+                continue
+            del self._pending[name]
+            self._signatures[name] = signature
+            if self.reload(name):
+                reloaded.append(name)
+        return reloaded
+
+    def reload(self, protocol_name: str) -> bool:
+        """重新编译指定协议并交给 on_reload, 返回是否成功"""
+        started = time.perf_counter()
+        try:
+            protocol_map = self.config_manager.load_protocol_map(protocol_name)
+        except Exception as e:
+            self.failures += 1
+            logger.error(f"Failed to reload protocol {protocol_name}, keeping the previous version: {e}")
+            return False
+        self.last_compile_ms = (time.perf_counter() - started) * 1000.0
+        self.reloads += 1
+        logger.info(f"Compiled protocol {protocol_name}: {len(protocol_map)} registers "
+                    f"in {self.last_compile_ms:.2f} ms")
+        self.on_reload(protocol_name, protocol_map)
+        return True
+
+    def start(self):
+        """记录当前文件状态并启动轮询线程"""
+        if self._thread is not None:
+            return
+        self._signatures = self._scan()
+        self._pending.clear()
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name="ProtocolWatcher", daemon=True)
+        self._thread.start()
+        logger.info(f"Watching {len(self._signatures)} protocol files every {self.interval:g} s")
+
+    def _run(self):
+        while not self._stop_event.wait(self.interval):
+            try:
+                self.check()
+            except Exception as e:
+                logger.error(f"Protocol watcher check failed: {e}")
+
+    def stop(self):
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def get_stats(self) -> Dict[str, float]:
+        """获取热加载统计, 耗时单位毫秒"""
+        return {
+            'reloads': self.reloads,
+            'failures': self.failures,
+            'last_compile_ms': self.last_compile_ms
+        }
+
+
+class ProtocolSwap:
+    """
+    热加载协议的交换点
+
+    监视线程调用 submit() 交出编译好的 ProtocolMap, 同一协议尚未交换时只保留
+    最新的一份; 持有仿真对象的线程 (界面主线程、无界面模式的主循环) 调用 apply()
+    依次执行 swap(协议名称, ProtocolMap)。swap 负责在应答引擎和内部变量的锁内
+    替换协议 (见 ModbusResponder.swap_protocol), 监视线程不接触运行中的对象。
+    on_pending 在有新协议等待交换时于监视线程中调用, 用于唤醒交换线程。
+    """
+
+    def __init__(self, swap: Callable[[str, object], None],
+                 on_pending: Optional[Callable[[], None]] = None):
+        self.swap = swap
+        self.on_pending = on_pending
+        self._pending: Dict[str, object] = {}
+        self._lock = threading.Lock()
+
+        self.swaps = 0
+        self.failures = 0
+        self.last_swap_ms = 0.0
+        self.max_swap_ms = 0.0
+
+    def submit(self, protocol_name: str, protocol_map):
+        with self._lock:
+            self._pending[protocol_name] = protocol_map
+        if self.on_pending is not None:
+            self.on_pending()
+
+    def apply(self) -> List[Tuple[str, float]]:
+        """
+        交换所有等待中的协议
+        Returns:
+            list: 成功交换的 (协议名称, 交换耗时ms)
+        """
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        swapped = []
+        for protocol_name, protocol_map in pending.items():
+            started = time.perf_counter()
+            try:
+                self.swap(protocol_name, protocol_map)
+            except Exception as e:
+                self.failures += 1
+                logger.error(f"Failed to swap in protocol {protocol_name}: {e}")
+                continue
+            swap_ms = (time.perf_counter() - started) * 1000.0
+            self.swaps += 1
+            self.last_swap_ms = swap_ms
+            if swap_ms > self.max_swap_ms:
+                self.max_swap_ms = swap_ms
+            logger.info(f"Swapped in protocol {protocol_name} in {swap_ms:.2f} ms")
+            swapped.append((protocol_name, swap_ms))
+        return swapped
+
+    def get_stats(self) -> Dict[str, float]:
+        """获取交换统计, 耗时单位毫秒"""
+        return {
+            'swaps': self.swaps,
+            'failures': self.failures,
+            'last_swap_ms': self.last_swap_ms,
+            'max_swap_ms': self.max_swap_ms
+        }
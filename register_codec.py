@@ -0,0 +1,123 @@
+import struct
+import logging
+from functools import lru_cache
+from typing import Any, Callable, Dict, Sequence, Tuple
+
+try:
+    import numpy as np
+except ImportError:  # numpy 为可选依赖, 缺失时只能逐个寄存器编码
+    np = None
+
+logger = logging.getLogger(__name__)
+
+# 协议文件中的数据类型 -> struct格式字符 (大端, 按Modbus寄存器顺序)
+TYPE_FORMATS = {
+    'uint16': 'H',
+    'int16': 'h',
+    'uint32': 'I',
+    'int32': 'i',
+    'float32': 'f',
+}
+
+INTEGER_TYPES = ('uint16', 'int16', 'uint32', 'int32')
+
+# 批量编码的 numpy 大端类型
+ARRAY_DTYPES = {
+    'uint16': '>u2',
+    'int16': '>i2',
+    'uint32': '>u4',
+    'int32': '>i4',
+    'float32': '>f4',
+}
+FLOAT32_MAX = 3.4028234663852886e38
+
+
+def register_type(reg_info: Dict[str, Any]) -> str:
+    """获取寄存器的数据类型, 未声明时按长度推断"""
+    reg_type = reg_info.get('type')
+    if reg_type in TYPE_FORMATS:
+        return reg_type
+    return 'uint32' if reg_info.get('length', 1) == 2 else 'uint16'
+
+
+def compile_encoder(reg_info: Dict[str, Any]) -> Callable[[Any], bytes]:
+    """
+    为寄存器生成编码函数 (工程值 -> 大端寄存器数据)
+    类型、缩放和打包格式在生成时确定, 适合同一寄存器的反复编码;
+    类型和缩放相同的寄存器共用同一个编码函数
+    """
+    return _encoder(register_type(reg_info), float(reg_info.get('scale') or 1))
+
+
+@lru_cache(maxsize=None)
+def _encoder(reg_type: str, scale: float) -> Callable[[Any], bytes]:
+    pack = struct.Struct('>' + TYPE_FORMATS[reg_type]).pack
+
+    if reg_type not in INTEGER_TYPES:
+        return lambda value: pack(float(value) / scale)
+    if reg_type.startswith('u'):
+        mask = 0xFFFFFFFF if reg_type == 'uint32' else 0xFFFF
+        return lambda value: pack(int(round(float(value) / scale)) & mask)
+    return lambda value: pack(int(round(float(value) / scale)))
+
+
+def encode_array(values, reg_type: str, scale: float):
+    """
+    批量编码 (需要numpy), 结果与逐个调用 compile_encoder 的编码函数相同
+    Args:
+        values: 工程值 (已应用读转换) 的 float64 数组
+    Returns:
+        tuple: (大端寄存器数据, 形状为 (n, 字节数) 的 uint8 数组;
+                有效标志, 逐个编码会失败的值 (NaN、溢出) 为 False)
+    """
+    dtype = np.dtype(ARRAY_DTYPES[reg_type])
+    scaled = values / scale
+    if reg_type not in INTEGER_TYPES:
+        valid = ~(np.abs(scaled) > FLOAT32_MAX)
+        encoded = scaled.astype(dtype)
+    else:
+        rounded = np.round(scaled)
+        valid = np.isfinite(rounded)
+        if reg_type.startswith('u'):
+            # 与逐个编码相同, 按位宽截断
+            valid &= np.abs(rounded) < 2.0 ** 63
+            mask = 0xFFFFFFFF if reg_type == 'uint32' else 0xFFFF
+            raw = np.where(valid, rounded, 0.0).astype(np.int64) & mask
+        else:
+            info = np.iinfo(dtype)
+            valid &= (rounded >= info.min) & (rounded <= info.max)
+            raw = np.where(valid, rounded, 0.0).astype(np.int64)
+        encoded = raw.astype(dtype)
+    return encoded.view(np.uint8).reshape(len(values), dtype.itemsize), valid
+
+
+def encode_bytes(value: Any, reg_info: Dict[str, Any]) -> bytes:
+    """
+    将工程值编码为寄存器数据 (大端字节, 每个寄存器2字节)
+    Args:
+        value: 工程值 (已应用读转换)
+        reg_info: 协议文件中的寄存器定义
+    """
+    return compile_encoder(reg_info)(value)
+
+
+def encode_value(value: Any, reg_info: Dict[str, Any]) -> Tuple[int, ...]:
+    """
+    将工程值编码为寄存器字
+    Returns:
+        tuple: 16位寄存器值, 按地址顺序排列
+    """
+    data = encode_bytes(value, reg_info)
+    return struct.unpack('>%dH' % (len(data) // 2), data)
+
+
+def decode_bytes(data: bytes, reg_info: Dict[str, Any]) -> Any:
+    """将大端寄存器数据解码为工程值 (原始值乘以 scale)"""
+    raw = struct.unpack('>' + TYPE_FORMATS[register_type(reg_info)], data)[0]
+    scale = reg_info.get('scale')
+    return raw * scale if scale else raw
+
+
+def decode_words(words: Sequence[int], reg_info: Dict[str, Any]) -> Any:
+    """将寄存器字解码为工程值 (原始值乘以 scale)"""
+    return decode_bytes(struct.pack('>%dH' % len(words), *words), reg_info)
@@ -0,0 +1,87 @@
+import struct
+
+try:
+    import numpy as np
+except ImportError:  # numpy 为可选依赖, 只用于批量写入
+    np = None
+
+
+class RegisterImage:
+    """
+    连续的16位寄存器映像
+
+    以 bytearray 按大端字节序保存 [start, start+count) 范围内的寄存器,
+    即 Modbus 报文中的寄存器数据格式。读请求直接切取 memoryview, 不需要
+    逐个寄存器打包; 变量变化时只把编码好的字节写入对应位置一次。
+    协议中未定义的地址同样占位 (值为0), 是否允许访问由调用方判断。
+    """
+
+    def __init__(self, start: int = 0, count: int = 0):
+        self.start = start
+        self.count = count
+        self._data = bytearray(count * 2)
+        self._view = memoryview(self._data)
+        self._array = np.frombuffer(self._data, dtype=np.uint8) if np is not None else None
+
+    @classmethod
+    def from_protocol(cls, protocol_map) -> 'RegisterImage':
+        """按协议中最低到最高的寄存器地址建立映像"""
+        if not protocol_map or not protocol_map.entries:
+            return cls()
+        start = protocol_map.entries[0].address
+        end = max(entry.end for entry in protocol_map.entries)
+        return cls(start, end - start)
+
+    @property
+    def end(self) -> int:
+        return self.start + self.count
+
+    def __len__(self) -> int:
+        return self.count
+
+    def contains(self, address: int, count: int = 1) -> bool:
+        return self.start <= address and address + count <= self.end
+
+    def _offset(self, address: int, count: int) -> int:
+        if not self.contains(address, count):
+            raise IndexError(f"Registers 0x{address:04X}+{count} outside image")
+        return (address - self.start) * 2
+
+    def view(self, address: int, count: int) -> memoryview:
+        """返回寄存器数据的只读视图 (不复制), 调用方需在映像更新前使用完毕"""
+        offset = self._offset(address, count)
+        return self._view[offset:offset + count * 2].toreadonly()
+
+    def read_bytes(self, address: int, count: int) -> bytes:
+        """复制寄存器数据"""
+        offset = self._offset(address, count)
+        return bytes(self._data[offset:offset + count * 2])
+
+    def write_bytes(self, address: int, data: bytes):
+        """写入大端寄存器数据"""
+        offset = self._offset(address, len(data) // 2)
+        self._data[offset:offset + len(data)] = data
+
+    def write_batch(self, items):
+        """批量写入 [(地址, 数据)], 地址由调用方保证在映像范围内"""
+        data, start = self._data, self.start
+        for address, chunk in items:
+            offset = (address - start) * 2
+            data[offset:offset + len(chunk)] = chunk
+
+    def scatter(self, index, rows):
+        """
+        批量写入 numpy 数据 (需要numpy)
+        Args:
+            index: 形状为 (n, 字节数) 的映像字节偏移, 由调用方保证在映像范围内
+            rows: 形状相同的 uint8 数据
+        """
+        self._array[index] = rows
+
+    def byte_index(self, addresses, width: int):
+        """寄存器地址数组对应的 (n, width) 字节偏移, 供 scatter 使用"""
+        offsets = (np.asarray(addresses, dtype=np.intp) - self.start) * 2
+        return offsets[:, None] + np.arange(width, dtype=np.intp)
+
+    def set_words(self, address: int, words):
+        struct.pack_into('>%dH' % len(words), self._data, self._offset(address, len(words)), *words)
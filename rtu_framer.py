@@ -0,0 +1,171 @@
+import logging
+from typing import Dict, List, Optional
+from function_codes import FUNCTION_DECODERS
+
+logger = logging.getLogger(__name__)
+
+# Modbus RTU 帧长度限制
+MIN_FRAME_SIZE = 4      # 地址 + 功能码 + CRC
+MAX_FRAME_SIZE = 256
+
+# 波特率高于19200时规范规定使用固定的间隔时间
+FIXED_T15 = 0.000750
+FIXED_T35 = 0.001750
+
+
+def char_time(baudrate: int, bytesize: int = 8, parity: str = 'N',
+              stopbits: float = 1) -> float:
+    """计算传输单个字符所需的时间(秒)"""
+    bits = 1 + bytesize + (0 if parity == 'N' else 1) + stopbits
+    return bits / float(baudrate)
+
+
+def silent_intervals(baudrate: int, bytesize: int = 8, parity: str = 'N',
+                     stopbits: float = 1):
+    """
+    计算 t1.5 (字符间超时) 和 t3.5 (帧间静默) 时间
+    Returns:
+        tuple: (t15, t35) 单位为秒
+    """
+    if baudrate > 19200:
+        return FIXED_T15, FIXED_T35
+    t_char = char_time(baudrate, bytesize, parity, stopbits)
+    return 1.5 * t_char, 3.5 * t_char
+
+
+class RTUFramer:
+    """
+    Modbus RTU 帧重组器
+
+    以 3.5 字符静默时间作为帧边界, 将串口读到的零散数据重新组装成完整帧。
+    帧内出现大于 1.5 字符的间隔时计入 frames_split, 长度不合法的帧被丢弃并
+    计入 frames_dropped。
+
+    use_length_rules 为True时, 已知功能码的帧按其长度规则和CRC直接切分,
+    不必等待静默时间; 粘在一起的连续帧也能被拆开 (计入 frames_by_length)。
+    未知功能码或规则不匹配时仍以 t3.5 为准。
+    """
+
+    def __init__(self, baudrate: int = 9600, bytesize: int = 8,
+                 parity: str = 'N', stopbits: float = 1,
+                 use_length_rules: bool = True):
+        self.t15, self.t35 = silent_intervals(baudrate, bytesize, parity, stopbits)
+        self._buffer = bytearray()
+        self._last_rx: Optional[float] = None
+        self._gap_seen = False
+        self.use_length_rules = use_length_rules
+
+        self.frames_received = 0
+        self.frames_by_length = 0
+        self.frames_dropped = 0
+        self.frames_split = 0
+        self.bytes_received = 0
+
+    @classmethod
+    def from_serial(cls, serial_port):
+        """根据已配置的串口参数创建帧重组器"""
+        return cls(
+            baudrate=serial_port.baudrate,
+            bytesize=serial_port.bytesize,
+            parity=serial_port.parity,
+            stopbits=serial_port.stopbits
+        )
+
+    @property
+    def pending(self) -> bool:
+        """缓冲区中是否有未完成的帧"""
+        return bool(self._buffer)
+
+    @property
+    def deadline(self) -> Optional[float]:
+        """当前帧的静默截止时刻, 缓冲区为空时返回 None"""
+        if not self._buffer:
+            return None
+        return self._last_rx + self.t35
+
+    def feed(self, data: bytes, now: float) -> List[bytes]:
+        """
+        送入一段接收到的数据
+        Args:
+            data: 本次读到的字节
+            now: 读取时刻 (time.perf_counter())
+        Returns:
+            list: 本次数据到达前已经结束的完整帧
+        """
+        frames = []
+        if self._buffer and self._last_rx is not None:
+            gap = now - self._last_rx
+            if gap >= self.t35:
+                frames.extend(self._complete())
+            elif gap > self.t15:
+                self._gap_seen = True
+
+        self._buffer.extend(data)
+        self.bytes_received += len(data)
+        self._last_rx = now
+        if self.use_length_rules:
+            frames.extend(self._split_by_length())
+        return frames
+
+    def _split_by_length(self) -> List[bytes]:
+        """按功能码长度规则从缓冲区开头切出CRC正确的完整帧"""
+        frames = []
+        buffer = self._buffer
+        while len(buffer) >= MIN_FRAME_SIZE:
+            decoder = FUNCTION_DECODERS[buffer[1]]
+            if decoder is None:
+                break
+            length = decoder.frame_length(buffer)
+            if not length:
+                break
+            frames.append(bytes(buffer[:length]))
+            del buffer[:length]
+            if self._gap_seen:
+                self.frames_split += 1
+                self._gap_seen = False
+            self.frames_received += 1
+            self.frames_by_length += 1
+        return frames
+
+    def poll(self, now: float) -> List[bytes]:
+        """检查静默时间是否已到, 到达则返回缓冲区中的完整帧"""
+        if self._buffer and now - self._last_rx >= self.t35:
+            return self._complete()
+        return []
+
+    def flush(self) -> List[bytes]:
+        """不论静默时间, 立即结束当前帧 (关闭串口时使用)"""
+        if self._buffer:
+            return self._complete()
+        return []
+
+    def reset(self):
+        """清空缓冲区, 保留统计计数"""
+        self._buffer.clear()
+        self._last_rx = None
+        self._gap_seen = False
+
+    def _complete(self) -> List[bytes]:
+        frame = bytes(self._buffer)
+        gap_seen = self._gap_seen
+        self.reset()
+
+        if len(frame) < MIN_FRAME_SIZE or len(frame) > MAX_FRAME_SIZE:
+            self.frames_dropped += 1
+            logger.debug(f"Dropped RTU frame with invalid length {len(frame)}")
+            return []
+
+        if gap_seen:
+            self.frames_split += 1
+        self.frames_received += 1
+        return [frame]
+
+    def get_stats(self) -> Dict[str, int]:
+        """获取帧统计信息"""
+        return {
+            'frames_received': self.frames_received,
+            'frames_dropped': self.frames_dropped,
+            'frames_split': self.frames_split,
+            'frames_by_length': self.frames_by_length,
+            'bytes_received': self.bytes_received
+        }
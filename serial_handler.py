@@ -1,50 +1,30 @@
-import serial
 import logging
-from PyQt5.QtCore import QThread, pyqtSignal
 from serial.serialutil import SerialException
+from serial_reader import READ_MODE_BLOCKING
+from port_manager import PortWorker, open_port
 
 logger = logging.getLogger(__name__)
 
-class SerialMonitorThread(QThread):
-    data_received = pyqtSignal(bytes)
-    
-    def __init__(self, serial_port):
-        super().__init__()
-        self.serial_port = serial_port
-        self.running = False
-        
-    def run(self):
-        self.running = True
-        while self.running and self.serial_port.is_open:
-            try:
-                if self.serial_port.in_waiting:
-                    data = self.serial_port.read(self.serial_port.in_waiting)
-                    if data:
-                        self.data_received.emit(data)
-            except Exception as e:
-                logger.error(f"Serial monitoring error: {e}")
-            self.msleep(10)
-            
-    def stop(self):
-        self.running = False
-
 class SerialHandler:
-    def __init__(self):
+    """
+    单串口的打开和关闭, 不依赖Qt
+    读取线程为 PortWorker, 收发的帧通过 on_frame(端口名, 数据, 方向) 回调交给调用方
+    """
+
+    def __init__(self, responder=None, on_frame=None, read_mode=READ_MODE_BLOCKING):
         self.serial_port = None
         self.serial_monitor = None
+        self.responder = responder
+        self.on_frame = on_frame
+        self.read_mode = read_mode
         
-    def open_port(self, port, baud_rate):
+    def open_port(self, port, baud_rate, **settings):
         try:
-            self.serial_port = serial.Serial(
-                port=port,
-                baudrate=baud_rate,
-                bytesize=serial.EIGHTBITS,
-                parity=serial.PARITY_NONE,
-                stopbits=serial.STOPBITS_ONE,
-                timeout=1
-            )
-            
-            self.serial_monitor = SerialMonitorThread(self.serial_port)
+            echo_suppression = bool(settings.pop("echo_suppression", False))
+            self.serial_port = open_port(dict(settings, port=port, baudrate=baud_rate))
+            self.serial_monitor = PortWorker(port, self.serial_port, self.responder,
+                                             self.read_mode, self.on_frame, echo_suppression)
+            self.serial_monitor.start()
             return True
             
         except SerialException as e:
@@ -55,13 +35,14 @@ class SerialHandler:
         try:
             if self.serial_monitor:
                 self.serial_monitor.stop()
-                self.serial_monitor.wait()
+                logger.info(f"Serial port stats: {self.serial_monitor.get_stats()}")
+                self.serial_monitor = None
                 
             if self.serial_port and self.serial_port.is_open:
                 self.serial_port.close()
-                self.serial_port = None
-                return True
+            self.serial_port = None
+            return True
                 
         except Exception as e:
             logger.error(f"Error closing serial port: {e}")
-            return False 
\ No newline at end of file
+            return False
@@ -0,0 +1,42 @@
+import logging
+from PyQt5.QtCore import QThread, pyqtSignal
+from serial_reader import SerialReader, READ_MODE_BLOCKING
+
+logger = logging.getLogger(__name__)
+
+class SerialMonitorThread(QThread):
+    data_received = pyqtSignal(bytes)
+    data_sent = pyqtSignal(bytes)
+    
+    def __init__(self, serial_port, read_mode=READ_MODE_BLOCKING, responder=None,
+                 echo_suppression=False):
+        super().__init__()
+        self.serial_port = serial_port
+        self.running = False
+        self.reader = SerialReader(serial_port, read_mode, responder=responder,
+                                   echo_suppression=echo_suppression)
+        self.reader.on_sent = self._emit_sent
+        self.framer = self.reader.framer
+        
+    def _emit_sent(self, data):
+        # 应答引擎返回 memoryview, 信号参数为 bytes
+        self.data_sent.emit(bytes(data))
+
+    def run(self):
+        self.running = True
+        while self.running and self.serial_port.is_open:
+            try:
+                for frame in self.reader.read_frames():
+                    self.data_received.emit(frame)
+            except Exception as e:
+                logger.error(f"Serial monitoring error: {e}")
+                self.msleep(10)  # 出错时短暂休眠避免空转
+            
+        for frame in self.reader.flush():
+            self.data_received.emit(frame)
+        logger.info(f"RTU framer stats: {self.framer.get_stats()}")
+        if self.reader.responder is not None:
+            logger.info(f"Responder stats: {self.reader.responder.get_stats()}")
+            
+    def stop(self):
+        self.running = False
@@ -0,0 +1,184 @@
+import os
+import time
+import select
+import logging
+from typing import List, Tuple
+from metrics import FRAMES_RECEIVED, FRAMES_SENT, TURNAROUND
+from rtu_framer import RTUFramer, char_time
+
+logger = logging.getLogger(__name__)
+
+READ_MODE_POLL = 'poll'
+READ_MODE_BLOCKING = 'blocking'
+READ_MODES = (READ_MODE_POLL, READ_MODE_BLOCKING)
+
+DIRECTION_RX = 'RX'
+DIRECTION_TX = 'TX'
+
+
+class SerialReader:
+    """
+    串口读取循环 (不依赖Qt)
+
+    poll 模式: 查询 in_waiting 后休眠 poll_interval, 兼容所有串口实现。
+    blocking 模式: POSIX 下对串口文件描述符 select, 其他平台使用 pyserial
+    的超时读取; 有未完成帧时等待到 t3.5 截止时刻 (超时读取固定为 t3.5), 空闲时每 IDLE_TIMEOUT
+    唤醒一次以便检查停止标志。
+
+    echo_suppression: 用于会把发送数据回环到接收端的半双工RS485适配器。开启后
+    每次应答写出后, 只丢弃随后在 (发送时间 + t3.5) 内到达的前 len(响应) 个
+    字节, 不与之后的帧比较内容, 主站重复发送与响应相同的请求 (如FC06) 时
+    仍会应答。
+    """
+
+    IDLE_TIMEOUT = 0.1
+
+    def __init__(self, serial_port, read_mode: str = READ_MODE_BLOCKING,
+                 poll_interval: float = None, responder=None, echo_suppression: bool = False):
+        if read_mode not in READ_MODES:
+            raise ValueError(f"Unknown read mode: {read_mode}")
+
+        self.serial_port = serial_port
+        self.read_mode = read_mode
+        self.framer = RTUFramer.from_serial(serial_port)
+        # 轮询间隔默认取 t1.5, 保证高波特率下连续帧之间的静默时间能被分辨
+        self.poll_interval = poll_interval if poll_interval is not None else self.framer.t15
+
+        self._fd = self._get_fd() if read_mode == READ_MODE_BLOCKING else None
+        self._saved_timeout = serial_port.timeout
+        self._current_timeout = None
+
+        # 从站应答引擎, 在读取线程上直接应答以保证应答时间
+        self.responder = responder
+        self.on_sent = None
+
+        self.echo_suppression = echo_suppression
+        self._char_time = char_time(serial_port.baudrate, serial_port.bytesize,
+                                    serial_port.parity, serial_port.stopbits)
+        self._echo_remaining = 0
+        self._echo_deadline = 0.0
+        self.echo_bytes = 0
+
+        # 指标在初始化时按端口取得, 读取循环中只做自增
+        port_name = getattr(serial_port, 'port', None) or 'serial'
+        self._frames_received = FRAMES_RECEIVED.labels(port_name)
+        self._frames_sent = FRAMES_SENT.labels(port_name)
+        self._turnaround = TURNAROUND.labels(port_name)
+
+    def _get_fd(self):
+        """获取可用于select的文件描述符, 不支持时返回None"""
+        if os.name != 'posix':
+            return None
+        try:
+            return self.serial_port.fileno()
+        except Exception:
+            return None
+
+    def _wait_timeout(self, now: float) -> float:
+        deadline = self.framer.deadline
+        if deadline is None:
+            return self.IDLE_TIMEOUT
+        return max(deadline - now, 0.0)
+
+    def read_frames(self) -> List[bytes]:
+        """
+        等待数据并返回已完成的帧, 最长阻塞约 IDLE_TIMEOUT
+        Returns:
+            list: 完整的RTU帧, 可能为空
+        """
+        if self.read_mode == READ_MODE_POLL:
+            frames, completed_at = self._read_poll()
+        elif self._fd is not None:
+            frames, completed_at = self._read_select()
+        else:
+            frames, completed_at = self._read_timeout()
+
+        if frames:
+            self._frames_received.inc(len(frames))
+            if self.responder is not None:
+                self._respond(frames, completed_at)
+        return frames
+
+    def _respond(self, frames: List[bytes], completed_at: float):
+        """
+        应答已完成的帧
+        应答耗时从帧检测器判定帧完成的时刻 (读取循环中的 now) 计起, 包括帧检测
+        的静默等待之后的排队时间, 到响应写入串口为止
+        """
+        for frame in frames:
+            response = self.responder.handle_frame(frame)
+            if response is None:
+                continue
+            self.serial_port.write(response)
+            elapsed = time.perf_counter() - completed_at
+            self.responder.turnaround.record(elapsed)
+            self._turnaround.observe(elapsed)
+            self._frames_sent.inc()
+            if self.echo_suppression:
+                # 回显在发送期间陆续到达, 截止时刻为发送完成后再等 t3.5
+                self._echo_remaining = len(response)
+                self._echo_deadline = (time.perf_counter() + len(response) * self._char_time
+                                       + self.framer.t35)
+            if self.on_sent:
+                self.on_sent(response)
+
+    def _read_poll(self) -> Tuple[List[bytes], float]:
+        waiting = self.serial_port.in_waiting
+        now = time.perf_counter()
+        if waiting:
+            frames = self._feed(self.serial_port.read(waiting), now)
+        else:
+            frames = self.framer.poll(now)
+        # 有完整帧时立即返回, 不让休眠推迟应答
+        if not frames:
+            time.sleep(self.poll_interval)
+        return frames, now
+
+    def _read_select(self) -> Tuple[List[bytes], float]:
+        timeout = self._wait_timeout(time.perf_counter())
+        readable, _, _ = select.select([self._fd], [], [], timeout)
+        now = time.perf_counter()
+        if not readable:
+            return self.framer.poll(now), now
+
+        data = self.serial_port.read(self.serial_port.in_waiting or 1)
+        return self._feed(data, now), now
+
+    def _read_timeout(self) -> Tuple[List[bytes], float]:
+        # 有未完成帧时固定等待一个 t3.5: 每个字节都会把截止时刻推迟到 t3.5 之后,
+        # 超时返回即说明帧已结束; 超时只在空闲/收帧状态切换时重新配置, 避免每次读取都调用驱动
+        timeout = self.IDLE_TIMEOUT if self.framer.deadline is None else self.framer.t35
+        if timeout != self._current_timeout:
+            self.serial_port.timeout = timeout
+            self._current_timeout = timeout
+
+        data = self.serial_port.read(1)
+        now = time.perf_counter()
+        if not data:
+            return self.framer.poll(now), now
+
+        waiting = self.serial_port.in_waiting
+        if waiting:
+            data += self.serial_port.read(waiting)
+        return self._feed(data, now), now
+
+    def _feed(self, data: bytes, now: float) -> List[bytes]:
+        """把读到的数据交给帧检测器, 先去掉应答的回显"""
+        if self._echo_remaining:
+            if now > self._echo_deadline:
+                self._echo_remaining = 0
+            else:
+                skip = min(self._echo_remaining, len(data))
+                self._echo_remaining -= skip
+                self.echo_bytes += skip
+                data = data[skip:]
+                if not data:
+                    return self.framer.poll(now)
+        return self.framer.feed(data, now)
+
+    def flush(self) -> List[bytes]:
+        """结束读取, 返回缓冲区中剩余的帧并恢复串口超时设置"""
+        if self._current_timeout is not None and self.serial_port.is_open:
+            self.serial_port.timeout = self._saved_timeout
+            self._current_timeout = None
+        return self.framer.flush()
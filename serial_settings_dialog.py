@@ -1,34 +1,11 @@
 from PyQt5.QtWidgets import (QDialog, QVBoxLayout, QHBoxLayout, QComboBox, 
                             QLabel, QPushButton, QGroupBox, QGridLayout,
                             QMessageBox, QSpinBox)
-from PyQt5.QtCore import Qt, QThread, pyqtSignal
+from PyQt5.QtCore import Qt
 import serial
 import serial.tools.list_ports
 from serial.serialutil import SerialException
-
-# 添加SerialMonitorThread类定义
-class SerialMonitorThread(QThread):
-    data_received = pyqtSignal(bytes)
-    
-    def __init__(self, serial_port):
-        super().__init__()
-        self.serial_port = serial_port
-        self.running = False
-        
-    def run(self):
-        self.running = True
-        while self.running and self.serial_port.is_open:
-            try:
-                if self.serial_port.in_waiting:
-                    data = self.serial_port.read(self.serial_port.in_waiting)
-                    if data:
-                        self.data_received.emit(data)
-            except Exception as e:
-                print(f"Serial monitoring error: {e}")
-            self.msleep(10)  # 短暂休眠避免CPU占用过高
-            
-    def stop(self):
-        self.running = False
+from serial_monitor import SerialMonitorThread
 
 # 添加 PortComboBox 类定义
 class PortComboBox(QComboBox):
@@ -153,8 +130,12 @@ class SerialSettingsDialog(QDialog):
                 )
                 
                 # 创建并启动串口监听线程
-                self.parent.serial_monitor = SerialMonitorThread(self.parent.serial_port)
-                self.parent.serial_monitor.data_received.connect(self.parent.handle_received_data)
+                echo_suppression = self.parent.config_manager.get(
+                    "serial_settings", {}).get("echo_suppression", False)
+                self.parent.serial_monitor = SerialMonitorThread(
+                    self.parent.serial_port, responder=self.parent.bus_responder,
+                    echo_suppression=echo_suppression)
+                self.parent.attach_serial_monitor(self.parent.serial_monitor)
                 self.parent.serial_monitor.start()
                 
                 # 更新按钮状态
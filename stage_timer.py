@@ -0,0 +1,86 @@
+import threading
+from array import array
+from typing import Dict, List, Sequence
+
+# 接收流水线的阶段
+STAGE_QUEUE = 'queue'      # 读取线程提交到解码线程取出
+STAGE_HEX = 'hex'          # 十六进制格式化
+STAGE_PARSE = 'parse'      # ModbusParser.parse_message
+STAGE_FORMAT = 'format'    # ModbusParser.format_parse_result
+STAGE_ENTRY = 'entry'      # 生成带时间戳的日志条目
+STAGE_APPEND = 'append'    # 日志窗口追加 (按条目平均)
+STAGE_LOG = 'log'          # 无界面模式写日志
+
+GUI_STAGES = (STAGE_QUEUE, STAGE_HEX, STAGE_PARSE, STAGE_FORMAT, STAGE_ENTRY, STAGE_APPEND)
+HEADLESS_STAGES = (STAGE_HEX, STAGE_PARSE, STAGE_FORMAT, STAGE_LOG)
+
+
+class StageTimer:
+    """
+    分阶段耗时记录
+
+    每个阶段一个预分配的环形缓冲区 (array('q'), 单位纳秒), 记录时只写入
+    一个槽位, 不分配内存。调用方在启用时切换到带计时的处理函数, 未启用时
+    使用原来的处理函数, 因此关闭时没有任何额外开销。
+
+    各阶段由各自的线程写入 (解码线程、GUI线程), 同一阶段只有一个写入者;
+    汇总时复制缓冲区, 最近 capacity 个样本之外的数据被覆盖。
+    """
+
+    def __init__(self, stages: Sequence[str], capacity: int = 4096):
+        self.stages = tuple(stages)
+        self.capacity = capacity
+        self._buffers = [array('q', bytes(8 * capacity)) for _ in self.stages]
+        self._counts = [0] * len(self.stages)
+        self._lock = threading.Lock()
+
+    def index(self, stage: str) -> int:
+        """阶段在记录数组中的下标, 调用方在启用时取得并保存"""
+        return self.stages.index(stage)
+
+    def record(self, index: int, ns: int):
+        count = self._counts[index]
+        self._buffers[index][count % self.capacity] = ns
+        self._counts[index] = count + 1
+
+    def reset(self):
+        with self._lock:
+            for index in range(len(self._counts)):
+                self._counts[index] = 0
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        """
+        各阶段最近样本的统计, 耗时单位微秒
+        share_pct 为该阶段平均耗时占全部阶段平均耗时之和的比例
+        """
+        with self._lock:
+            samples = []
+            for buffer, count in zip(self._buffers, self._counts):
+                samples.append((count, sorted(buffer[:min(count, self.capacity)])))
+
+        means = [sum(values) / len(values) if values else 0.0 for _, values in samples]
+        total = sum(means)
+        result = {}
+        for stage, (count, values), mean in zip(self.stages, samples, means):
+            if not values:
+                result[stage] = {'count': count, 'mean_us': 0.0, 'p50_us': 0.0,
+                                 'p99_us': 0.0, 'max_us': 0.0, 'share_pct': 0.0}
+                continue
+            result[stage] = {
+                'count': count,
+                'mean_us': mean / 1000.0,
+                'p50_us': values[len(values) // 2] / 1000.0,
+                'p99_us': values[min(int(len(values) * 0.99), len(values) - 1)] / 1000.0,
+                'max_us': values[-1] / 1000.0,
+                'share_pct': mean / total * 100.0 if total else 0.0,
+            }
+        return result
+
+    def format_summary(self) -> List[str]:
+        """按行输出的统计表, 用于日志窗口和命令行"""
+        lines = [f"{'stage':<8} {'count':>8} {'mean us':>9} {'p50 us':>9} {'p99 us':>9} "
+                 f"{'max us':>9} {'share':>7}"]
+        for stage, s in self.summary().items():
+            lines.append(f"{stage:<8} {s['count']:>8} {s['mean_us']:>9.1f} {s['p50_us']:>9.1f} "
+                         f"{s['p99_us']:>9.1f} {s['max_us']:>9.1f} {s['share_pct']:>6.1f}%")
+        return lines
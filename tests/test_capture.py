@@ -0,0 +1,141 @@
+import os
+import time
+
+import pytest
+
+import capture
+from capture import FILE_HEADER, MAX_PORTS, CaptureWriter, read_capture
+from serial_reader import DIRECTION_RX, DIRECTION_TX
+
+REQUEST = bytes.fromhex('010300000002C40B')
+RESPONSE = bytes.fromhex('0103040001000200' + '2A32')
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / 'captures' / 'modbus.cap')
+
+
+def _read_all(path):
+    """按轮转顺序 (编号大的更早) 读回全部文件"""
+    directory, name = os.path.split(path)
+    backups = sorted((f for f in os.listdir(directory) if f != name),
+                     key=lambda f: -int(f.rsplit('.', 1)[1]))
+    return [record for f in backups + [name] for record in read_capture(os.path.join(directory, f))]
+
+
+def test_round_trip(path):
+    writer = CaptureWriter(path)
+    writer.open()
+    before = time.time_ns()
+    writer.write('COM3', REQUEST, DIRECTION_RX)
+    writer.write('COM3', memoryview(RESPONSE), DIRECTION_TX)
+    writer.write('/dev/ttyUSB0', REQUEST, DIRECTION_RX)
+    writer.close()
+
+    records = list(read_capture(path))
+    assert [(port, direction, data) for _, port, direction, data in records] == [
+        ('COM3', DIRECTION_RX, REQUEST),
+        ('COM3', DIRECTION_TX, RESPONSE),
+        ('/dev/ttyUSB0', DIRECTION_RX, REQUEST),
+    ]
+    timestamps = [timestamp for timestamp, _, _, _ in records]
+    assert timestamps == sorted(timestamps)
+    assert abs(timestamps[0] - before) < 5_000_000_000
+    assert writer.get_stats() == {'frames': 3, 'bytes_written': 3 * 12 + 2 * len(REQUEST) + len(RESPONSE),
+                                  'rotations': 0, 'dropped': 0}
+
+
+def test_write_after_close_dropped(path):
+    writer = CaptureWriter(path)
+    writer.open()
+    writer.close()
+    writer.write('COM3', REQUEST, DIRECTION_RX)
+    assert writer.dropped == 1
+    assert list(read_capture(path)) == []
+
+
+def test_existing_file_rotated_on_open(path):
+    for _ in range(2):
+        writer = CaptureWriter(path, backup_count=2)
+        writer.open()
+        writer.write('COM3', REQUEST, DIRECTION_RX)
+        writer.close()
+    assert sorted(os.listdir(os.path.dirname(path))) == ['modbus.cap', 'modbus.cap.1']
+    assert len(_read_all(path)) == 2
+
+
+def test_rotation_by_size(path):
+    writer = CaptureWriter(path, max_bytes=200, backup_count=100)
+    writer.open()
+    frames = [bytes([1, 3, i]) + REQUEST[3:] for i in range(50)]
+    for frame in frames:
+        writer.write('COM3', frame, DIRECTION_RX)
+    writer.close()
+
+    assert writer.rotations > 0
+    assert len(os.listdir(os.path.dirname(path))) == writer.rotations + 1
+    # 每个文件重新声明端口
+    assert [(port, data) for _, port, _, data in _read_all(path)] == [('COM3', f) for f in frames]
+
+
+def test_backup_count_limits_files(path):
+    writer = CaptureWriter(path, max_bytes=100, backup_count=2)
+    writer.open()
+    for _ in range(50):
+        writer.write('COM3', REQUEST, DIRECTION_RX)
+    writer.close()
+    assert sorted(os.listdir(os.path.dirname(path))) == ['modbus.cap', 'modbus.cap.1', 'modbus.cap.2']
+
+
+def test_port_ids_exhausted_rotates(path):
+    writer = CaptureWriter(path, backup_count=5)
+    writer.open()
+    ports = [f'COM{i}' for i in range(MAX_PORTS + 10)]
+    for port in ports:
+        writer.write(port, REQUEST, DIRECTION_RX)
+    writer.close()
+
+    assert writer.rotations == 1
+    assert [port for _, port, _, _ in _read_all(path)] == ports
+
+
+def test_timer_flushes_idle_writer(path, monkeypatch):
+    monkeypatch.setattr(capture, 'FLUSH_INTERVAL', 0.05)
+    writer = CaptureWriter(path)
+    writer.open()
+    try:
+        writer.write('COM3', REQUEST, DIRECTION_RX)
+        deadline = time.monotonic() + 5
+        while not list(read_capture(path)) and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert [data for _, _, _, data in read_capture(path)] == [REQUEST]
+    finally:
+        writer.close()
+
+
+def test_oversized_frame_dropped(path):
+    writer = CaptureWriter(path)
+    writer.open()
+    writer.write('COM3', bytes(0x10000), DIRECTION_RX)
+    writer.close()
+    assert writer.dropped == 1
+    assert list(read_capture(path)) == []
+
+
+def test_truncated_record_ignored(path):
+    writer = CaptureWriter(path)
+    writer.open()
+    writer.write('COM3', REQUEST, DIRECTION_RX)
+    writer.write('COM3', RESPONSE, DIRECTION_TX)
+    writer.close()
+    with open(path, 'r+b') as f:
+        f.truncate(os.path.getsize(path) - 3)
+    assert [data for _, _, _, data in read_capture(path)] == [REQUEST]
+
+
+def test_not_a_capture_file(tmp_path):
+    path = tmp_path / 'other.bin'
+    path.write_bytes(b'XXXX' + bytes(FILE_HEADER.size - 4))
+    with pytest.raises(ValueError):
+        list(read_capture(str(path)))
@@ -0,0 +1,72 @@
+import pytest
+
+from conversion import ConversionError, compile_conversion, is_vectorizable
+
+
+@pytest.mark.parametrize('expression, value, expected', [
+    ('value', 7, 7),
+    ('value * 1000', 1.5, 1500),
+    ('value / 10 + 2', 30, 5),
+    ('-value ** 2', 3, -9),
+    ('value & 0xFF', 0x1234, 0x34),
+    ('value >> 8', 0x1234, 0x12),
+    ('round(value * 10)', 1.26, 13),
+    ('max(0, min(100, value))', 150, 100),
+    ('1 if value > 0 else 0', -2, 0),
+    ('abs(int(value))', -3.7, 3),
+])
+def test_allowed_expressions(expression, value, expected):
+    assert compile_conversion(expression)(value) == expected
+
+
+@pytest.mark.parametrize('expression', [
+    '__import__("os").system("true")',
+    'open("/etc/passwd")',
+    'value.__class__',
+    '[value]',
+    'lambda: value',
+    'other * 2',
+    '"text"',
+    'max(value, key=abs)',
+    'value; value',
+    'value +',
+])
+def test_rejected_expressions(expression):
+    with pytest.raises(ConversionError):
+        compile_conversion(expression)
+
+
+def test_no_builtins_available():
+    # 白名单之外的内置函数即使通过名称检查也无法访问
+    assert compile_conversion('max(value, 1)')(0) == 1
+    with pytest.raises(ConversionError):
+        compile_conversion('len(value)')
+
+
+def test_compiled_once():
+    assert compile_conversion('value * 3') is compile_conversion('value * 3')
+
+
+def test_trailing_comment():
+    # 编译的是校验过的语法树, 注释不会吞掉拼接的括号而引发 SyntaxError
+    assert compile_conversion('value * 2  # 放大两倍')(3) == 6
+    assert compile_conversion('value * 2  # 放大两倍') is not compile_conversion('value * 2')
+
+
+def test_compile_errors_are_conversion_errors():
+    for expression in ('(value', 'value )  # (', 'value # )\n)'):
+        with pytest.raises(ConversionError):
+            compile_conversion(expression)
+
+
+@pytest.mark.parametrize('expression, expected', [
+    ('value', True),
+    ('value * 1000 - 5', True),
+    ('-value / 3', True),
+    ('round(value)', False),
+    ('value & 0xFF', False),
+    ('1 if value else 0', False),
+    ('value >', False),
+])
+def test_is_vectorizable(expression, expected):
+    assert is_vectorizable(expression) is expected
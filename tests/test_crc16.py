@@ -0,0 +1,59 @@
+import random
+
+import pytest
+
+import crc16
+from crc16 import append_crc, check_crc, check_crc_batch, crc16 as compute_crc, crc16_bytes, write_crc
+
+
+def _random_frames(count, seed=0):
+    rng = random.Random(seed)
+    frames = []
+    for _ in range(count):
+        payload = bytes(rng.randrange(256) for _ in range(rng.randint(2, 40)))
+        frame = bytearray(append_crc(payload))
+        # 约三分之一的帧翻转一位, 制造CRC错误
+        if rng.random() < 0.3:
+            frame[rng.randrange(len(frame))] ^= 1 << rng.randrange(8)
+        frames.append(bytes(frame))
+    return frames
+
+
+def test_known_vector():
+    # 01 03 00 00 00 01 的CRC为 0x0A84, 低字节在前
+    assert compute_crc(bytes.fromhex('010300000001')) == 0x0A84
+    assert crc16_bytes(bytes.fromhex('010300000001')) == b'\x84\x0a'
+    assert append_crc(bytes.fromhex('010300000001')) == bytes.fromhex('010300000001840A')
+
+
+def test_check_crc():
+    frame = bytes.fromhex('010300000001840A')
+    assert check_crc(frame)
+    assert not check_crc(frame[:-1] + b'\x0b')
+    assert not check_crc(b'\x01\x03')
+
+
+def test_batch_matches_scalar():
+    frames = _random_frames(500) + [b'', b'\x01', b'\x01\x03']
+    assert check_crc_batch(frames) == [check_crc(frame) for frame in frames]
+
+
+def test_batch_without_numpy(monkeypatch):
+    monkeypatch.setattr(crc16, 'np', None)
+    frames = _random_frames(50, seed=1)
+    assert check_crc_batch(frames) == [check_crc(frame) for frame in frames]
+
+
+@pytest.mark.skipif(crc16.np is None, reason="numpy not installed")
+def test_batch_keeps_input_order():
+    good = append_crc(b'\x01\x03\x02\x00\x01')
+    bad = good[:-1] + bytes([good[-1] ^ 0xFF])
+    short = append_crc(b'\x01\x06')
+    assert check_crc_batch([bad, short, good, bad]) == [False, True, True, False]
+
+
+def test_write_crc_in_place():
+    payload = bytes.fromhex('0103020000')
+    frame = bytearray(payload) + bytearray(2)
+    write_crc(frame)
+    assert bytes(frame) == append_crc(payload)
@@ -0,0 +1,83 @@
+import pytest
+
+from crc16 import append_crc
+from function_codes import FRAME_EXCEPTION, FRAME_REQUEST, FRAME_RESPONSE, FUNCTION_DECODERS
+from modbus_parser import ModbusParser
+
+READ_REQUEST = append_crc(bytes.fromhex('010300000002'))
+READ_RESPONSE = append_crc(bytes.fromhex('01030400010002'))
+WRITE_SINGLE = append_crc(bytes.fromhex('010600100001'))
+WRITE_MULTIPLE = append_crc(bytes.fromhex('0110001000020400010002'))
+WRITE_MULTIPLE_RESPONSE = append_crc(bytes.fromhex('011000100002'))
+EXCEPTION = append_crc(bytes.fromhex('018302'))
+# 读线圈请求和字节数为3的响应都是8字节
+READ_COILS = append_crc(bytes.fromhex('010100000018'))
+READ_COILS_RESPONSE = append_crc(bytes.fromhex('010103FF0001'))
+
+
+@pytest.mark.parametrize('frame', [READ_REQUEST, READ_RESPONSE, WRITE_SINGLE, WRITE_MULTIPLE,
+                                   WRITE_MULTIPLE_RESPONSE, EXCEPTION])
+def test_frame_length(frame):
+    decoder = FUNCTION_DECODERS[frame[1]]
+    assert decoder.frame_length(frame) == len(frame)
+    # 字节不足时等待更多数据
+    assert decoder.frame_length(frame[:-1]) == 0
+
+
+def test_frame_length_rejects_bad_crc():
+    decoder = FUNCTION_DECODERS[3]
+    assert decoder.frame_length(READ_REQUEST[:-1] + bytes([READ_REQUEST[-1] ^ 1])) is None
+
+
+def test_unknown_function_has_no_decoder():
+    assert FUNCTION_DECODERS[0x2B] is None
+    assert all(FUNCTION_DECODERS[code] is not None for code in range(0x81, 0x100))
+
+
+def test_decode_fields():
+    assert FUNCTION_DECODERS[3].decode(READ_REQUEST) == {'kind': FRAME_REQUEST, 'start': 0, 'count': 2}
+    assert FUNCTION_DECODERS[3].decode(READ_RESPONSE) == {'kind': FRAME_RESPONSE, 'byte_count': 4,
+                                                          'registers': [1, 2]}
+    assert FUNCTION_DECODERS[0x10].decode(WRITE_MULTIPLE) == {'kind': FRAME_REQUEST, 'start': 0x10, 'count': 2,
+                                                              'byte_count': 4, 'registers': [1, 2]}
+    assert FUNCTION_DECODERS[0x10].decode(WRITE_MULTIPLE_RESPONSE) == {'kind': FRAME_RESPONSE, 'start': 0x10,
+                                                                       'count': 2}
+
+
+def test_decode_exception():
+    fields = FUNCTION_DECODERS[0x83].decode(EXCEPTION, pending=True)
+    assert fields['kind'] == FRAME_EXCEPTION
+    assert fields['request_function_code'] == 3
+    assert fields['exception_code'] == 2
+
+
+def test_frame_type_same_length_uses_pending():
+    decoder = FUNCTION_DECODERS[1]
+    assert len(READ_COILS) == len(READ_COILS_RESPONSE)
+    assert decoder.frame_type(READ_COILS_RESPONSE) == FRAME_REQUEST
+    assert decoder.frame_type(READ_COILS_RESPONSE, pending=True) == FRAME_RESPONSE
+    fields = decoder.decode(READ_COILS_RESPONSE, pending=True)
+    assert fields['byte_count'] == 3
+    assert fields['bits'][:8] == [1] * 8
+    # FC06 回显与请求完全相同
+    assert FUNCTION_DECODERS[6].frame_type(WRITE_SINGLE) == FRAME_REQUEST
+    assert FUNCTION_DECODERS[6].frame_type(WRITE_SINGLE, pending=True) == FRAME_RESPONSE
+
+
+def test_frame_type_unambiguous_ignores_pending():
+    assert FUNCTION_DECODERS[3].frame_type(READ_REQUEST, pending=True) == FRAME_REQUEST
+    assert FUNCTION_DECODERS[3].frame_type(READ_RESPONSE) == FRAME_RESPONSE
+    assert FUNCTION_DECODERS[3].frame_type(READ_RESPONSE + b'\x00') is None
+
+
+def test_parser_pairs_request_and_response():
+    parser = ModbusParser()
+    parser.set_protocol({'registers': {'0x0010': {'name': 'setpoint', 'description': ''}}})
+    assert parser.parse_message(READ_COILS, port='COM1')['frame_type'] == FRAME_REQUEST
+    # 其他端口上同样的帧没有未应答的请求
+    assert parser.parse_message(READ_COILS_RESPONSE, port='COM2')['frame_type'] == FRAME_REQUEST
+    assert parser.parse_message(READ_COILS_RESPONSE, port='COM1')['frame_type'] == FRAME_RESPONSE
+    # 同一个FC06帧交替为请求和回显, 连续两次写入不会被误判
+    for _ in range(2):
+        assert parser.parse_message(WRITE_SINGLE, port='COM1')['frame_type'] == FRAME_REQUEST
+        assert parser.parse_message(WRITE_SINGLE, port='COM1')['frame_type'] == FRAME_RESPONSE
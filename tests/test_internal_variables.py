@@ -0,0 +1,61 @@
+import threading
+
+from internal_variables import InternalVariables
+
+PROTOCOL = {
+    'registers': {
+        '0x0000': {'name': '状态字', 'length': 1, 'type': 'uint16',
+                   'variable_mapping': {'name': 'status'}},
+        '0x0001': {'name': '温度', 'length': 1, 'type': 'int16', 'scale': 0.1,
+                   'variable_mapping': {'name': 'temperature'}},
+    }
+}
+
+
+class Recorder:
+    def __init__(self):
+        self.events = []
+
+    def on_variables_updated(self, names):
+        self.events.append(set(names))
+
+
+def _variables():
+    variables = InternalVariables.from_protocol(PROTOCOL, defaults=False)
+    recorder = Recorder()
+    variables.add_observer(recorder)
+    return variables, recorder
+
+
+def test_batch_merges_notifications():
+    variables, recorder = _variables()
+    with variables.batch():
+        with variables.batch():
+            variables.set_variable('status', 1)
+        variables.set_variable('temperature', 2.5)
+        assert recorder.events == []
+    assert recorder.events == [{'status', 'temperature'}]
+
+
+def test_batch_depth_is_per_thread():
+    variables, recorder = _variables()
+    entered, release = threading.Event(), threading.Event()
+
+    def batched_writer():
+        with variables.batch():
+            entered.set()
+            release.wait(1.0)
+
+    thread = threading.Thread(target=batched_writer)
+    thread.start()
+    entered.wait(1.0)
+    # 其他线程的 batch() 不推迟本线程的通知
+    variables.set_variable('status', 1)
+    assert recorder.events == [{'status'}]
+    release.set()
+    thread.join()
+    # 另一线程退出 batch() 时的 flush 不影响本线程的嵌套深度
+    with variables.batch():
+        variables.set_variable('temperature', 2.5)
+        assert recorder.events == [{'status'}]
+    assert recorder.events == [{'status'}, {'temperature'}]
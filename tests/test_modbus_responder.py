@@ -0,0 +1,216 @@
+import struct
+import time
+
+import pytest
+
+from crc16 import append_crc, check_crc
+from function_codes import (EXC_ILLEGAL_DATA_ADDRESS, EXC_ILLEGAL_DATA_VALUE,
+                            EXC_ILLEGAL_FUNCTION)
+from internal_variables import InternalVariables
+from modbus_responder import ModbusResponder
+from protocol_map import ProtocolMap
+from serial_reader import READ_MODE_BLOCKING, READ_MODE_POLL, SerialReader
+
+PROTOCOL = {
+    'registers': {
+        '0x0000': {'name': '状态字', 'length': 1, 'type': 'uint16',
+                   'variable_mapping': {'name': 'status'}},
+        '0x0001': {'name': '温度', 'length': 1, 'type': 'int16', 'scale': 0.1,
+                   'variable_mapping': {'name': 'temperature'}},
+        '0x0002': {'name': '输出功率', 'length': 2, 'type': 'float32',
+                   'variable_mapping': {'name': 'power', 'min': 0, 'max': 100,
+                                        'conversion': {'read': 'value * 1000', 'write': 'value / 1000'}}},
+        # 0x0004-0x000F 未定义
+        '0x0010': {'name': '累计电量', 'length': 2, 'type': 'uint32'},
+    }
+}
+
+
+@pytest.fixture
+def internal_vars():
+    return InternalVariables.from_protocol(ProtocolMap(PROTOCOL), defaults=False)
+
+
+@pytest.fixture
+def responder(internal_vars):
+    return ModbusResponder(internal_vars, PROTOCOL, unit_id=1, on_write=internal_vars.batch_update)
+
+
+def request(*fields, fmt='>BHH', unit=1):
+    return append_crc(bytes([unit]) + struct.pack(fmt, *fields))
+
+
+def exception_code(response, function_code):
+    response = bytes(response)
+    assert check_crc(response)
+    assert response[1] == function_code | 0x80
+    return response[2]
+
+
+def test_read_from_register_image(internal_vars, responder):
+    internal_vars.batch_update({'status': 2, 'temperature': -12.5, 'power': 1.5})
+    response = bytes(responder.handle_frame(request(3, 0x0000, 4)))
+    assert check_crc(response)
+    assert response[:3] == bytes([1, 3, 8])
+    assert struct.unpack('>Hhf', response[3:-2]) == (2, -125, 1500.0)
+    assert responder.get_stats()['requests'] == 1
+
+
+def test_pdu_without_unit(internal_vars, responder):
+    internal_vars.set_variable('status', 7)
+    assert bytes(responder.handle_pdu(struct.pack('>BHH', 3, 0, 1))) == bytes([3, 2, 0, 7])
+
+
+def test_write_single_register(internal_vars, responder):
+    frame = request(6, 0x0000, 5)
+    assert bytes(responder.handle_frame(frame)) == frame
+    assert internal_vars.get_variable('status') == 5
+
+
+def test_write_multiple_registers_runs_write_conversion(internal_vars, responder):
+    frame = append_crc(bytes([1]) + struct.pack('>BHHBf', 16, 0x0002, 2, 4, 2500.0))
+    response = bytes(responder.handle_frame(frame))
+    assert response == append_crc(bytes([1]) + struct.pack('>BHH', 16, 0x0002, 2))
+    assert internal_vars.get_variable('power') == pytest.approx(2.5)
+    # 写入的寄存器值在随后的读请求中返回
+    read = bytes(responder.handle_frame(request(3, 0x0002, 2)))
+    assert struct.unpack('>f', read[3:7]) == (2500.0,)
+
+
+def test_illegal_function(responder):
+    assert exception_code(responder.handle_frame(request(0x2B, 0, 0)), 0x2B) == EXC_ILLEGAL_FUNCTION
+
+
+@pytest.mark.parametrize('start, count', [
+    (0x0004, 1),      # 未定义
+    (0x0000, 5),      # 越过已定义范围
+    (0x0003, 1),      # float32 的后半部分
+    (0x0001, 2),      # 在 float32 中间结束
+])
+def test_read_illegal_address(responder, start, count):
+    assert exception_code(responder.handle_frame(request(3, start, count)), 3) == EXC_ILLEGAL_DATA_ADDRESS
+
+
+def test_split_write_rejected(internal_vars, responder):
+    internal_vars.set_variable('power', 1.0)
+    before = bytes(responder.handle_frame(request(3, 0x0002, 2)))
+    response = responder.handle_frame(request(6, 0x0003, 0x1234))
+    assert exception_code(response, 6) == EXC_ILLEGAL_DATA_ADDRESS
+    assert bytes(responder.handle_frame(request(3, 0x0002, 2))) == before
+    assert internal_vars.get_variable('power') == 1.0
+
+
+@pytest.mark.parametrize('frame, function_code', [
+    (request(3, 0x0000, 0), 3),
+    (request(3, 0x0000, 126), 3),
+    # 字节数与寄存器数量不符
+    (append_crc(bytes([1]) + struct.pack('>BHHB', 16, 0, 1, 4) + bytes(2)), 16),
+])
+def test_illegal_data_value(responder, frame, function_code):
+    assert exception_code(responder.handle_frame(frame), function_code) == EXC_ILLEGAL_DATA_VALUE
+
+
+def test_broadcast_executes_without_reply(internal_vars, responder):
+    assert responder.handle_frame(request(6, 0x0000, 9, unit=0)) is None
+    assert internal_vars.get_variable('status') == 9
+
+
+def test_other_unit_and_bad_crc_ignored(responder):
+    assert responder.handle_frame(request(3, 0, 1, unit=2)) is None
+    frame = request(3, 0, 1)
+    assert responder.handle_frame(frame[:-1] + bytes([frame[-1] ^ 1])) is None
+
+
+class LoopbackPort:
+    """模拟串口: 测试写入 rx, 应答写入 tx; loopback 时把发送数据回环到接收端"""
+
+    baudrate = 115200
+    bytesize = 8
+    parity = 'N'
+    stopbits = 1
+    timeout = 0.1
+    port = 'loopback'
+    is_open = True
+
+    def __init__(self, loopback=False):
+        self.loopback = loopback
+        self.rx = bytearray()
+        self.tx = []
+
+    @property
+    def in_waiting(self):
+        return len(self.rx)
+
+    def read(self, size):
+        data = bytes(self.rx[:size])
+        del self.rx[:size]
+        return data
+
+    def write(self, data):
+        self.tx.append(bytes(data))
+        if self.loopback:
+            self.rx += data
+
+
+def _serve(reader, port, frame):
+    port.rx += frame
+    deadline = time.perf_counter() + 0.05
+    while time.perf_counter() < deadline:
+        reader.read_frames()
+
+
+@pytest.mark.parametrize('loopback', [False, True])
+def test_repeated_write_single_answered(internal_vars, responder, loopback):
+    # FC06 响应与请求相同, 主站重复同一请求时每次都要应答
+    port = LoopbackPort(loopback)
+    reader = SerialReader(port, READ_MODE_POLL, responder=responder, echo_suppression=loopback)
+    frame = request(6, 0x0000, 3)
+    _serve(reader, port, frame)
+    _serve(reader, port, frame)
+    assert port.tx == [frame, frame]
+    assert reader.echo_bytes == (2 * len(frame) if loopback else 0)
+    assert reader.framer.frames_received == 2
+
+
+def test_echo_window_expires(responder):
+    port = LoopbackPort()
+    reader = SerialReader(port, READ_MODE_POLL, responder=responder, echo_suppression=True)
+    frame = request(6, 0x0000, 3)
+    _serve(reader, port, frame)
+    # 没有回显到达时, t3.5 之后收到的相同帧是新的请求
+    _serve(reader, port, frame)
+    assert port.tx == [frame, frame]
+    assert reader.echo_bytes == 0
+
+
+class TimeoutRecordingPort(LoopbackPort):
+    """记录每次对 timeout 的赋值; 低波特率使 t3.5 足够长, 读取之间不会断帧"""
+
+    baudrate = 1200
+
+    def __init__(self):
+        super().__init__()
+        self.timeouts = []
+
+    @property
+    def timeout(self):
+        return self.timeouts[-1] if self.timeouts else None
+
+    @timeout.setter
+    def timeout(self, value):
+        self.timeouts.append(value)
+
+
+def test_read_timeout_set_only_on_state_change():
+    port = TimeoutRecordingPort()
+    reader = SerialReader(port, READ_MODE_BLOCKING)
+    frame = request(3, 0x0000, 2)
+    port.rx += frame[:4]
+    assert reader.read_frames() == []
+    assert reader.read_frames() == []
+    # 长度规则在收齐最后一个字节时立即完成帧
+    port.rx += frame[4:]
+    assert reader.read_frames() == [frame]
+    reader.read_frames()
+    # 收帧期间等待时间固定为 t3.5, 只在空闲/收帧状态切换时重新配置
+    assert port.timeouts == [SerialReader.IDLE_TIMEOUT, reader.framer.t35, SerialReader.IDLE_TIMEOUT]
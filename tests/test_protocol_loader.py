@@ -0,0 +1,116 @@
+import os
+import json
+
+import pytest
+
+from protocol_loader import ProtocolLoader, loads_jsonc, read_jsonc, strip_json_comments
+
+JSONC = """{
+    // 行注释
+    "name": "test // not a comment",  // 行尾注释
+    "url": "http://example.com/*path*/",
+    /* 块注释 */ "registers": {
+        "0x0000": {"name": "状态字", "length": 1},  /* 跨行
+        块注释 */
+        "0x0001": {"name": "温度\\" // 转义引号之后", "length": 1}
+    }
+}
+"""
+
+PROTOCOL = {
+    'registers': {
+        '0x0000': {'name': '状态字', 'length': 1, 'type': 'uint16'},
+        '0x0001': {'name': '输出功率', 'length': 2, 'type': 'float32',
+                   'variable_mapping': {'name': 'power', 'conversion': {'read': 'value * 1000'}}},
+    }
+}
+
+
+def test_strip_comments_keeps_strings():
+    data = json.loads(strip_json_comments(JSONC))
+    assert data['name'] == 'test // not a comment'
+    assert data['url'] == 'http://example.com/*path*/'
+    assert list(data['registers']) == ['0x0000', '0x0001']
+    assert data['registers']['0x0001']['name'] == '温度" // 转义引号之后'
+
+
+def test_strip_comments_keeps_line_numbers():
+    stripped = strip_json_comments(JSONC)
+    assert stripped.count('\n') == JSONC.count('\n')
+    with pytest.raises(json.JSONDecodeError) as info:
+        loads_jsonc('{\n  // 注释\n  "a": 1,\n  "b": \n}')
+    assert info.value.lineno == 5
+
+
+def test_plain_json_unchanged():
+    text = '{"a": "b"}'
+    assert strip_json_comments(text) is text
+    assert loads_jsonc(text) == {'a': 'b'}
+
+
+def test_read_jsonc_with_bom(tmp_path):
+    path = tmp_path / 'protocol.json'
+    path.write_bytes(b'\xef\xbb\xbf' + JSONC.encode('utf-8'))
+    assert read_jsonc(str(path))['name'] == 'test // not a comment'
+
+
+def _write(path, protocol, comment=''):
+    path.write_text(comment + json.dumps(protocol, ensure_ascii=False), encoding='utf-8')
+    return str(path)
+
+
+def test_memory_cache(tmp_path):
+    path = _write(tmp_path / 'p.json', PROTOCOL)
+    loader = ProtocolLoader()
+    first = loader.load(path)
+    assert loader.load(path) is first
+    assert loader.stats == {'memory_hits': 1, 'disk_hits': 0, 'compiles': 1}
+    loader.invalidate(path)
+    assert loader.load(path) is not first
+    assert loader.stats['compiles'] == 2
+
+
+def test_disk_cache_round_trip(tmp_path):
+    path = _write(tmp_path / 'p.json', PROTOCOL)
+    cache_dir = str(tmp_path / 'cache')
+    compiled = ProtocolLoader(cache_dir).load(path)
+
+    loader = ProtocolLoader(cache_dir)
+    restored = loader.load(path)
+    assert loader.stats == {'memory_hits': 0, 'disk_hits': 1, 'compiles': 0}
+    assert restored.protocol == compiled.protocol
+    assert [(e.address, e.length, e.variable) for e in restored.entries] == \
+        [(e.address, e.length, e.variable) for e in compiled.entries]
+    assert restored.lookup(0x0002).read(2) == 2000
+
+
+def test_disk_cache_invalidated_by_content(tmp_path):
+    cache_dir = str(tmp_path / 'cache')
+    path = _write(tmp_path / 'p.json', PROTOCOL)
+    ProtocolLoader(cache_dir).load(path)
+
+    changed = {'registers': {'0x0010': {'name': '电压', 'length': 1}}}
+    _write(tmp_path / 'p.json', changed, comment='// 修改后\n')
+    loader = ProtocolLoader(cache_dir)
+    assert [e.address for e in loader.load(path).entries] == [0x0010]
+    assert loader.stats['compiles'] == 1
+
+
+def test_corrupt_cache_recompiled(tmp_path):
+    cache_dir = tmp_path / 'cache'
+    path = _write(tmp_path / 'p.json', PROTOCOL)
+    ProtocolLoader(str(cache_dir)).load(path)
+    (cache_file,) = os.listdir(cache_dir)
+    text = (cache_dir / cache_file).read_text(encoding='utf-8')
+    (cache_dir / cache_file).write_text(text.split('\n')[0] + '\n{"broken', encoding='utf-8')
+
+    loader = ProtocolLoader(str(cache_dir))
+    assert len(loader.load(path)) == 2
+    assert loader.stats['compiles'] == 1
+
+
+def test_invalid_protocol_raises(tmp_path):
+    path = tmp_path / 'p.json'
+    path.write_text('{"registers": {"0x0000": {"name": "a", "length": 0}}}', encoding='utf-8')
+    with pytest.raises(ValueError):
+        ProtocolLoader().load(str(path))
@@ -0,0 +1,113 @@
+import struct
+
+import pytest
+
+from protocol_map import BlockDecoder, ProtocolMap
+
+PROTOCOL = {
+    'registers': {
+        '0x0000': {'name': '状态字', 'length': 1, 'type': 'uint16',
+                   'values': {'0': '待机', '1': '正常'}},
+        '0x0001': {'name': '温度', 'length': 1, 'type': 'int16', 'scale': 0.1, 'unit': '°C'},
+        '0x0002': {'name': '输出功率', 'length': 2, 'type': 'float32', 'unit': 'W',
+                   'variable_mapping': {'name': 'power',
+                                        'conversion': {'read': 'value * 1000', 'write': 'value / 1000'}}},
+        # 0x0004-0x000F 未定义
+        '0x0010': {'name': '累计电量', 'length': 2, 'type': 'uint32'},
+    },
+    'function_codes': {'03': '读保持寄存器', '16': '写多个寄存器'},
+}
+
+
+@pytest.fixture
+def protocol_map():
+    return ProtocolMap(PROTOCOL)
+
+
+def test_entries_sorted(protocol_map):
+    assert [entry.address for entry in protocol_map.entries] == [0x0000, 0x0001, 0x0002, 0x0010]
+    assert [entry.end for entry in protocol_map.entries] == [0x0001, 0x0002, 0x0004, 0x0012]
+    assert protocol_map.function_names == {3: '读保持寄存器', 16: '写多个寄存器'}
+
+
+def test_lookup_covers_multiword_registers(protocol_map):
+    assert protocol_map.lookup(0x0003).key == '0x0002'
+    assert protocol_map.lookup(0x0011).key == '0x0010'
+    assert protocol_map.lookup(0x0004) is None
+    assert protocol_map.lookup(0x0012) is None
+
+
+def test_lookup_range(protocol_map):
+    assert [entry.key for entry in protocol_map.lookup_range(0x0001, 2)] == ['0x0001', '0x0002']
+    assert [entry.key for entry in protocol_map.lookup_range(0x0003, 0x0F)] == ['0x0002', '0x0010']
+    assert protocol_map.lookup_range(0x0004, 4) == []
+
+
+def test_is_mapped_and_aligned(protocol_map):
+    assert protocol_map.is_mapped(0x0000, 4)
+    assert not protocol_map.is_mapped(0x0000, 5)
+    assert not protocol_map.is_mapped(0x0004, 1)
+    assert protocol_map.is_aligned(0x0000, 4)
+    assert protocol_map.is_aligned(0x0010, 2)
+    # 从 float32 的中间开始或结束
+    assert protocol_map.is_mapped(0x0003, 1)
+    assert not protocol_map.is_aligned(0x0003, 1)
+    assert not protocol_map.is_aligned(0x0001, 2)
+    assert not protocol_map.is_aligned(0x0000, 5)
+
+
+def test_invalid_protocols_rejected():
+    with pytest.raises(ValueError, match='overlaps'):
+        ProtocolMap({'registers': {'0x0000': {'name': 'a', 'length': 2},
+                                   '0x0001': {'name': 'b', 'length': 1}}})
+    with pytest.raises(ValueError, match='invalid length'):
+        ProtocolMap({'registers': {'0x0000': {'name': 'a', 'length': 0}}})
+
+
+def test_mapping_conversions_compiled(protocol_map):
+    power = protocol_map.lookup(0x0002)
+    assert power.variable == 'power'
+    assert power.read(1.5) == 1500
+    assert power.write(1500) == 1.5
+    assert protocol_map.lookup(0x0000).variable is None
+
+
+def test_invalid_conversion_rejected():
+    with pytest.raises(ValueError, match='0x0000'):
+        ProtocolMap({'registers': {'0x0000': {
+            'name': 'a', 'variable_mapping': {'name': 'a', 'conversion': {'read': '__import__("os")'}}}}})
+
+
+def test_decode_registers(protocol_map):
+    payload = struct.pack('>Hhf', 1, -125, 2.5)
+    values = protocol_map.decode_registers(0x0000, payload)
+    assert [item['name'] for item in values] == ['状态字', '温度', '输出功率']
+    assert values[0]['label'] == '正常'
+    assert values[1]['raw'] == -125
+    assert values[1]['value'] == pytest.approx(-12.5)
+    assert values[1]['unit'] == '°C'
+    assert values[2]['value'] == 2.5
+
+
+def test_block_decoder_skips_gaps_and_partial_registers(protocol_map):
+    # 0x0003 只覆盖 float32 的后半部分, 0x0004-0x000F 未定义, 均按填充跳过
+    decoder = protocol_map.decoder_for(0x0003, 0x0F)
+    assert [entry.key for entry in decoder.entries] == ['0x0010']
+    payload = bytes(2) + bytes(12 * 2) + struct.pack('>I', 123456)
+    assert decoder.decode(payload) == [
+        {'address': '0x0010', 'name': '累计电量', 'raw': 123456, 'value': 123456, 'unit': None}]
+
+
+def test_decoder_cached(protocol_map):
+    assert protocol_map.decoder_for(0x0000, 4) is protocol_map.decoder_for(0x0000, 4)
+    decoder = BlockDecoder(0x0000, 4, protocol_map.lookup_range(0x0000, 4))
+    assert decoder.struct.format == protocol_map.decoder_for(0x0000, 4).struct.format
+
+
+def test_state_round_trip(protocol_map):
+    restored = ProtocolMap.from_state(protocol_map.to_state())
+    assert [(e.address, e.length, e.key, e.variable) for e in restored.entries] == \
+        [(e.address, e.length, e.key, e.variable) for e in protocol_map.entries]
+    assert restored.lookup(0x0002).read(2) == 2000
+    payload = struct.pack('>Hhf', 0, 10, 1.0)
+    assert restored.decode_registers(0, payload) == protocol_map.decode_registers(0, payload)
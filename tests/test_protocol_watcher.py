@@ -0,0 +1,74 @@
+import struct
+import threading
+
+from internal_variables import InternalVariables
+from modbus_responder import ModbusResponder
+from protocol_map import ProtocolMap
+from protocol_watcher import ProtocolSwap
+
+PROTOCOL = {
+    'registers': {
+        '0x0000': {'name': '状态字', 'length': 1, 'type': 'uint16',
+                   'variable_mapping': {'name': 'status'}},
+    }
+}
+
+RELOADED = {
+    'registers': {
+        '0x0000': {'name': '状态字', 'length': 1, 'type': 'uint16',
+                   'variable_mapping': {'name': 'status'}},
+        '0x0001': {'name': '模式', 'length': 1, 'type': 'uint16',
+                   'variable_mapping': {'name': 'mode', 'default': 3}},
+    }
+}
+
+
+def read(responder, address, count):
+    return bytes(responder.handle_pdu(struct.pack('>BHH', 3, address, count)))
+
+
+def test_submit_only_queues_the_map():
+    swapped, pending = [], []
+    swap = ProtocolSwap(lambda name, protocol_map: swapped.append((name, protocol_map, threading.get_ident())),
+                        on_pending=lambda: pending.append(threading.get_ident()))
+    watcher = threading.Thread(target=lambda: (swap.submit('main', 1), swap.submit('main', 2)))
+    watcher.start()
+    watcher.join()
+    # 监视线程只交出协议, 不执行交换
+    assert swapped == []
+    assert len(pending) == 2 and pending[0] != threading.get_ident()
+
+    result = swap.apply()
+    # 同一协议只交换最新的一份, 且在调用 apply() 的线程中执行
+    assert [name for name, _ in result] == ['main']
+    assert swapped == [('main', 2, threading.get_ident())]
+    assert swap.apply() == []
+    assert swap.get_stats()['swaps'] == 1
+
+
+def test_failed_swap_is_counted():
+    def fail(name, protocol_map):
+        raise ValueError("bad protocol")
+
+    swap = ProtocolSwap(fail)
+    swap.submit('main', object())
+    assert swap.apply() == []
+    assert swap.get_stats()['failures'] == 1
+
+
+def test_swap_protocol_adds_variables_before_image():
+    internal_vars = InternalVariables.from_protocol(PROTOCOL, defaults=False)
+    responder = ModbusResponder(internal_vars, PROTOCOL, unit_id=1)
+    internal_vars.set_variable('status', 7)
+    assert read(responder, 0, 1) == bytes([3, 2, 0, 7])
+    assert read(responder, 0, 2)[0] == 0x83
+
+    swap = ProtocolSwap(lambda name, protocol_map: responder.swap_protocol(protocol_map))
+    swap.submit('main', ProtocolMap(RELOADED))
+    swap.apply()
+    assert 'mode' in internal_vars
+    assert responder.protocol_map.is_mapped(0x0001, 1)
+    # 新映像按交换时的变量值填充, 已有变量保持原值
+    assert read(responder, 0, 2) == bytes([3, 4, 0, 7, 0, 3])
+    internal_vars.set_variable('mode', 5)
+    assert read(responder, 1, 1) == bytes([3, 2, 0, 5])
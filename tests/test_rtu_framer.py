@@ -0,0 +1,74 @@
+import pytest
+
+from crc16 import append_crc
+from rtu_framer import FIXED_T35, RTUFramer, silent_intervals
+
+READ_REQUEST = append_crc(bytes.fromhex('010300000002'))
+READ_RESPONSE = append_crc(bytes.fromhex('01030400010002'))
+
+
+def test_silent_intervals():
+    t15, t35 = silent_intervals(9600)
+    assert t15 == pytest.approx(1.5 * 10 / 9600)
+    assert t35 == pytest.approx(3.5 * 10 / 9600)
+    # 高于19200波特率时使用固定间隔
+    assert silent_intervals(115200)[1] == FIXED_T35
+
+
+def test_silence_separates_frames():
+    framer = RTUFramer(9600, use_length_rules=False)
+    assert framer.feed(READ_REQUEST, 0.0) == []
+    assert framer.poll(framer.t35 / 2) == []
+    assert framer.feed(READ_RESPONSE, framer.t35 * 2) == [READ_REQUEST]
+    assert framer.flush() == [READ_RESPONSE]
+
+
+def test_split_frame_reassembled():
+    framer = RTUFramer(9600, use_length_rules=False)
+    assert framer.feed(READ_RESPONSE[:3], 0.0) == []
+    assert framer.pending
+    # 间隔小于 t1.5, 仍属于同一帧
+    assert framer.feed(READ_RESPONSE[3:], framer.t15 / 2) == []
+    assert framer.poll(framer.t15 / 2 + framer.t35) == [READ_RESPONSE]
+    assert framer.frames_split == 0
+
+
+def test_gap_inside_frame_counted():
+    framer = RTUFramer(9600, use_length_rules=False)
+    framer.feed(READ_REQUEST[:4], 0.0)
+    # t1.5 < 间隔 < t3.5: 仍组成一帧, 计入 frames_split
+    gap = (framer.t15 + framer.t35) / 2
+    assert framer.feed(READ_REQUEST[4:], gap) == []
+    assert framer.flush() == [READ_REQUEST]
+    assert framer.frames_split == 1
+
+
+def test_invalid_length_dropped():
+    framer = RTUFramer(9600)
+    framer.feed(b'\x01\x03', 0.0)
+    assert framer.poll(1.0) == []
+    assert framer.frames_dropped == 1
+
+
+def test_glued_frames_split_by_length():
+    framer = RTUFramer(9600)
+    frames = framer.feed(READ_REQUEST + READ_RESPONSE + READ_REQUEST, 0.0)
+    assert frames == [READ_REQUEST, READ_RESPONSE, READ_REQUEST]
+    assert not framer.pending
+    assert framer.frames_by_length == 3
+
+
+def test_split_frame_completed_by_length():
+    framer = RTUFramer(9600)
+    assert framer.feed(READ_RESPONSE[:3], 0.0) == []
+    # 长度规则满足且CRC正确时不必等待静默时间
+    assert framer.feed(READ_RESPONSE[3:], framer.t15 / 2) == [READ_RESPONSE]
+
+
+def test_silence_completes_unknown_function():
+    framer = RTUFramer(9600)
+    frame = append_crc(bytes.fromhex('012B0E0100'))
+    assert framer.feed(frame, 0.0) == []
+    assert framer.poll(framer.t35 / 2) == []
+    assert framer.poll(framer.t35) == [frame]
+    assert framer.frames_by_length == 0
@@ -0,0 +1,147 @@
+import logging
+from typing import Any, Dict, List, Optional
+from crc16 import check_crc
+from metrics import CRC_ERRORS
+from internal_variables import InternalVariables
+from modbus_responder import BROADCAST_ADDRESS, ModbusResponder, TurnaroundStats
+from protocol_map import ProtocolMap
+
+logger = logging.getLogger(__name__)
+
+MAX_UNIT_ID = 247
+
+_CRC_ERRORS = CRC_ERRORS.labels('responder')
+
+
+class UnitDispatcher:
+    """
+    单总线多从站分发器
+
+    以从站地址字节为下标的256项表, 每个地址绑定独立的 ModbusResponder
+    (各自的协议和内部变量)。未绑定地址的请求不应答, 与真实多点总线一致;
+    广播请求交给所有从站执行但不应答。接口与 ModbusResponder 相同,
+    可直接交给 SerialReader 和 ModbusTCPServer 使用。
+    """
+
+    def __init__(self):
+        self._units: List[Optional[Any]] = [None] * 256
+        # 从站地址 -> 协议名称, 用于协议文件修改后重新加载
+        self._protocol_names: Dict[int, str] = {}
+        self.default_unit: Optional[int] = None
+        self.turnaround = TurnaroundStats()
+        self.ignored = 0
+
+    @classmethod
+    def from_config(cls, units: Dict[str, Dict[str, Any]], load_protocol) -> 'UnitDispatcher':
+        """
+        根据配置建立分发器, 每个从站使用独立的内部变量
+        Args:
+            units: {"从站地址": {"protocol": 协议名称}}
+            load_protocol: 根据协议名称返回协议定义 (或已编译的ProtocolMap) 的函数
+        """
+        dispatcher = cls()
+        for unit_key, unit_settings in units.items():
+            unit_id = int(unit_key)
+            protocol_name = unit_settings["protocol"]
+            protocol_map = ProtocolMap.compile(load_protocol(protocol_name))
+            unit_vars = InternalVariables.from_protocol(protocol_map)
+            # 主站写入的变量直接在读取线程中更新
+            dispatcher.bind(unit_id, ModbusResponder(unit_vars, protocol_map, unit_id=unit_id,
+                                                     on_write=unit_vars.batch_update),
+                            protocol_name)
+        return dispatcher
+
+    def bind(self, unit_id: int, responder, protocol_name: Optional[str] = None):
+        """
+        把从站地址绑定到应答引擎
+        Args:
+            protocol_name: 应答引擎使用的协议名称, 由 reload_protocol 使用
+        """
+        if not 1 <= unit_id <= MAX_UNIT_ID:
+            raise ValueError(f"Unit id {unit_id} out of range 1-{MAX_UNIT_ID}")
+        if self._units[unit_id] is not None:
+            logger.warning(f"Unit {unit_id} already bound, replacing")
+        self._units[unit_id] = responder
+        if protocol_name is None:
+            self._protocol_names.pop(unit_id, None)
+        else:
+            self._protocol_names[unit_id] = protocol_name
+        if self.default_unit is None or unit_id < self.default_unit:
+            self.default_unit = unit_id
+
+    def reload_protocol(self, protocol_name: str, protocol_map: ProtocolMap) -> List[int]:
+        """
+        把使用指定协议的从站切换到新编译的协议, 先为新增的变量建立存储再交换映像
+        Returns:
+            list: 已切换的从站地址
+        """
+        reloaded = []
+        for unit_id, name in list(self._protocol_names.items()):
+            responder = self._units[unit_id]
+            if name != protocol_name or responder is None:
+                continue
+            responder.swap_protocol(protocol_map)
+            reloaded.append(unit_id)
+        return reloaded
+
+    def unbind(self, unit_id: int):
+        self._units[unit_id] = None
+        self._protocol_names.pop(unit_id, None)
+        if unit_id == self.default_unit:
+            bound = self.unit_ids()
+            self.default_unit = bound[0] if bound else None
+
+    def get(self, unit_id: int):
+        return self._units[unit_id]
+
+    def unit_ids(self) -> List[int]:
+        """已绑定的从站地址"""
+        return [unit for unit, responder in enumerate(self._units) if responder is not None]
+
+    def unit_protocols(self) -> Dict[int, ProtocolMap]:
+        """各已绑定从站当前使用的协议 {从站地址: ProtocolMap}, 用于按从站解码"""
+        protocols = {}
+        for unit in self.unit_ids():
+            protocol_map = self._units[unit].protocol_map
+            if protocol_map is not None:
+                protocols[unit] = protocol_map
+        return protocols
+
+    def accepts(self, unit: int) -> bool:
+        return self._units[unit] is not None
+
+    def handle_frame(self, frame: bytes) -> Optional[memoryview]:
+        """处理一帧RTU请求, 返回包含CRC的响应帧或None"""
+        if len(frame) < 4:
+            return None
+        if not check_crc(frame):
+            _CRC_ERRORS.inc()
+            return None
+        return self.handle_request(frame[0], frame[1:-2], rtu=True)
+
+    def handle_request(self, unit: int, pdu: bytes, rtu: bool = False) -> Optional[memoryview]:
+        """按从站地址分发PDU, rtu 为真时返回完整的RTU响应帧"""
+        if unit == BROADCAST_ADDRESS:
+            for responder in self._units:
+                if responder is not None:
+                    responder.handle_pdu(pdu)
+            return None
+
+        responder = self._units[unit]
+        if responder is None:
+            self.ignored += 1
+            return None
+        return responder.handle_pdu(pdu, unit if rtu else None)
+
+    def handle_pdu(self, pdu: bytes) -> Optional[memoryview]:
+        """交给默认从站 (地址最小的已绑定从站) 处理, 用于Modbus TCP本机单元号"""
+        if self.default_unit is None:
+            return None
+        return self._units[self.default_unit].handle_pdu(pdu)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """汇总统计及各从站统计"""
+        stats = {f"turnaround_{k}": v for k, v in self.turnaround.get_stats().items()}
+        stats['ignored'] = self.ignored
+        stats['units'] = {unit: self._units[unit].get_stats() for unit in self.unit_ids()}
+        return stats
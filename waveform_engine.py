@@ -0,0 +1,237 @@
+import time
+import math
+import logging
+import threading
+from typing import Any, Dict, List, Optional
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+WAVE_CONSTANT = 'constant'
+WAVE_SINE = 'sine'
+WAVE_RAMP = 'ramp'
+WAVE_NOISE = 'noise'
+WAVE_PV = 'pv'
+WAVE_STEP = 'step'
+WAVE_TYPES = (WAVE_CONSTANT, WAVE_SINE, WAVE_RAMP, WAVE_NOISE, WAVE_PV, WAVE_STEP)
+
+MIN_RATE = 1.0
+MAX_RATE = 100.0
+
+
+class WaveformEngine:
+    """
+    向量化波形仿真引擎
+
+    每个变量绑定一个波形发生器, 参数按列保存在 NumPy 数组中 (偏置、幅值、
+    周期、相位、噪声、阶跃起点和占空比)。每个节拍按波形类型分组做一次向量
+    运算得到全部变量的值, 限幅到变量范围后通过 store_floats 一次写入内部变量,
+    观察者 (应答引擎、界面) 只收到一次合并通知。
+
+    波形定义 (周期单位为秒, 相位和阶跃参数为周期的比例):
+        constant: offset
+        sine:     offset + amplitude * sin(2π(t/period + phase))
+        ramp:     offset + amplitude * frac(t/period + phase)
+        noise:    offset (加上 noise 标准差的高斯噪声)
+        pv:       offset + amplitude * max(0, sin(2π(frac - 0.25))), 一个周期为一天,
+                  0.25 日出, 0.5 正午, 0.75 日落
+        step:     offset, 在每个周期的 [start, start + duty) 内为 offset + amplitude
+    所有类型都可以叠加 noise 指定的高斯噪声。
+    """
+
+    def __init__(self, internal_vars, rate: float = 10.0, seed: Optional[int] = None):
+        self.internal_vars = internal_vars
+        self.rate = min(max(float(rate), MIN_RATE), MAX_RATE)
+        self._rng = np.random.default_rng(seed)
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._stop_event = threading.Event()
+        self._t0 = time.monotonic()
+
+        self._generators: Dict[str, Dict[str, Any]] = {}
+        self._compiled = None
+
+        self.ticks = 0
+        self.overruns = 0
+        self._tick_total = 0.0
+        self._tick_max = 0.0
+
+    def add(self, name: str, wave: str, **params):
+        """
+        添加或替换变量的波形发生器
+        Args:
+            name: 内部变量名 (必须为浮点变量)
+            wave: 波形类型, 见 WAVE_TYPES
+            params: offset, amplitude, period, phase, noise, start, duty
+        """
+        if wave not in WAVE_TYPES:
+            raise ValueError(f"Unknown waveform type {wave} for {name}")
+        period = float(params.get('period', 60.0))
+        if period <= 0:
+            raise ValueError(f"Waveform period for {name} must be positive")
+        with self._lock:
+            self._generators[name] = dict(params, wave=wave, period=period)
+            self._compiled = None
+
+    def remove(self, name: str):
+        with self._lock:
+            if self._generators.pop(name, None) is not None:
+                self._compiled = None
+
+    def load_config(self, generators: Dict[str, Dict[str, Any]]) -> List[str]:
+        """
+        按配置添加波形发生器
+        Args:
+            generators: {"变量名": {"type": "sine", "offset": 220, "amplitude": 5, ...}}
+        Returns:
+            list: 配置无效而跳过的变量名
+        """
+        skipped = []
+        for name, settings in generators.items():
+            params = dict(settings)
+            wave = params.pop('type', WAVE_CONSTANT)
+            try:
+                self.internal_vars.float_slots([name])
+                self.add(name, wave, **params)
+            except KeyError:
+                logger.warning(f"Waveform for unknown variable {name} skipped")
+                skipped.append(name)
+            except (TypeError, ValueError) as e:
+                logger.error(f"Invalid waveform for {name}: {e}")
+                skipped.append(name)
+        return skipped
+
+    def __len__(self) -> int:
+        return len(self._generators)
+
+    def _compile(self):
+        """把发生器参数整理为按列的数组, 并按波形类型分组"""
+        names = list(self._generators)
+        slots = self.internal_vars.float_slots(names)
+        count = len(names)
+
+        def column(key, default):
+            return np.array([float(self._generators[name].get(key, default)) for name in names])
+
+        lo = np.full(count, -np.inf)
+        hi = np.full(count, np.inf)
+        for i, name in enumerate(names):
+            info = self.internal_vars.get_variable_info(name)
+            if info.min_value is not None:
+                lo[i] = info.min_value
+            if info.max_value is not None:
+                hi[i] = info.max_value
+
+        waves = [self._generators[name]['wave'] for name in names]
+        groups = {}
+        for wave in WAVE_TYPES:
+            indices = np.array([i for i, w in enumerate(waves) if w == wave], dtype=np.intp)
+            if len(indices):
+                groups[wave] = indices
+
+        noise = column('noise', 0.0)
+        self._compiled = {
+            'names': names,
+            'slots': slots,
+            'offset': column('offset', 0.0),
+            'amplitude': column('amplitude', 0.0),
+            'inv_period': 1.0 / column('period', 60.0),
+            'phase': column('phase', 0.0),
+            'noise': noise,
+            'noisy': np.flatnonzero(noise),
+            'start': column('start', 0.0),
+            'duty': column('duty', 0.5),
+            'lo': lo,
+            'hi': hi,
+            'groups': groups,
+        }
+
+    def compute(self, t: float) -> np.ndarray:
+        """计算时刻 t (秒) 全部发生器的值, 顺序与添加顺序相同"""
+        return self._evaluate(t)[1]
+
+    def _evaluate(self, t: float):
+        with self._lock:
+            if self._compiled is None:
+                self._compile()
+            c = self._compiled
+
+        cycles = t * c['inv_period'] + c['phase']
+        values = c['offset'].copy()
+        amplitude = c['amplitude']
+        for wave, idx in c['groups'].items():
+            if wave == WAVE_SINE:
+                values[idx] += amplitude[idx] * np.sin(2.0 * math.pi * cycles[idx])
+            elif wave == WAVE_RAMP:
+                values[idx] += amplitude[idx] * np.mod(cycles[idx], 1.0)
+            elif wave == WAVE_PV:
+                day = np.sin(2.0 * math.pi * (np.mod(cycles[idx], 1.0) - 0.25))
+                values[idx] += amplitude[idx] * np.maximum(day, 0.0)
+            elif wave == WAVE_STEP:
+                frac = np.mod(cycles[idx] - c['start'][idx], 1.0)
+                values[idx] += amplitude[idx] * (frac < c['duty'][idx])
+
+        noisy = c['noisy']
+        if len(noisy):
+            values[noisy] += c['noise'][noisy] * self._rng.standard_normal(len(noisy))
+        return c, np.clip(values, c['lo'], c['hi'])
+
+    def tick(self, t: Optional[float] = None):
+        """计算一个节拍并一次性写入内部变量"""
+        if not self._generators:
+            return
+        if t is None:
+            t = time.monotonic() - self._t0
+        started = time.perf_counter()
+        c, values = self._evaluate(t)
+        self.internal_vars.store_floats(c['names'], c['slots'], values.tolist())
+
+        elapsed = time.perf_counter() - started
+        self.ticks += 1
+        self._tick_total += elapsed
+        if elapsed > self._tick_max:
+            self._tick_max = elapsed
+
+    def start(self):
+        """在后台线程中按固定频率运行"""
+        if self._thread is not None:
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name="WaveformEngine", daemon=True)
+        self._thread.start()
+        logger.info(f"Waveform engine started: {len(self._generators)} generators at {self.rate} Hz")
+
+    def _run(self):
+        interval = 1.0 / self.rate
+        next_tick = time.monotonic()
+        while not self._stop_event.is_set():
+            try:
+                self.tick()
+            except Exception as e:
+                logger.error(f"Waveform engine tick failed: {e}")
+            next_tick += interval
+            delay = next_tick - time.monotonic()
+            if delay < 0:
+                # 计算超过节拍周期, 放弃落后的节拍而不是连续追赶
+                self.overruns += 1
+                next_tick = time.monotonic()
+                continue
+            self._stop_event.wait(delay)
+
+    def stop(self):
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def get_stats(self) -> Dict[str, float]:
+        """获取节拍统计, 耗时单位毫秒 (含观察者编码寄存器的时间)"""
+        mean = self._tick_total / self.ticks if self.ticks else 0.0
+        return {
+            'generators': len(self._generators),
+            'rate_hz': self.rate,
+            'ticks': self.ticks,
+            'overruns': self.overruns,
+            'tick_mean_ms': mean * 1000.0,
+            'tick_max_ms': self._tick_max * 1000.0
+        }